@@ -1,11 +1,12 @@
 import os
 from logging.config import fileConfig
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
 
 from alembic import context
-from config import get_config_value
+from config import get_config_value, get_engine_config
 from models import Base
+from partitions import is_partition
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -14,7 +15,8 @@ config = context.config
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # keep the cli loggers when run in-process (cf `cli.py migrate`)
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -30,7 +32,15 @@ target_metadata = Base.metadata
 
 def get_url():
     """Custom function to get the database URL from ALEMBIC_ENV env var"""
-    return get_config_value(os.getenv("ALEMBIC_ENV", "please provide ALEMBIC_ENV"), "dsn")
+    env = os.getenv("ALEMBIC_ENV", "please provide ALEMBIC_ENV")
+    # same driver as the cli, cf `config.EngineConfig`
+    driver = get_engine_config(env)["driver"]
+    return make_url(get_config_value(env, "dsn")).set(drivername=f"postgresql+{driver}")
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    """Partitions of the metrics tables are not in the models, they are managed by the cli"""
+    return not (type_ == "table" and reflected and name and is_partition(name))
 
 
 def run_migrations_offline() -> None:
@@ -49,6 +59,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -67,7 +78,11 @@ def run_migrations_online() -> None:
     connectable = create_engine(get_url())
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,36 @@
+"""Add a unique (dataset_id, resource_id) constraint on resources
+
+Revision ID: 244006b26acc
+Revises: 993afcdee500
+Create Date: 2026-10-19 10:48:12.027533
+
+Resources are synced by `resource_id` instead of being truncated and reloaded.
+Duplicates (if any) are removed first, keeping the most recent row. The constraint
+index also serves lookups by `dataset_id`, which makes `ix_resources_dataset_id` redundant.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "244006b26acc"
+down_revision: Union[str, None] = "993afcdee500"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "DELETE FROM resources a USING resources b "
+        "WHERE a.id < b.id AND a.dataset_id = b.dataset_id AND a.resource_id = b.resource_id"
+    )
+    op.create_unique_constraint(
+        "uq_resources_dataset_id_resource_id", "resources", ["dataset_id", "resource_id"]
+    )
+    op.drop_index("ix_resources_dataset_id", table_name="resources")
+
+
+def downgrade() -> None:
+    op.create_index("ix_resources_dataset_id", "resources", ["dataset_id"])
+    op.drop_constraint("uq_resources_dataset_id_resource_id", "resources", type_="unique")
@@ -0,0 +1,77 @@
+"""Add indexes and unique constraints for dashboard and loader access paths
+
+Revision ID: 2ab76cb297ed
+Revises: 4f87e4cf0412
+Create Date: 2026-10-18 09:12:41.503112
+
+`af780a5cffbe` dropped the legacy indexes, leaving the loader lookups
+(`filter_by(...).first()`) and Metabase queries on sequential scans.
+
+Metrics and stats rows are keyed by their natural key: duplicates (if any)
+are removed first, keeping the most recent row.
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "2ab76cb297ed"
+down_revision: Union[str, None] = "4f87e4cf0412"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+NATURAL_KEYS = {
+    "uq_metrics_date_measurement_organization": (
+        "metrics",
+        ["date", "measurement", "organization"],
+    ),
+    "uq_datasets_metrics_date_measurement_dataset": (
+        "datasets_metrics",
+        ["date", "measurement", "dataset"],
+    ),
+    "uq_stats_date_segment_period": ("stats", ["date", "segment", "period"]),
+}
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_catalog_organization_not_deleted",
+        "catalog",
+        ["organization"],
+        postgresql_where=sa.text("NOT deleted"),
+    )
+    op.create_index(
+        "ix_catalog_deleted", "catalog", ["deleted"], postgresql_where=sa.text("deleted")
+    )
+    op.create_index("ix_resources_dataset_id", "resources", ["dataset_id"])
+    op.create_index(
+        "ix_datasets_bouquets_bouquet_id_dataset_id",
+        "datasets_bouquets",
+        ["bouquet_id", "dataset_id"],
+    )
+    op.create_index("ix_datasets_bouquets_dataset_id", "datasets_bouquets", ["dataset_id"])
+
+    for name, (table, columns) in NATURAL_KEYS.items():
+        # ranked in a single sort (NULLs are equal in PARTITION BY), a self-join on
+        # IS NOT DISTINCT FROM can only be planned as a nested loop
+        op.execute(
+            f"DELETE FROM {table} WHERE id IN ("
+            f"SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+            f"PARTITION BY {', '.join(columns)} ORDER BY id DESC) AS rn FROM {table}"
+            ") ranked WHERE rn > 1)"
+        )
+        op.create_unique_constraint(name, table, columns, postgresql_nulls_not_distinct=True)
+
+
+def downgrade() -> None:
+    for name, (table, _) in NATURAL_KEYS.items():
+        op.drop_constraint(name, table, type_="unique")
+    op.drop_index("ix_datasets_bouquets_dataset_id", table_name="datasets_bouquets")
+    op.drop_index("ix_datasets_bouquets_bouquet_id_dataset_id", table_name="datasets_bouquets")
+    op.drop_index("ix_resources_dataset_id", table_name="resources")
+    op.drop_index("ix_catalog_deleted", table_name="catalog")
+    op.drop_index("ix_catalog_organization_not_deleted", table_name="catalog")
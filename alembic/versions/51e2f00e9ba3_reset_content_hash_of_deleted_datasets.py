@@ -0,0 +1,27 @@
+"""Reset content_hash of deleted datasets
+
+Revision ID: 51e2f00e9ba3
+Revises: 5c0d3f1e8a47
+Create Date: 2026-10-19 16:12:44.201937
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "51e2f00e9ba3"
+down_revision: Union[str, None] = "5c0d3f1e8a47"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # datasets flagged deleted before mark_deleted reset their hash, so that they are
+    # rewritten (and undeleted) when they are loaded again
+    op.execute("UPDATE catalog SET content_hash = NULL WHERE deleted")
+
+
+def downgrade() -> None:
+    pass
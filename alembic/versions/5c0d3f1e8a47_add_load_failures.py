@@ -0,0 +1,42 @@
+"""Add load_failures
+
+Revision ID: 5c0d3f1e8a47
+Revises: 244006b26acc
+Create Date: 2026-10-19 14:21:07.512330
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5c0d3f1e8a47"
+down_revision: Union[str, None] = "244006b26acc"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "load_failures",
+        sa.Column("id", sa.Integer(), autoincrement=True),
+        sa.Column("dataset_id", sa.String(), nullable=False),
+        sa.Column("factor_id", sa.String(), nullable=True),
+        sa.Column("run_id", sa.Integer(), nullable=True),
+        sa.Column("payload_url", sa.String(), nullable=False),
+        sa.Column("error_class", sa.String(), nullable=False),
+        sa.Column("error", sa.String(), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("first_failed_at", sa.DateTime(), nullable=False),
+        sa.Column("failed_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["run_id"], ["load_runs.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("dataset_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("load_failures")
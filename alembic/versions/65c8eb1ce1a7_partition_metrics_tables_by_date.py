@@ -0,0 +1,124 @@
+"""Partition metrics tables by date
+
+Revision ID: 65c8eb1ce1a7
+Revises: a2dff88ccf29
+Create Date: 2026-10-18 11:24:52.190468
+
+`metrics` and `datasets_metrics` become range-partitioned by month on `date`,
+with a default partition. Upcoming partitions are then created by the
+`manage-partitions` command, cf `partitions.py`.
+
+The date is now part of the primary key, as required by partitioning.
+`mv_metrics_pivot` depends on `metrics` and is recreated from its current definition.
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "65c8eb1ce1a7"
+down_revision: Union[str, None] = "a2dff88ccf29"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = {
+    "metrics": ("uq_metrics_date_measurement_organization", "date, measurement, organization"),
+    "datasets_metrics": (
+        "uq_datasets_metrics_date_measurement_dataset",
+        "date, measurement, dataset",
+    ),
+}
+PIVOT_VIEW = "mv_metrics_pivot"
+MONTHS_AHEAD = 3
+
+
+def next_month(d: date) -> date:
+    return date(d.year + d.month // 12, d.month % 12 + 1, 1)
+
+
+def drop_pivot_view(conn: sa.Connection) -> str:
+    query = conn.execute(sa.text(f"SELECT pg_get_viewdef('{PIVOT_VIEW}')")).scalar_one()
+    op.execute(f"DROP MATERIALIZED VIEW {PIVOT_VIEW}")
+    return query
+
+
+def create_pivot_view(query: str):
+    op.execute(f"CREATE MATERIALIZED VIEW {PIVOT_VIEW} AS {query}")
+    op.execute(f"CREATE UNIQUE INDEX uq_{PIVOT_VIEW} ON {PIVOT_VIEW} (date, organization)")
+
+
+def swap_table(conn: sa.Connection, table: str, create: str, constraints: list[str]):
+    """Replace `table` by a new one created with `create`, keeping rows and id sequence"""
+    sequence = conn.execute(sa.text(f"SELECT pg_get_serial_sequence('{table}', 'id')")).scalar()
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE")
+    # constraint names must be free for the new table
+    names = conn.execute(
+        sa.text(
+            "SELECT conname FROM pg_constraint "
+            f"WHERE conrelid = '{table}_old'::regclass AND contype IN ('p', 'u')"
+        )
+    ).scalars()
+    for name in list(names):
+        op.execute(f"ALTER TABLE {table}_old DROP CONSTRAINT {name}")
+    op.execute(create)
+    for constraint in constraints:
+        op.execute(f"ALTER TABLE {table} ADD {constraint}")
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.id")
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    pivot_query = drop_pivot_view(conn)
+    last_month = date.today().replace(day=1)
+    for _ in range(MONTHS_AHEAD):
+        last_month = next_month(last_month)
+
+    for table, (unique_name, unique_columns) in TABLES.items():
+        swap_table(
+            conn,
+            table,
+            f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS) PARTITION BY RANGE (date)",
+            [
+                "PRIMARY KEY (id, date)",
+                f"CONSTRAINT {unique_name} UNIQUE NULLS NOT DISTINCT ({unique_columns})",
+            ],
+        )
+        op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+        oldest = conn.execute(sa.text(f"SELECT min(date) FROM {table}_old")).scalar()
+        month = (oldest or date.today()).replace(day=1)
+        while month <= last_month:
+            op.execute(
+                f"CREATE TABLE {table}_y{month.year}m{month.month:02d} PARTITION OF {table} "
+                f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"
+            )
+            month = next_month(month)
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+        op.execute(f"DROP TABLE {table}_old")
+
+    create_pivot_view(pivot_query)
+
+
+def downgrade() -> None:
+    conn = op.get_bind()
+    pivot_query = drop_pivot_view(conn)
+
+    for table, (unique_name, unique_columns) in TABLES.items():
+        swap_table(
+            conn,
+            table,
+            f"CREATE TABLE {table} (LIKE {table}_old INCLUDING DEFAULTS)",
+            [
+                "PRIMARY KEY (id)",
+                f"CONSTRAINT {unique_name} UNIQUE NULLS NOT DISTINCT ({unique_columns})",
+            ],
+        )
+        op.execute(f"INSERT INTO {table} SELECT * FROM {table}_old")
+        # also drops the partitions
+        op.execute(f"DROP TABLE {table}_old")
+
+    create_pivot_view(pivot_query)
@@ -0,0 +1,38 @@
+"""Add load_runs
+
+Revision ID: 6e715a82eeef
+Revises: a5160649f4eb
+Create Date: 2026-10-19 09:12:44.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "6e715a82eeef"
+down_revision: Union[str, None] = "a5160649f4eb"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "load_runs",
+        sa.Column("id", sa.Integer(), autoincrement=True),
+        sa.Column("started_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("phase", sa.String(), nullable=False),
+        sa.Column("topic_page", sa.String(), nullable=True),
+        sa.Column("processed", postgresql.ARRAY(sa.String()), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("load_runs")
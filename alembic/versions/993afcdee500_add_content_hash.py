@@ -0,0 +1,30 @@
+"""Add content_hash to catalog and resources
+
+Revision ID: 993afcdee500
+Revises: 6e715a82eeef
+Create Date: 2026-10-19 10:02:31.845112
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "993afcdee500"
+down_revision: Union[str, None] = "6e715a82eeef"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # existing rows have no hash, they will be rewritten once by the next load
+    op.add_column("catalog", sa.Column("content_hash", sa.String(), nullable=True))
+    op.add_column("resources", sa.Column("content_hash", sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("resources", "content_hash")
+    op.drop_column("catalog", "content_hash")
@@ -0,0 +1,121 @@
+"""Add materialized views for dashboard aggregates
+
+Revision ID: a2dff88ccf29
+Revises: 2ab76cb297ed
+Create Date: 2026-10-18 10:02:17.318844
+
+Those views are refreshed concurrently at the end of `load`, cf `views.py`.
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a2dff88ccf29"
+down_revision: Union[str, None] = "2ab76cb297ed"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# frozen copy of `views.VIEWS` at the time of this revision
+VIEWS = [
+    (
+        "mv_indicators_per_organization",
+        """
+        SELECT organization, count(*) AS nb_datasets,
+        avg(quality__score) AS avg_quality__score,
+        count(*) FILTER (WHERE has_license) AS nb_license,
+        count(*) FILTER (WHERE has_harvest) AS nb_harvest,
+        count(*) FILTER (WHERE has_harvest__created_at) AS nb_harvest__created_at,
+        count(*) FILTER (WHERE has_harvest__issued_at) AS nb_harvest__issued_at,
+        count(*) FILTER (WHERE has_harvest__modified_at) AS nb_harvest__modified_at,
+        count(*) FILTER (WHERE has_harvest__remote_id) AS nb_harvest__remote_id,
+        count(*) FILTER (WHERE has_harvest__remote_url) AS nb_harvest__remote_url,
+        count(*) FILTER (WHERE has_resources__total) AS nb_resources__total,
+        count(*) FILTER (WHERE has_spatial__zones) AS nb_spatial__zones,
+        count(*) FILTER (WHERE has_spatial__geom) AS nb_spatial__geom,
+        count(*) FILTER (WHERE has_temporal_coverage) AS nb_temporal_coverage,
+        count(*) FILTER (WHERE has_frequency) AS nb_frequency,
+        count(*) FILTER (WHERE has_contact_points) AS nb_contact_points
+        FROM catalog
+        WHERE NOT deleted AND organization IS NOT NULL
+        GROUP BY organization
+        """,
+        ["organization"],
+    ),
+    (
+        "mv_quality_score_bins",
+        """
+        SELECT organization, quality__score__bin, quality__score__bin_label,
+        count(*) AS nb_datasets
+        FROM catalog
+        WHERE NOT deleted AND organization IS NOT NULL
+        GROUP BY organization, quality__score__bin, quality__score__bin_label
+        """,
+        ["organization", "quality__score__bin"],
+    ),
+    (
+        "mv_resource_formats",
+        """
+        SELECT c.organization, coalesce(lower(r.format), '') AS format,
+        count(*) AS nb_resources
+        FROM resources r
+        JOIN catalog c ON c.dataset_id = r.dataset_id
+        WHERE NOT c.deleted AND c.organization IS NOT NULL
+        GROUP BY c.organization, coalesce(lower(r.format), '')
+        """,
+        ["organization", "format"],
+    ),
+    (
+        "mv_bouquet_composition",
+        """
+        SELECT b.bouquet_id, b.name, b.theme, b.private, b.nb_factors, b.nb_datasets,
+        b.nb_datasets_external, b.nb_factors_missing, b.nb_factors_not_available,
+        count(DISTINCT c.dataset_id) AS nb_datasets_from_universe,
+        count(DISTINCT c.organization) AS nb_organizations
+        FROM bouquets b
+        LEFT JOIN datasets_bouquets dsb ON dsb.bouquet_id = b.bouquet_id
+        LEFT JOIN catalog c ON c.dataset_id = dsb.dataset_id AND NOT c.deleted
+        WHERE NOT b.deleted
+        GROUP BY b.bouquet_id, b.name, b.theme, b.private, b.nb_factors, b.nb_datasets,
+        b.nb_datasets_external, b.nb_factors_missing, b.nb_factors_not_available
+        """,
+        ["bouquet_id"],
+    ),
+    (
+        "mv_metrics_pivot",
+        """
+        SELECT date, coalesce(organization, '') AS organization,
+        max(value) FILTER (WHERE measurement = 'nb_datasets') AS nb_datasets,
+        max(value) FILTER (WHERE measurement = 'avg_quality__score') AS avg_quality__score,
+        max(value) FILTER (WHERE measurement = 'nb_license') AS nb_license,
+        max(value) FILTER (WHERE measurement = 'nb_harvest') AS nb_harvest,
+        max(value) FILTER (WHERE measurement = 'nb_harvest__created_at') AS nb_harvest__created_at,
+        max(value) FILTER (WHERE measurement = 'nb_harvest__issued_at') AS nb_harvest__issued_at,
+        max(value) FILTER (WHERE measurement = 'nb_harvest__modified_at')
+        AS nb_harvest__modified_at,
+        max(value) FILTER (WHERE measurement = 'nb_harvest__remote_id') AS nb_harvest__remote_id,
+        max(value) FILTER (WHERE measurement = 'nb_harvest__remote_url') AS nb_harvest__remote_url,
+        max(value) FILTER (WHERE measurement = 'nb_resources__total') AS nb_resources__total,
+        max(value) FILTER (WHERE measurement = 'nb_spatial__zones') AS nb_spatial__zones,
+        max(value) FILTER (WHERE measurement = 'nb_spatial__geom') AS nb_spatial__geom,
+        max(value) FILTER (WHERE measurement = 'nb_temporal_coverage') AS nb_temporal_coverage,
+        max(value) FILTER (WHERE measurement = 'nb_frequency') AS nb_frequency,
+        max(value) FILTER (WHERE measurement = 'nb_contact_points') AS nb_contact_points
+        FROM metrics
+        GROUP BY date, coalesce(organization, '')
+        """,
+        ["date", "organization"],
+    ),
+]
+
+
+def upgrade() -> None:
+    for name, query, unique_columns in VIEWS:
+        op.execute(f"CREATE MATERIALIZED VIEW {name} AS {query}")
+        op.execute(f"CREATE UNIQUE INDEX uq_{name} ON {name} ({', '.join(unique_columns)})")
+
+
+def downgrade() -> None:
+    for name, _, _ in reversed(VIEWS):
+        op.execute(f"DROP MATERIALIZED VIEW IF EXISTS {name}")
@@ -0,0 +1,32 @@
+"""Add load_generations
+
+Revision ID: a5160649f4eb
+Revises: 65c8eb1ce1a7
+Create Date: 2026-10-18 13:40:05.671930
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a5160649f4eb"
+down_revision: Union[str, None] = "65c8eb1ce1a7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "load_generations",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("load_generations")
@@ -0,0 +1,330 @@
+import gzip
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import date
+from threading import Lock
+from typing import Any, NamedTuple
+from urllib.parse import urlencode
+
+import brotli
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+GENERATION_QUERY = "SELECT coalesce(max(id), 0) AS generation FROM load_generations"
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class Query(NamedTuple):
+    sql: str
+    params: dict
+    # keyset pagination column, None for single object endpoints
+    cursor: str | None
+    limit: int
+    # seconds, only enforced by the ASGI server
+    timeout: float = 10
+
+
+class Response(NamedTuple):
+    status: int
+    body: bytes
+    headers: list[tuple[str, str]]
+
+
+def get_limit(params: dict[str, str]) -> int:
+    try:
+        limit = int(params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        raise HTTPError(400, "limit must be an integer")
+    if not 0 < limit <= MAX_LIMIT:
+        raise HTTPError(400, f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def get_after_date(params: dict[str, str]) -> date | None:
+    """Date cursor, bound as a date: asyncpg doesn't cast strings"""
+    if "after" not in params:
+        return None
+    try:
+        return date.fromisoformat(params["after"])
+    except ValueError:
+        raise HTTPError(400, "after must be a date (YYYY-MM-DD)")
+
+
+def equals_or_null(column: str, value: str | None) -> str:
+    """
+    Filter on `column` bound to its value, or without one on NULL: btree indexes can't
+    serve `IS NOT DISTINCT FROM`.
+    """
+    return f"{column} = :{column}" if value is not None else f"{column} IS NULL"
+
+
+def metrics_query(params: dict[str, str]) -> Query:
+    """Time series of a measurement, for an organization or global if none given"""
+    if not (measurement := params.get("measurement")):
+        raise HTTPError(400, "measurement is required")
+    limit = get_limit(params)
+    after = get_after_date(params)
+    organization = params.get("organization")
+    sql = f"""
+        SELECT date, value FROM metrics
+        WHERE measurement = :measurement AND {equals_or_null("organization", organization)}
+    """
+    if after:
+        sql += " AND date > :after"
+    sql += " ORDER BY date LIMIT :limit"
+    return Query(
+        sql,
+        {
+            "measurement": measurement,
+            "organization": organization,
+            "after": after,
+            "limit": limit + 1,
+        },
+        "date",
+        limit,
+        timeout=5,
+    )
+
+
+ORGANIZATIONS_SQL = """
+    SELECT o.organization_id, o.name, o.acronym, o.type, i.*
+    FROM mv_indicators_per_organization i
+    JOIN organizations o ON o.organization_id = i.organization
+"""
+
+
+def organizations_query(params: dict[str, str]) -> Query:
+    """Indicators summary of every organization"""
+    limit = get_limit(params)
+    sql = ORGANIZATIONS_SQL
+    if "after" in params:
+        sql += " WHERE i.organization > :after"
+    sql += " ORDER BY i.organization LIMIT :limit"
+    return Query(sql, {"after": params.get("after"), "limit": limit + 1}, "organization", limit)
+
+
+def organization_query(organization_id: str) -> Query:
+    sql = f"{ORGANIZATIONS_SQL} WHERE i.organization = :organization"
+    return Query(sql, {"organization": organization_id}, None, 1, timeout=5)
+
+
+def stats_query(params: dict[str, str]) -> Query:
+    """Matomo stats for a period and segment (all segments if none given)"""
+    limit = get_limit(params)
+    after = get_after_date(params)
+    segment = params.get("segment")
+    sql = f"""
+        SELECT * FROM stats
+        WHERE period = :period AND {equals_or_null("segment", segment)}
+    """
+    if after:
+        sql += " AND date > :after"
+    sql += " ORDER BY date LIMIT :limit"
+    return Query(
+        sql,
+        {
+            "period": params.get("period", "day"),
+            "segment": segment,
+            "after": after,
+            "limit": limit + 1,
+        },
+        "date",
+        limit,
+        timeout=5,
+    )
+
+
+def route(path: str, params: dict[str, str]) -> Query:
+    parts = path.strip("/").split("/")
+    match parts:
+        case ["api", "metrics"]:
+            return metrics_query(params)
+        case ["api", "organizations"]:
+            return organizations_query(params)
+        case ["api", "organizations", organization_id]:
+            return organization_query(organization_id)
+        case ["api", "stats"]:
+            return stats_query(params)
+    raise HTTPError(404, f"Unknown endpoint {path}")
+
+
+def build_payload(rows: list[dict], query: Query, path: str, params: dict[str, str]) -> Any:
+    """Shape query rows as a paginated list, or a single object"""
+    if query.cursor is None:
+        if not rows:
+            raise HTTPError(404, "Not found")
+        return rows[0]
+    rows = [{k: v for k, v in row.items() if k != "id"} for row in rows]
+    next_page = None
+    if len(rows) > query.limit:
+        rows = rows[: query.limit]
+        next_params = {**params, "after": str(rows[-1][query.cursor])}
+        next_page = f"{path}?{urlencode(next_params)}"
+    return {"data": rows, "next_page": next_page}
+
+
+def dump(payload: Any) -> bytes:
+    return json.dumps(payload, default=str, separators=(",", ":")).encode()
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    accepted = {e.split(";")[0].strip() for e in accept_encoding.split(",")}
+    if "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+
+
+def compress(body: bytes, encoding: str | None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body)
+    if encoding == "gzip":
+        return gzip.compress(body)
+    return body
+
+
+def make_etag(generation: int, path: str, query_string: str, encoding: str | None) -> str:
+    """
+    Responses only change with a new load, so the ETag doesn't depend on the body. It
+    depends on the encoding, each one being a different representation.
+    """
+    representation = f"{path}?{query_string};{encoding or 'identity'}"
+    digest = hashlib.sha1(representation.encode()).hexdigest()[:16]
+    return f'"{generation}-{digest}"'
+
+
+class ResponseCache:
+    """In-process TTL + LRU cache, cleared whenever the load generation changes"""
+
+    def __init__(self, maxsize: int = 512, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.items: OrderedDict[Any, tuple[float, bytes]] = OrderedDict()
+        self.lock = Lock()
+
+    def set_generation(self, generation: int):
+        with self.lock:
+            if generation != self.generation:
+                self.items.clear()
+                self.generation = generation
+
+    def get(self, key: Any) -> bytes | None:
+        with self.lock:
+            if not (item := self.items.get(key)):
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key: Any, value: bytes):
+        with self.lock:
+            self.items[key] = (time.monotonic() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+
+class GenerationChecker:
+    """Polls the load generation from the database, at most every `interval` seconds"""
+
+    def __init__(self, fetch: Callable[[], int] | None = None, interval: float = 30):
+        self.fetch = fetch
+        self.interval = interval
+        self.generation = 0
+        self.checked_at: float | None = None
+
+    def expired(self) -> bool:
+        return self.checked_at is None or time.monotonic() - self.checked_at > self.interval
+
+    def update(self, generation: int) -> int:
+        self.generation = generation
+        self.checked_at = time.monotonic()
+        return generation
+
+    def get(self) -> int:
+        if self.expired():
+            assert self.fetch
+            return self.update(self.fetch())
+        return self.generation
+
+
+class Prepared(NamedTuple):
+    # set if the request can be answered without running its query
+    response: Response | None
+    cache_key: tuple
+    encoding: str | None
+    headers: list[tuple[str, str]]
+
+
+def prepare(
+    path: str, query_string: str, headers: dict[str, str], generation: int, cache: ResponseCache
+) -> Prepared:
+    """Answer from the ETag or the cache if possible, once the request has been routed"""
+    encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+    etag = make_etag(generation, path, query_string, encoding)
+    common_headers = [("ETag", etag), ("Vary", "Accept-Encoding"), ("Cache-Control", "no-cache")]
+    if encoding:
+        common_headers.append(("Content-Encoding", encoding))
+    key = (path, query_string, encoding)
+    if etag in headers.get("if-none-match", ""):
+        return Prepared(Response(304, b"", common_headers), key, encoding, common_headers)
+
+    cache.set_generation(generation)
+    response = None
+    if (body := cache.get(key)) is not None:
+        response = Response(200, body, [("Content-Type", "application/json"), *common_headers])
+    return Prepared(response, key, encoding, common_headers)
+
+
+def error_response(error: HTTPError) -> Response:
+    return Response(
+        error.status, dump({"error": error.message}), [("Content-Type", "application/json")]
+    )
+
+
+def finish(prepared: Prepared, payload: Any, cache: ResponseCache) -> Response:
+    body = compress(dump(payload), prepared.encoding)
+    cache.set(prepared.cache_key, body)
+    return Response(200, body, [("Content-Type", "application/json"), *prepared.headers])
+
+
+def handle(
+    path: str,
+    query_string: str,
+    params: dict[str, str],
+    headers: dict[str, str],
+    generation: int,
+    cache: ResponseCache,
+    execute: Callable[[Query], list[dict]],
+) -> Response:
+    """
+    Serve a GET request on the API.
+
+    `headers` are lower-cased request headers, `execute` runs a query and returns its rows.
+    """
+    try:
+        query = route(path, params)
+    except HTTPError as e:
+        return error_response(e)
+    prepared = prepare(path, query_string, headers, generation, cache)
+    if prepared.response:
+        return prepared.response
+    try:
+        payload = build_payload(execute(query), query, path, params)
+    except HTTPError as e:
+        return error_response(e)
+    return finish(prepared, payload, cache)
@@ -1,6 +1,87 @@
+import os
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+from sqlalchemy import Engine, create_engine, text
+
+from api import GENERATION_QUERY, GenerationChecker, Query, ResponseCache, handle
+from config import get_config_value
+from snapshots import serve_snapshot
+
+ENV = os.getenv("API_ENV", "demo")
+SNAPSHOTS_ROOT = Path(os.getenv("SNAPSHOTS_DIR", "snapshots")) / ENV
+
+
+class State:
+    """Per-process state, created lazily so that each gunicorn worker gets its own pool"""
+
+    engine: Engine | None = None
+    cache = ResponseCache()
+    generation: GenerationChecker | None = None
+
+    def get_engine(self) -> Engine:
+        if self.engine is None:
+            self.engine = create_engine(
+                get_config_value(ENV, "dsn"), pool_size=2, max_overflow=2, pool_pre_ping=True
+            )
+        return self.engine
+
+    def execute(self, query: Query) -> list[dict]:
+        with self.get_engine().connect() as connection:
+            result = connection.execute(text(query.sql), query.params)
+            return [dict(row) for row in result.mappings()]
+
+    def get_generation(self) -> int:
+        if self.generation is None:
+            self.generation = GenerationChecker(
+                lambda: self.execute(Query(GENERATION_QUERY, {}, None, 1))[0]["generation"]
+            )
+        return self.generation.get()
+
+
+state = State()
+
+
+def respond(
+    start_response, status: int, body: bytes, headers: list[tuple[str, str]], head: bool = False
+):
+    start_response(
+        f"{status} {HTTPStatus(status).phrase}",
+        [*headers, ("Content-Length", str(len(body)))],
+    )
+    return iter([] if head else [body])
+
+
 def application(environ, start_response):
-    data = b"ok"
-    status = "200 OK"
-    headers = [("Content-type", "text/plain; charset=utf-8"), ("Content-Length", str(len(data)))]
-    start_response(status, headers)
-    return iter([data])
+    path = environ.get("PATH_INFO", "/")
+    if path == "/":
+        # healthcheck
+        return respond(start_response, 200, b"ok", [("Content-type", "text/plain; charset=utf-8")])
+    if environ["REQUEST_METHOD"] not in ("GET", "HEAD"):
+        return respond(start_response, 405, b"", [("Allow", "GET, HEAD")])
+
+    query_string = environ.get("QUERY_STRING", "")
+    headers = {
+        k[5:].replace("_", "-").lower(): v for k, v in environ.items() if k.startswith("HTTP_")
+    }
+    if path.startswith("/snapshots/") and path.endswith(".json"):
+        name = path.removeprefix("/snapshots/").removesuffix(".json")
+        response = serve_snapshot(SNAPSHOTS_ROOT, name, headers)
+    else:
+        response = handle(
+            path,
+            query_string,
+            dict(parse_qsl(query_string)),
+            headers,
+            state.get_generation(),
+            state.cache,
+            state.execute,
+        )
+    return respond(
+        start_response,
+        response.status,
+        response.body,
+        response.headers,
+        head=environ["REQUEST_METHOD"] == "HEAD",
+    )
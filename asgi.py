@@ -0,0 +1,184 @@
+"""
+ASGI variant of app.py, e.g. `uvicorn asgi:application --workers 2`.
+
+A bounded pool of read-only async connections is shared by all requests of a process,
+identical queries in flight are run only once, and each endpoint has its own timeout, also
+enforced by the server as the `statement_timeout` of its query.
+"""
+
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+from sqlalchemy import make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from api import (
+    GENERATION_QUERY,
+    GenerationChecker,
+    HTTPError,
+    Query,
+    Response,
+    ResponseCache,
+    build_payload,
+    error_response,
+    finish,
+    prepare,
+    route,
+)
+from config import get_config_value
+from snapshots import serve_snapshot
+
+ENV = os.getenv("API_ENV", "demo")
+SNAPSHOTS_ROOT = Path(os.getenv("SNAPSHOTS_DIR", "snapshots")) / ENV
+POOL_SIZE = int(os.getenv("API_POOL_SIZE", "5"))
+# seconds
+GENERATION_TIMEOUT = 5
+# SQLSTATE of a statement cancelled by its `statement_timeout`
+QUERY_CANCELED = "57014"
+
+
+class Coalescer:
+    """Share the result of identical queries running at the same time"""
+
+    def __init__(self):
+        self.in_flight: dict[tuple, asyncio.Task] = {}
+
+    async def run(self, key: tuple, factory: Callable[[], Awaitable[list[dict]]]) -> list[dict]:
+        if (task := self.in_flight.get(key)) is None:
+            task = asyncio.ensure_future(factory())
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        # a waiter timing out must not cancel the query for the other waiters
+        return await asyncio.shield(task)
+
+
+class State:
+    engine: AsyncEngine | None = None
+    cache = ResponseCache()
+    generation = GenerationChecker()
+    coalescer = Coalescer()
+
+    def get_engine(self) -> AsyncEngine:
+        if self.engine is None:
+            url = make_url(get_config_value(ENV, "dsn")).set(drivername="postgresql+asyncpg")
+            self.engine = create_async_engine(
+                url,
+                pool_size=POOL_SIZE,
+                max_overflow=0,
+                pool_pre_ping=True,
+                connect_args={"server_settings": {"default_transaction_read_only": "on"}},
+            )
+        return self.engine
+
+    async def execute(self, query: Query) -> list[dict]:
+        async with self.get_engine().connect() as connection:
+            # waiters timing out leave the query running, the server cancels it so that it
+            # doesn't hold one of the POOL_SIZE connections (for this transaction only)
+            await connection.execute(
+                text("SELECT set_config('statement_timeout', :timeout, true)"),
+                {"timeout": str(max(1, round(query.timeout * 1000)))},
+            )
+            result = await connection.execute(text(query.sql), query.params)
+            return [dict(row) for row in result.mappings()]
+
+    async def coalesced_execute(self, query: Query) -> list[dict]:
+        key = (query.sql, tuple(sorted(query.params.items())))
+        return await self.coalescer.run(key, lambda: self.execute(query))
+
+    async def run(self, query: Query) -> list[dict]:
+        """Rows of `query`, raises TimeoutError once its timeout is over"""
+        try:
+            return await asyncio.wait_for(self.coalesced_execute(query), query.timeout)
+        except DBAPIError as e:
+            # cancelled by the server before this waiter timed out, when it joined late
+            if getattr(e.orig, "sqlstate", None) == QUERY_CANCELED:
+                raise TimeoutError from e
+            raise
+
+    async def get_generation(self) -> int:
+        if self.generation.expired():
+            rows = await self.run(Query(GENERATION_QUERY, {}, None, 1, GENERATION_TIMEOUT))
+            return self.generation.update(rows[0]["generation"])
+        return self.generation.generation
+
+
+state = State()
+
+
+async def handle(
+    path: str, query_string: str, headers: dict[str, str], generation: int
+) -> Response:
+    params = dict(parse_qsl(query_string))
+    try:
+        query = route(path, params)
+    except HTTPError as e:
+        return error_response(e)
+    prepared = prepare(path, query_string, headers, generation, state.cache)
+    if prepared.response:
+        return prepared.response
+    try:
+        rows = await state.run(query)
+        payload = build_payload(rows, query, path, params)
+    except HTTPError as e:
+        return error_response(e)
+    except TimeoutError:
+        return error_response(HTTPError(504, "Query timed out"))
+    return finish(prepared, payload, state.cache)
+
+
+async def send_response(send, response: Response, head: bool = False):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status,
+            "headers": [
+                (k.lower().encode(), v.encode())
+                for k, v in [*response.headers, ("Content-Length", str(len(response.body)))]
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": b"" if head else response.body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if state.engine is not None:
+                await state.engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    path = scope["path"]
+    method = scope["method"]
+    if path == "/":
+        # healthcheck
+        response = Response(200, b"ok", [("Content-Type", "text/plain; charset=utf-8")])
+    elif method not in ("GET", "HEAD"):
+        response = Response(405, b"", [("Allow", "GET, HEAD")])
+    else:
+        headers = {k.decode().lower(): v.decode() for k, v in scope["headers"]}
+        if path.startswith("/snapshots/") and path.endswith(".json"):
+            name = path.removeprefix("/snapshots/").removesuffix(".json")
+            # file reads are quick, they don't need a thread
+            response = serve_snapshot(SNAPSHOTS_ROOT, name, headers)
+        else:
+            query_string = scope["query_string"].decode()
+            try:
+                generation = await state.get_generation()
+            except TimeoutError:
+                response = error_response(HTTPError(504, "Query timed out"))
+            else:
+                response = await handle(path, query_string, headers, generation)
+    await send_response(send, response, head=method == "HEAD")
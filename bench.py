@@ -0,0 +1,67 @@
+"""
+Driver benchmark: the bulk write paths of a load, replayed on the data already in an env
+database and rolled back at the end, cf `python cli.py bench-drivers`.
+"""
+
+from collections import defaultdict
+from time import perf_counter
+from typing import NamedTuple
+
+from sqlalchemy import Engine, func, select
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from db import sync_resources
+from metrics import MetricsBatch
+from models import MODEL_COLUMNS, DatasetMetric, Resource
+
+
+class Timing(NamedTuple):
+    rows: int
+    seconds: float
+
+
+def replay_resources(session: scoped_session, nb_datasets: int) -> Timing:
+    """Rewrite every resource of `nb_datasets` datasets, one `sync_resources` per dataset"""
+    dataset_ids = select(Resource.dataset_id).distinct().limit(nb_datasets).scalar_subquery()
+    columns = MODEL_COLUMNS[Resource].insertable
+    by_dataset = defaultdict(list)
+    for resource in session.scalars(select(Resource).where(Resource.dataset_id.in_(dataset_ids))):
+        # a changed hash, so that none is skipped as unchanged
+        values = {k: getattr(resource, k) for k in columns} | {"content_hash": "replay"}
+        by_dataset[resource.dataset_id].append(Resource(**values))
+    session.expunge_all()
+
+    start = perf_counter()
+    for dataset_id, resources in by_dataset.items():
+        sync_resources(session, dataset_id, resources)
+    return Timing(sum(len(r) for r in by_dataset.values()), perf_counter() - start)
+
+
+def replay_metrics(session: scoped_session, nb_metrics: int) -> Timing:
+    """Rewrite up to `nb_metrics` datasets metrics of the last date, in one batch"""
+    last_date = session.scalar(select(func.max(DatasetMetric.date)))
+    batch = MetricsBatch(DatasetMetric, at=last_date)
+    rows = session.execute(
+        select(DatasetMetric.measurement, DatasetMetric.value, DatasetMetric.dataset)
+        .where(DatasetMetric.date == last_date)
+        .limit(nb_metrics)
+    )
+    for measurement, value, dataset in rows:
+        batch.add(measurement, value, dataset=dataset)
+
+    start = perf_counter()
+    nb_rows = batch.flush(session)
+    return Timing(nb_rows, perf_counter() - start)
+
+
+def replay_writes(engine: Engine, nb_datasets: int, nb_metrics: int) -> dict[str, Timing]:
+    # like the cli session, cf `env_context`
+    session = scoped_session(sessionmaker(bind=engine))
+    try:
+        return {
+            "resources": replay_resources(session, nb_datasets),
+            "metrics": replay_metrics(session, nb_metrics),
+        }
+    finally:
+        session.rollback()
+        session.remove()
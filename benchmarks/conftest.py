@@ -0,0 +1,141 @@
+"""
+Payloads of `tests/fixtures`, varied and scaled to `BENCHMARK_SCALE` (2000 by default)
+copies: descriptions lengths, quality scores, harvest blocks, spatial geometries, licenses,
+resources, and factors availabilities.
+"""
+
+import copy
+import json
+import os
+
+import pytest
+
+SCALE = int(os.getenv("BENCHMARK_SCALE", 2000))
+PAGE_SIZE = 100
+BASE_URL = "https://www.data.gouv.fr"
+LICENSES = [
+    {"id": "lov2", "title": "Licence Ouverte / Open Licence version 2.0"},
+    {"id": "odc-odbl", "title": "Open Data Commons Open Database License (ODbL)"},
+    {"id": "notspecified", "title": "License Not Specified"},
+    {"id": "other-at", "title": "Other (Attribution)"},
+]
+AVAILABILITIES = ["available", "url available", "missing", "not available"]
+
+
+def load_fixture(name: str) -> dict:
+    with open(f"tests/fixtures/{name}") as f:
+        return json.load(f)
+
+
+def geometry(nb_points: int) -> dict:
+    return {
+        "type": "MultiPolygon",
+        "coordinates": [[[[2.0 + i / nb_points, 48.0 + (i % 7) / 10] for i in range(nb_points)]]],
+    }
+
+
+def dataset_payload(base: dict, i: int) -> dict:
+    payload = copy.deepcopy(base)
+    payload["id"] = f"{i:024x}"
+    payload["slug"] = f"dataset-{i}"
+    payload["description"] = "Lorem ipsum dolor sit amet. " * (i % 200)
+    payload["quality"]["score"] = (i % 101) / 100
+    payload["license"] = LICENSES[i % len(LICENSES)]["id"]
+    payload["resources"]["total"] = i % 30
+    if i % 3 == 0:
+        payload["harvest"] = None
+    elif i % 3 == 1:
+        payload["harvest"]["modified_at"] = "2024-01-01T00:00:00+00:00"
+        payload["harvest"]["remote_url"] = None
+    if i % 10 == 0:
+        payload["spatial"] = {"geom": geometry(1000), "zones": ["country:fr"]}
+    if i % 4 == 0:
+        payload["temporal_coverage"] = {"start": "2020-01-01", "end": "2024-12-31"}
+    if i % 5 == 0:
+        payload["contact_points"] = [{"name": f"Contact {i}", "email": f"contact{i}@example.com"}]
+    return payload
+
+
+def factor(i: int) -> dict:
+    availability = AVAILABILITIES[i % len(AVAILABILITIES)]
+    return {
+        "id": f"factor-{i}",
+        "element": {"class": "Dataset", "id": f"{i:024x}"} if availability == "available" else None,
+        "extras": {
+            "ecospheres": {
+                "availability": availability,
+                "uri": f"https://example.com/dataset/{i}"
+                if availability in ("available", "url available")
+                else None,
+            }
+        },
+    }
+
+
+class Response:
+    ok = True
+    status_code = 200
+
+    def __init__(self, body: str):
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class PagedSession:
+    """Serves `items` in JSON pages of `page_size`, like the data.gouv.fr API, without HTTP"""
+
+    def __init__(self, url: str, items: list[dict], page_size: int = PAGE_SIZE):
+        self.pages = {}
+        nb_pages = max(1, -(-len(items) // page_size))
+        for page in range(1, nb_pages + 1):
+            next_page = f"{url}?page={page + 1}" if page < nb_pages else None
+            self.pages[url if page == 1 else f"{url}?page={page}"] = json.dumps(
+                {
+                    "data": items[(page - 1) * page_size : page * page_size],
+                    "page": page,
+                    "page_size": page_size,
+                    "total": len(items),
+                    "next_page": next_page,
+                }
+            )
+
+    def get(self, url: str, headers: dict | None = None) -> Response:
+        return Response(self.pages[url])
+
+
+@pytest.fixture(scope="session")
+def dataset_payloads() -> list[dict]:
+    base = load_fixture("payload_ok.json")
+    return [dataset_payload(base, i) for i in range(SCALE)]
+
+
+@pytest.fixture(scope="session")
+def resource_payloads() -> list[dict]:
+    base = load_fixture("resource_payload_ok.json")
+    return [{**base, "id": f"resource-{i}", "title": f"Resource {i}"} for i in range(SCALE)]
+
+
+@pytest.fixture(scope="session")
+def organization_payloads() -> list[dict]:
+    badges = [{"kind": "public-service"}, {"kind": "certified"}]
+    return [
+        {
+            "id": f"organization-{i}",
+            "name": f"Organization {i}",
+            "acronym": None,
+            "badges": badges[: i % 3],
+        }
+        for i in range(SCALE)
+    ]
+
+
+@pytest.fixture(scope="session")
+def factors() -> list[dict]:
+    return [factor(i) for i in range(SCALE)]
+
+
+@pytest.fixture(scope="session")
+def bouquet_payload() -> dict:
+    return load_fixture("bouquet_payload_ok.json")
@@ -0,0 +1,69 @@
+"""
+Transform path of a load, run once per dataset per night: each benchmark handles all the
+`BENCHMARK_SCALE` payloads of a round.
+"""
+
+from models import Bouquet, Dataset, DatasetComputedColumns, Organization, Resource
+from utils import accept
+
+from .conftest import BASE_URL, LICENSES, PagedSession
+
+
+def test_get_bin(benchmark, dataset_payloads):
+    lengths = [len(p["description"]) for p in dataset_payloads]
+    scores = [p["quality"]["score"] for p in dataset_payloads]
+
+    def get_bins():
+        for length, score in zip(lengths, scores):
+            DatasetComputedColumns.get_bin(length, DatasetComputedColumns.DESCRIPTION_UPPER_BOUNDS)
+            DatasetComputedColumns.get_bin(score, DatasetComputedColumns.QUALITY_SCORE_UPPER_BOUNDS)
+
+    benchmark(get_bins)
+
+
+def test_get_attr_by_path(benchmark, dataset_payloads):
+    computers = [DatasetComputedColumns(p, BASE_URL) for p in dataset_payloads]
+    fields = [indicator["field"] for indicator in DatasetComputedColumns.indicators]
+
+    def get_attrs():
+        for computer in computers:
+            for field in fields:
+                computer.get_attr_by_path(field)
+
+    benchmark(get_attrs)
+
+
+def test_accept(benchmark, dataset_payloads):
+    computers = [DatasetComputedColumns(p, BASE_URL) for p in dataset_payloads]
+    values = [
+        (computer.get_attr_by_path(indicator["field"]), indicator["exclude"])
+        for computer in computers
+        for indicator in DatasetComputedColumns.indicators
+    ]
+
+    def accept_all():
+        for value, exclude in values:
+            accept(value, exclude=exclude)
+
+    benchmark(accept_all)
+
+
+def test_dataset_from_payload(benchmark, dataset_payloads):
+    benchmark(lambda: [Dataset.from_payload(p, BASE_URL, LICENSES) for p in dataset_payloads])
+
+
+def test_resource_from_payload(benchmark, resource_payloads):
+    benchmark(lambda: [Resource.from_payload(p, "dataset") for p in resource_payloads])
+
+
+def test_organization_from_payload(benchmark, organization_payloads):
+    benchmark(lambda: [Organization.from_payload(p) for p in organization_payloads])
+
+
+def test_bouquet_from_payload(benchmark, bouquet_payload, factors):
+    """A bouquet of `BENCHMARK_SCALE` factors, counted by availability"""
+    session = PagedSession(bouquet_payload["elements"]["href"], factors)
+
+    bouquet = benchmark(Bouquet.from_payload, bouquet_payload, {}, session=session)
+
+    assert bouquet.nb_factors == len(factors)
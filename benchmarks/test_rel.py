@@ -0,0 +1,19 @@
+"""Page handling of `iter_rel`, on pages already in memory (JSON decoding included)"""
+
+from typing import cast
+
+from requests import Session
+
+from rel import iter_rel
+
+from .conftest import PagedSession
+
+
+def test_iter_rel(benchmark, dataset_payloads):
+    url = "https://www.data.gouv.fr/api/1/datasets/"
+    # only `get` is used
+    session = cast(Session, PagedSession(url, dataset_payloads))
+
+    elements = benchmark(lambda: list(iter_rel({"href": url}, session=session)))
+
+    assert len(elements) == len(dataset_payloads)
@@ -1,28 +1,48 @@
+import json
 import logging
 import os
 import sys
+import time
 import traceback
 from collections import defaultdict
-from concurrent.futures import Future, ThreadPoolExecutor
-from datetime import date, timedelta
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import date, datetime, timedelta
+from pathlib import Path
 from threading import Lock
 from typing import Callable, NamedTuple
 from urllib import parse as urllib_parse
 
-import sentry_sdk
 from minicli import cli, run, wrap
-from progressist import ProgressBar
 from requests.adapters import HTTPAdapter, Retry
+from requests.exceptions import HTTPError, RequestException
 from requests.sessions import Session
-from sqlalchemy import Select, and_, create_engine, func, inspect, select, text, update
+from sqlalchemy import Select, and_, delete, func, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import scoped_session, sessionmaker
 
-from alembic import command
-from alembic.config import Config
-from config import get_config_value, get_front_config
-from db import upsert
-from metrics import add_metric, compute_quality_score, get_datagouvfr_metrics
+import tracing
+from config import DRIVERS, get_config_value, get_engine_config, get_front_config
+from db import PoolUsage, create_tuned_engine, mark_deleted, sync_resources, upsert
+from downloads import DownloadCache
+from fetch import BulkDatasets
+from indexes import (
+    get_index_usage,
+    get_slow_statements,
+    get_table_scans,
+    missing_index_candidates,
+    unused_indexes,
+)
+from memory import MemoryReport
+from metrics import (
+    MetricsBatch,
+    compute_quality_score,
+    compute_quality_scores,
+    get_datagouvfr_metrics,
+)
 from models import (
+    MODEL_COLUMNS,
     Base,
     Bouquet,
     Dataset,
@@ -30,12 +50,37 @@ from models import (
     DatasetComputedColumns,
     DatasetMetric,
     EcospheresUniverseOrganization,
+    LoadGeneration,
+    LoadRun,
+    Metric,
     Organization,
     Resource,
     Stats,
     StatsPeriod,
 )
-from rel import iter_rel
+from partitions import (
+    PARTITIONED_TABLES,
+    add_months,
+    create_default_partition,
+    detach_partitions,
+    downsample_month,
+    ensure_partitions,
+    get_oldest_month,
+    iter_months,
+)
+from profiling import Profiler
+from rel import iter_pages, iter_rel, retry_after
+from runs import (
+    PHASES,
+    checkpoint,
+    clear_failures,
+    get_failures,
+    is_done,
+    next_phase,
+    record_failure,
+    start_run,
+)
+from views import create_views, refresh_materialized_views
 
 logging.basicConfig(
     level=logging.INFO,
@@ -43,8 +88,16 @@ logging.basicConfig(
     format="%(asctime)s %(name)s %(levelname)s: %(message)s",
 )
 
-if sentry_dsn := os.getenv("SENTRY_DSN"):
-    sentry_sdk.init(dsn=sentry_dsn)
+# heavy dependencies only needed by some commands (alembic, sentry_sdk, progressist,
+# pyarrow via export, brotli via snapshots) are imported where used, cf test_import_time.py
+tracing.init()
+
+# attempts of a dataset within a run before it's recorded in `load_failures`, the first
+# retry waits RETRY_BACKOFF seconds, doubled for each of the next ones
+DATASET_ATTEMPTS = 3
+RETRY_BACKOFF = 5
+# SQLSTATE of a statement cancelled, e.g. by the `statement_timeout` of the engine config
+QUERY_CANCELED = "57014"
 
 
 class Task(NamedTuple):
@@ -52,23 +105,97 @@ class Task(NamedTuple):
     dataset: dict
 
 
-class App:
+class Context:
+    """Resources of a cli command for an env"""
+
     db: scoped_session
     req: Session
     org_lock: Lock
     log: logging.Logger
+    # engine settings given on the command line, cf `get_engine_config`
+    engine_overrides: dict
+    # set by `--profile` and `--memory-report`
+    profiler: Profiler | None
+    memory_report: MemoryReport | None
 
     def __init__(self):
         self.org_lock = Lock()
+        self.profiler = None
+        self.memory_report = None
+
+
+_context: ContextVar[Context] = ContextVar("context")
+
+
+class App:
+    """
+    Proxy to the context of the current env, set by `env_context`.
+
+    Several envs can be loaded concurrently in threads (cf `load_all`), worker threads
+    must run in a copy of their parent context (cf `copy_context`).
+    """
+
+    @property
+    def db(self) -> scoped_session:
+        return _context.get().db
+
+    @property
+    def req(self) -> Session:
+        return _context.get().req
+
+    @property
+    def org_lock(self) -> Lock:
+        return _context.get().org_lock
+
+    @property
+    def log(self) -> logging.Logger:
+        return _context.get().log
+
+    @property
+    def engine_overrides(self) -> dict:
+        return _context.get().engine_overrides
+
+    @property
+    def profiler(self) -> Profiler | None:
+        return _context.get().profiler
+
+    @property
+    def memory_report(self) -> MemoryReport | None:
+        return _context.get().memory_report
 
 
 app = App()
+# of the process, shared by the envs downloading the same URLs
+downloads = DownloadCache()
+
+
+@contextmanager
+def track_phase(phase: str):
+    """
+    Profile the block as `phase` with `--profile`, report its memory with `--memory-report`,
+    trace it as a span with Sentry
+    """
+    with ExitStack() as stack:
+        stack.enter_context(tracing.span("phase", phase))
+        if app.profiler:
+            stack.enter_context(app.profiler.profiling(phase))
+        if app.memory_report:
+            stack.enter_context(app.memory_report.phase(phase, app.log))
+        yield
+
+
+def profiled(func: Callable) -> Callable:
+    """
+    `func` profiled in the worker thread it runs in with `--profile`, traced as a child of
+    the current span with Sentry
+    """
+    func = tracing.propagated(func)
+    return app.profiler.wrap(func) if app.profiler else func
 
 
 def load_es_universe_organizations(env: str) -> list[EcospheresUniverseOrganization]:
-    r = app.req.get(get_config_value(env, "org_api"))
-    r.raise_for_status()
-    return [EcospheresUniverseOrganization.from_payload(o) for o in r.json()]
+    payload = json.loads(downloads.get(app.req, get_config_value(env, "org_api")))
+    return [EcospheresUniverseOrganization.from_payload(o) for o in payload]
 
 
 def load_organization(env: str, organization_id: str, refresh: bool = False) -> Organization | None:
@@ -91,9 +218,16 @@ def load_organization(env: str, organization_id: str, refresh: bool = False) ->
 
 
 def _load_datagouvfr_metrics_batch(
-    url: str, query: Select, id_field: str, update_fn: Callable, batch_size: int = 50
+    url: str,
+    query: Select,
+    id_field: str,
+    update_fn: Callable,
+    metrics_batch: MetricsBatch,
+    batch_size: int = 50,
 ):
     total = app.db.scalar(select(func.count("*")).select_from(query.subquery()))
+    from progressist import ProgressBar
+
     bar = ProgressBar(total=total)
     result = app.db.execute(query).yield_per(batch_size)
     for batch in result.partitions():
@@ -115,10 +249,14 @@ def _load_datagouvfr_metrics_batch(
             update_fn(item, metrics_data)
             app.db.add(item)
         try:
+            metrics_batch.flush(app.db)
             app.db.commit()
         except Exception as e:
             app.db.rollback()
             app.log.error(f"Error updating batch: {e}")
+        # not expunge_all: the identity map of the session is still used by `result`
+        for item in items:
+            app.db.expunge(item)
 
 
 @cli
@@ -131,54 +269,55 @@ def load_datagouvfr_metrics(env: str = "demo"):
     # those metrics are always associated to the first of the month for data of last month
     at = date.today().replace(day=1)
 
+    dataset_metrics = MetricsBatch(DatasetMetric, at=at)
+    organization_metrics = MetricsBatch(Metric, at=at)
+
     def handle_dataset(dataset: Dataset, metrics_data: dict):
         if monthly_visit := metrics_data.get("monthly_visit"):
-            add_metric(
-                app.db,
+            dataset_metrics.add(
                 "nb_visits_last_month",
                 monthly_visit,
-                at=at,
                 dataset=dataset.dataset_id,
-                metric_model=DatasetMetric,
             )
         if monthly_download_resource := metrics_data.get("monthly_download_resource"):
-            add_metric(
-                app.db,
+            dataset_metrics.add(
                 "nb_downloads_resources_last_month",
                 monthly_download_resource,
-                at=at,
                 dataset=dataset.dataset_id,
-                metric_model=DatasetMetric,
             )
 
     def handle_organization(org: Organization, metrics_data: dict):
         if monthly_visit_dataset := metrics_data.get("monthly_visit_dataset"):
-            add_metric(
-                app.db,
+            organization_metrics.add(
                 "nb_visits_datasets_last_month",
                 monthly_visit_dataset,
-                at=at,
                 organization=org.organization_id,
             )
         if monthly_download_resource := metrics_data.get("monthly_download_resource"):
-            add_metric(
-                app.db,
+            organization_metrics.add(
                 "nb_downloads_resources_last_month",
                 monthly_download_resource,
-                at=at,
                 organization=org.organization_id,
             )
 
     app.log.info("Loading metrics from data.gouv.fr for datasets...")
     datasets = select(Dataset).where(~Dataset.deleted)
     _load_datagouvfr_metrics_batch(
-        f"{metrics_url}/datasets/data/", datasets, "dataset_id", handle_dataset
+        f"{metrics_url}/datasets/data/",
+        datasets,
+        "dataset_id",
+        handle_dataset,
+        dataset_metrics,
     )
 
     app.log.info("Loading metrics from data.gouv.fr for organizations...")
     organizations = select(Organization)
     _load_datagouvfr_metrics_batch(
-        f"{metrics_url}/organizations/data/", organizations, "organization_id", handle_organization
+        f"{metrics_url}/organizations/data/",
+        organizations,
+        "organization_id",
+        handle_organization,
+        organization_metrics,
     )
 
 
@@ -209,7 +348,7 @@ def load_bouquets(env: str = "demo", include_private: bool = False):
     api_key = get_config_value(env, "api_key")
 
     # build a pallatable list of themes from remote config
-    page_config = get_front_config(env, session=app.req)["pages"]["bouquets"]
+    page_config = get_front_config(env, session=app.req, cache=downloads)["pages"]["bouquets"]
     raw_themes = next((f for f in page_config["filters"] if f["id"] == "theme"), {"values": []})
     # FIXME: `page_prefix` for retrocompatibility
     filter_prefix = page_config.get("filter_prefix") or page_config.get("tag_prefix")
@@ -218,45 +357,62 @@ def load_bouquets(env: str = "demo", include_private: bool = False):
     app.db.execute(text("DELETE FROM datasets_bouquets"))
     app.db.commit()
 
-    # pre-set deleted, will be overwritten by actual upsert
-    stmt = update(Bouquet).values(deleted=True)
-    app.db.execute(stmt)
-    app.db.commit()
-
     universe_name = get_config_value(env, "universe_name")
     url = f"{base_url}/api/2/topics/?tag={universe_name}"
     if include_private:
         url = f"{url}&include_private=yes"
 
+    seen = set()
     for bouquet in iter_rel(
         {"href": url},
         headers={"X-API-KEY": api_key},
         session=app.req,
         log=app.log,
     ):
+        seen.add(bouquet["id"])
         existing = app.db.query(Bouquet).filter_by(bouquet_id=bouquet["id"]).first()
         bouquet_obj = Bouquet.from_payload(bouquet, themes)
-        bouquet_obj_in_db = upsert(app.db, bouquet_obj, existing)
-        for elt_id in bouquet_obj.elements_ids:
-            dataset_obj = app.db.query(Dataset).filter_by(dataset_id=elt_id).first()
-            if dataset_obj:
-                bouquet_obj_in_db.datasets.append(dataset_obj)
+        # committed with its datasets
+        bouquet_obj_in_db = upsert(app.db, bouquet_obj, existing, auto_commit=False)
+        # all the datasets of the bouquet in a single query
+        datasets = app.db.scalars(
+            select(Dataset).where(Dataset.dataset_id.in_(bouquet_obj.elements_ids))
+        )
+        bouquet_obj_in_db.datasets.extend(datasets)
         app.db.commit()
+        app.db.expunge_all()
+
+    if nb_deleted := mark_deleted(app.db, Bouquet, seen):
+        app.log.info(f"{nb_deleted} bouquets flagged as deleted")
 
 
-def process_factor(env: str, factor: dict, licenses: list, skip_related: bool) -> None:
-    """Process a single factor (dataset) and its resources"""
+def process_factor(
+    env: str,
+    factor: dict,
+    licenses: list,
+    skip_related: bool,
+    bulk: BulkDatasets | None = None,
+) -> str | None:
+    """
+    Process a single factor (dataset) and its resources, returns the loaded dataset id.
+    The dataset is taken from `bulk` if there, otherwise fetched by id.
+    """
     api_key = get_config_value(env, "api_key")
     if (factor.get("element") or {}).get("class") != "Dataset":
         app.log.debug(f"Skipping factor {factor['id']} (not a dataset).")
         return
     base_url = get_config_value(env, "base_url")
     try:
-        r = app.req.get(
-            f"{base_url}/api/2/datasets/{factor['element']['id']}/", headers={"x-api-key": api_key}
-        )
-        r.raise_for_status()
-        dataset_payload = r.json()
+        resources_payloads = None
+        if bulk and (fetched := bulk.take(factor["element"]["id"])):
+            dataset_payload, resources_payloads = fetched
+        else:
+            r = app.req.get(
+                f"{base_url}/api/2/datasets/{factor['element']['id']}/",
+                headers={"x-api-key": api_key},
+            )
+            r.raise_for_status()
+            dataset_payload = r.json()
         if dataset_payload.get("private"):
             app.log.warning(
                 f"Dataset {factor['element']['id']} for factor {factor['id']} is private, ignoring."
@@ -265,18 +421,212 @@ def process_factor(env: str, factor: dict, licenses: list, skip_related: bool) -
         if organization_id := (dataset_payload.get("organization") or {}).get("id"):
             load_organization(env, organization_id)
         dataset_obj = Dataset.from_payload(dataset_payload, base_url, licenses)
-        existing = app.db.query(Dataset).filter_by(dataset_id=dataset_obj.dataset_id).first()
+        # read before the commits, which expire dataset_obj (a refresh query each)
+        dataset_id = dataset_obj.dataset_id
+        existing = app.db.query(Dataset).filter_by(dataset_id=dataset_id).first()
         upsert(app.db, dataset_obj, existing)
 
         if not skip_related:
-            for r in iter_rel(dataset_payload["resources"], session=app.req, log=None):
-                resource_obj = Resource.from_payload(r, dataset_obj.dataset_id)
-                app.db.add(resource_obj)
+            if resources_payloads is None:
+                resources_payloads = iter_rel(
+                    dataset_payload["resources"], session=app.req, log=None
+                )
+            resources = [Resource.from_payload(r, dataset_id) for r in resources_payloads]
+            sync = sync_resources(app.db, dataset_id, resources)
+            app.db.commit()
+            if any(sync):
+                app.log.debug(f"Resources of {dataset_id} synced: {sync}")
+        return dataset_id
     except Exception as e:
         app.db.rollback()
-        if sentry_dsn:
-            sentry_sdk.capture_exception(e)
         raise e
+    finally:
+        # the worker session is reused for the next datasets, don't let it hold this one
+        # nor its connection (worker sessions are not closed with the env context)
+        app.db.close()
+
+
+class DatasetFailed(Exception):
+    """Last error of a dataset, after `attempts`"""
+
+    def __init__(self, error: Exception, attempts: int):
+        super().__init__(f"{error} (after {attempts} attempt(s))")
+        self.error = error
+        self.attempts = attempts
+
+
+def is_transient(error: Exception) -> bool:
+    """Errors worth retrying: network, rate limits, 5xx and database errors but timeouts"""
+    if isinstance(error, HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status == 429 or status >= 500
+    if isinstance(error, OperationalError):
+        # a cancelled statement would time out again, holding a worker for as long each time
+        # (pgcode with psycopg2, sqlstate with psycopg 3)
+        sqlstate = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+        return sqlstate != QUERY_CANCELED
+    return isinstance(error, RequestException)
+
+
+def process_factor_with_retries(
+    env: str,
+    factor: dict,
+    licenses: list,
+    skip_related: bool,
+    bulk: BulkDatasets | None = None,
+) -> str | None:
+    """
+    `process_factor`, retried up to `DATASET_ATTEMPTS` times on transient errors, with an
+    exponential backoff (or the `Retry-After` of a rate limit) between attempts.
+    """
+    with tracing.span("dataset", (factor.get("element") or {}).get("id") or factor["id"]):
+        for attempt in range(1, DATASET_ATTEMPTS + 1):
+            try:
+                return process_factor(env, factor, licenses, skip_related, bulk)
+            except Exception as e:
+                if attempt == DATASET_ATTEMPTS or not is_transient(e):
+                    tracing.capture_exception(e)
+                    raise DatasetFailed(e, attempt) from e
+                wait = RETRY_BACKOFF * 2 ** (attempt - 1)
+                if isinstance(e, HTTPError) and e.response is not None:
+                    if e.response.status_code == 429:
+                        wait = max(wait, retry_after(e.response))
+                app.log.warning(
+                    f"Failed to process dataset {factor['element']['id']} ({e!r}), "
+                    f"attempt {attempt + 1} in {wait}s"
+                )
+                time.sleep(wait)
+
+
+def wait_tasks(
+    tasks: list[Task], processed: set[str], base_url: str, run_id: int | None = None
+) -> set[str]:
+    """
+    Wait for `tasks`, each is released (factor and result) as soon as it completes.
+    Failed datasets are recorded in `load_failures` (for the run `run_id`), returns their ids.
+    """
+    failed = set()
+    by_future = {task.future: task for task in tasks}
+    tasks.clear()
+    for future in as_completed(by_future):
+        task = by_future.pop(future)
+        try:
+            if dataset_id := future.result():
+                processed.add(dataset_id)
+        except Exception as e:
+            error, attempts = (e.error, e.attempts) if isinstance(e, DatasetFailed) else (e, 1)
+            dataset_id = task.dataset["element"]["id"]
+            app.log.error(
+                f"Failed to process dataset {dataset_id} (factor {task.dataset['id']}): {str(e)}\n"
+                + traceback.format_exc()
+            )
+            payload_url = f"{base_url}/api/2/datasets/{dataset_id}/"
+            record_failure(app.db, task.dataset, payload_url, error, attempts, run_id)
+            failed.add(dataset_id)
+    return failed
+
+
+def load_datasets(
+    env: str,
+    load_run: LoadRun,
+    skip_related: bool,
+    max_workers: int,
+    skip_bulk_fetch: bool = False,
+):
+    """
+    Load the datasets of the topic, checkpointing `load_run` after each page of factors.
+
+    A resumed run restarts from the first page not fully loaded and skips the datasets
+    it already loaded.
+
+    Datasets and their resources are fetched in bulk from the datasets list filtered by topic
+    (unless `skip_bulk_fetch`), page by page along with the factors, datasets missing from
+    it are fetched one by one.
+    """
+    base_url = get_config_value(env, "base_url")
+    topic_slug = get_config_value(env, "topic_slug")
+    request_topic = app.req.get(f"{base_url}/api/2/topics/{topic_slug}/")
+    request_topic.raise_for_status()
+    topic = request_topic.json()
+
+    licenses = json.loads(downloads.get(app.req, f"{base_url}/api/1/datasets/licenses/"))
+
+    processed = set(load_run.processed)
+    bulk = None
+    if not skip_bulk_fetch:
+        bulk = BulkDatasets(
+            base_url,
+            topic["id"],
+            headers={"x-api-key": get_config_value(env, "api_key")},
+            session=app.req,
+            log=app.log,
+            skip=processed,
+        )
+    # read before the commits, which expire load_run (a refresh query each)
+    run_id = load_run.id
+    pages = iter_pages(
+        {"href": load_run.topic_page or topic["elements"]["href"]},
+        page_size=200,
+        session=app.req,
+        log=app.log,
+    )
+    # Create a thread pool for parallel processing
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=f"{env}-worker"
+    ) as executor:
+        # the next page is submitted before waiting for the current one, to keep workers busy
+        pending: list[Task] = []
+        for page in pages:
+            factors = [
+                factor
+                for factor in page.data
+                if (factor.get("element") or {}).get("id") not in processed
+            ]
+            if bulk:
+                elements = [factor.get("element") or {} for factor in factors]
+                bulk.prefetch([e["id"] for e in elements if e.get("class") == "Dataset"])
+            tasks = [
+                Task(
+                    executor.submit(
+                        copy_context().run,
+                        profiled(process_factor_with_retries),
+                        env,
+                        factor,
+                        licenses,
+                        skip_related,
+                        bulk,
+                    ),
+                    factor,
+                )
+                for factor in factors
+            ]
+            wait_tasks(pending, processed, base_url, run_id)
+            checkpoint(app.db, load_run, topic_page=page.url, processed=processed)
+            pending = tasks
+        wait_tasks(pending, processed, base_url, run_id)
+    checkpoint(app.db, load_run, processed=processed)
+    if bulk:
+        app.log.info(
+            f"{bulk.hits} datasets loaded from bulk fetch ({bulk.fetched} fetched), "
+            f"{bulk.misses} fetched by id"
+        )
+
+    # failures left are those of this run (before a resume too)
+    clear_failures(app.db, processed, run_id)
+    failed = {failure.dataset_id for failure in get_failures(app.db, run_id)}
+    if failed:
+        app.log.warning(
+            f"{len(failed)} datasets failed, cf `load_failures`, reprocess them with retry-failed"
+        )
+
+    # datasets not loaded by this run (gone from the topic or private), failed ones are kept
+    # as they were
+    if nb_deleted := mark_deleted(app.db, Dataset, processed | failed):
+        app.log.info(f"{nb_deleted} datasets flagged as deleted")
+    if not skip_related:
+        deleted_datasets = select(Dataset.dataset_id).where(Dataset.deleted)
+        app.db.execute(delete(Resource).where(Resource.dataset_id.in_(deleted_datasets)))
+        app.db.commit()
 
 
 @cli
@@ -285,7 +635,11 @@ def load(
     skip_related: bool = False,
     skip_metrics: bool = False,
     skip_stats: bool = False,
+    skip_views: bool = False,
+    skip_snapshots: bool = False,
     max_workers: int = 4,
+    resume: bool = False,
+    skip_bulk_fetch: bool = False,
 ):
     """
     Load objects from our universe into the database:
@@ -295,63 +649,142 @@ def load(
     - bouquets (related)
     - organizations (related)
 
-    Also compute associated metrics and load stats from Matomo.
+    Also compute associated metrics, load stats from Matomo, refresh dashboard views
+    and build static snapshots.
+
+    Progress is checkpointed in `load_runs`, `resume` continues the last interrupted run
+    (with the same options) from its last checkpoint.
     """
-    base_url = get_config_value(env, "base_url")
-    topic_slug = get_config_value(env, "topic_slug")
-    request_topic = app.req.get(f"{base_url}/api/2/topics/{topic_slug}/")
-    request_topic.raise_for_status()
-    topic = request_topic.json()
+    load_run, resumed = start_run(app.db, resume)
+    if resumed:
+        app.log.info(f"Resuming load run {load_run.id} from phase {load_run.phase}")
 
-    request_licenses = app.req.get(f"{base_url}/api/1/datasets/licenses/")
-    request_licenses.raise_for_status()
-    licenses = request_licenses.json()
+    def load_metrics():
+        manage_partitions(env=env)
+        # we're loading metrics from last month, only run on the second of the month
+        if date.today().day == 2:
+            load_datagouvfr_metrics(env=env)
+        compute_metrics(env=env)
 
-    # pre-set deleted, will be overwritten by actual upsert
-    stmt = update(Dataset).values(deleted=True)
-    app.db.execute(stmt)
-    app.db.commit()
+    def load_all_stats():
+        load_stats(env=env, period=StatsPeriod.DAY)
+        load_stats(env=env, period=StatsPeriod.MONTH)
 
-    if not skip_related:
-        app.db.execute(text("DELETE FROM resources"))
+    def publish():
+        # signals readers (API caches) that data has changed
+        generation = LoadGeneration(finished_at=datetime.now())
+        app.db.add(generation)
         app.db.commit()
+        if not skip_snapshots:
+            build_snapshots(env=env, version=generation.id)
+
+    steps = {
+        "datasets": lambda: load_datasets(
+            env, load_run, skip_related, max_workers, skip_bulk_fetch
+        ),
+        "organizations": None if skip_related else lambda: update_organizations(env=env),
+        "bouquets": None if skip_related else lambda: load_bouquets(env=env),
+        "metrics": None if skip_metrics else load_metrics,
+        "stats": None if skip_stats else load_all_stats,
+        "views": None if skip_views else lambda: refresh_views(env=env),
+        "publish": publish,
+    }
+    for phase in PHASES:
+        if is_done(load_run, phase):
+            continue
+        if step := steps[phase]:
+            with track_phase(phase):
+                step()
+        checkpoint(app.db, load_run, phase=next_phase(phase))
 
-    # Create a thread pool for parallel processing
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        tasks = []
 
-        for factor in iter_rel(topic["elements"], page_size=200, session=app.req, log=app.log):
-            future = executor.submit(
-                process_factor,
-                env,
+@cli
+def retry_failed(env: str = "demo", skip_related: bool = False, max_workers: int = 4):
+    """
+    Reprocess only the datasets recorded in `load_failures` by previous loads, with the same
+    retries. They are removed from it once loaded (or found private).
+    """
+    factors = [failure.factor for failure in get_failures(app.db)]
+    if not factors:
+        app.log.info("No failed datasets to reprocess")
+        return
+    base_url = get_config_value(env, "base_url")
+    licenses = json.loads(downloads.get(app.req, f"{base_url}/api/1/datasets/licenses/"))
+    processed = set()
+    with ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=f"{env}-worker"
+    ) as executor:
+        tasks = [
+            Task(
+                executor.submit(
+                    copy_context().run,
+                    profiled(process_factor_with_retries),
+                    env,
+                    factor,
+                    licenses,
+                    skip_related,
+                ),
                 factor,
-                licenses,
-                skip_related=skip_related,
             )
-            tasks.append(Task(future, factor))
+            for factor in factors
+        ]
+        failed = wait_tasks(tasks, processed, base_url)
+    clear_failures(app.db, {factor["element"]["id"] for factor in factors} - failed)
+    app.log.info(f"{len(processed)} datasets reprocessed, {len(failed)} still failing")
 
-        for task in tasks:
-            try:
-                task.future.result()
-            except Exception as e:
-                app.log.error(
-                    f"Failed to process dataset {task.dataset['id']}: {str(e)}\n"
-                    + traceback.format_exc()
-                )
 
-    if not skip_related:
-        update_organizations(env=env)
-        load_bouquets(env=env)
+@cli
+def load_all(
+    envs: list[str] = [],
+    skip_related: bool = False,
+    skip_metrics: bool = False,
+    skip_stats: bool = False,
+    skip_views: bool = False,
+    skip_snapshots: bool = False,
+    max_workers: int = 4,
+    resume: bool = False,
+    skip_bulk_fetch: bool = False,
+):
+    """
+    Run `load` for several envs (demo and prod by default) concurrently in this process.
 
-    if not skip_metrics:
-        # we're loading metrics from last month, only run on the second of the month
-        if date.today().day == 2:
-            load_datagouvfr_metrics(env=env)
-        compute_metrics(env=env)
+    Each env gets its own engine, HTTP session and `max_workers` threads. Downloads of the
+    same URL by several envs are only fetched once (cf `DownloadCache`), demo and prod have
+    none in common.
+    """
+    envs = envs or ["demo", "prod"]
+    engine_overrides = app.engine_overrides
+    profiler = app.profiler
+    memory_report = app.memory_report
+
+    def load_env(env: str):
+        with (
+            env_context(env, profiler, memory_report, **engine_overrides),
+            tracing.span("env", env),
+        ):
+            load(
+                env=env,
+                skip_related=skip_related,
+                skip_metrics=skip_metrics,
+                skip_stats=skip_stats,
+                skip_views=skip_views,
+                skip_snapshots=skip_snapshots,
+                max_workers=max_workers,
+                resume=resume,
+                skip_bulk_fetch=skip_bulk_fetch,
+            )
 
-    if not skip_stats:
-        load_stats(env=env,period=StatsPeriod.DAY)
-        load_stats(env=env, period=StatsPeriod.MONTH)
+    with ThreadPoolExecutor(max_workers=len(envs), thread_name_prefix="load") as executor:
+        futures = {env: executor.submit(tracing.propagated(load_env), env) for env in envs}
+    failed = []
+    for env, future in futures.items():
+        try:
+            future.result()
+        except Exception as e:
+            app.log.error(f"Load failed for env {env!r}: {e}\n" + traceback.format_exc())
+            failed.append(env)
+    if failed:
+        raise RuntimeError(f"Load failed for env(s): {', '.join(failed)}")
 
 
 @cli
@@ -360,99 +793,81 @@ def compute_metrics(env: str = "demo"):
     Fill the time-series metrics table with today's data
     """
     app.log.info("Computing metrics...")
+    metrics = MetricsBatch()
 
+    # counts per organization in a single query, whatever the number of organizations
+    fields = [indicator["field"] for indicator in DatasetComputedColumns.indicators]
     query = (
-        select(Dataset.organization)
-        .distinct()
+        select(
+            Dataset.organization,
+            func.count().label("nb_datasets"),
+            *(
+                func.count().filter(getattr(Dataset, f"has_{field}")).label(f"nb_{field}")
+                for field in fields
+            ),
+        )
         .where(and_(~Dataset.deleted, Dataset.organization.is_not(None)))
+        .group_by(Dataset.organization)
     )
-    org_ids = app.db.execute(query).scalars().all()
-    add_metric(app.db, "nb_organizations", len(org_ids))
+    counts = app.db.execute(query).mappings().all()
+    metrics.add("nb_organizations", len(counts))
+    quality_scores = compute_quality_scores(app.db)
 
     agg = defaultdict(int)
 
-    for org_id in org_ids:
-        nb_datasets = app.db.query(Dataset).filter_by(organization=org_id, deleted=False).count()
-        add_metric(app.db, "nb_datasets", nb_datasets, organization=org_id)
-        agg["nb_datasets"] += nb_datasets
-
+    for row in counts:
+        org_id = row["organization"]
         # average quality score per organization
-        add_metric(
-            app.db,
-            "avg_quality__score",
-            compute_quality_score(app.db, org_id),
-            organization=org_id,
-        )
+        metrics.add("avg_quality__score", quality_scores.get(org_id), organization=org_id)
 
-        for indicator in DatasetComputedColumns.indicators:
-            field = indicator["field"]
-            query = {
-                "deleted": False,
-                f"has_{field}": True,
-                "organization": org_id,
-            }
-            measurement = f"nb_{field}"
-            value = app.db.query(Dataset).filter_by(**query).count()
-            add_metric(app.db, measurement, value, organization=org_id)
-            agg[measurement] += value
+        for measurement in ["nb_datasets", *(f"nb_{field}" for field in fields)]:
+            metrics.add(measurement, row[measurement], organization=org_id)
+            agg[measurement] += row[measurement]
 
     for agg_key, agg_value in agg.items():
-        add_metric(app.db, agg_key, agg_value, organization=None)
+        metrics.add(agg_key, agg_value, organization=None)
 
     # global average quality score
-    add_metric(app.db, "avg_quality__score", compute_quality_score(app.db), organization=None)
+    metrics.add("avg_quality__score", compute_quality_score(app.db), organization=None)
 
     # nb of associations bouquet <-> dataset from universe
     nb_datasets_bouquets = app.db.query(DatasetBouquet).count()
-    add_metric(
-        app.db,
+    metrics.add(
         "nb_datasets_from_universe_in_bouquets",
         nb_datasets_bouquets,
         organization=None,
     )
 
-    bouquets = app.db.query(Bouquet)
-    add_metric(
-        app.db,
-        "nb_bouquets_public",
-        bouquets.filter_by(deleted=False, private=False).count(),
-        organization=None,
-    )
+    bouquets = app.db.query(Bouquet).filter_by(deleted=False, private=False).all()
+    metrics.add("nb_bouquets_public", len(bouquets), organization=None)
     # nb_datasets_in_bouquets
-    add_metric(
-        app.db,
-        "nb_datasets_in_bouquets_public",
-        sum(b.nb_datasets for b in bouquets.filter_by(deleted=False, private=False)),
-        organization=None,
+    metrics.add(
+        "nb_datasets_in_bouquets_public", sum(b.nb_datasets for b in bouquets), organization=None
     )
     # nb_datasets_external_in_bouquets
-    add_metric(
-        app.db,
+    metrics.add(
         "nb_datasets_external_in_bouquets_public",
-        sum(b.nb_datasets_external for b in bouquets.filter_by(deleted=False, private=False)),
+        sum(b.nb_datasets_external for b in bouquets),
         organization=None,
     )
     # nb_factors_in_bouquets
-    add_metric(
-        app.db,
-        "nb_factors_in_bouquets_public",
-        sum(b.nb_factors for b in bouquets.filter_by(deleted=False, private=False)),
-        organization=None,
+    metrics.add(
+        "nb_factors_in_bouquets_public", sum(b.nb_factors for b in bouquets), organization=None
     )
     # nb_factors_missing_in_bouquets
-    add_metric(
-        app.db,
+    metrics.add(
         "nb_factors_missing_in_bouquets_public",
-        sum(b.nb_factors_missing for b in bouquets.filter_by(deleted=False, private=False)),
+        sum(b.nb_factors_missing for b in bouquets),
         organization=None,
     )
     # nb_factors_not_available_in_bouquets
-    add_metric(
-        app.db,
+    metrics.add(
         "nb_factors_not_available_in_bouquets_public",
-        sum(b.nb_factors_not_available for b in bouquets.filter_by(deleted=False, private=False)),
+        sum(b.nb_factors_not_available for b in bouquets),
         organization=None,
     )
+    metrics.flush(app.db)
+    app.db.commit()
 
 
 @cli
@@ -553,8 +968,7 @@ def load_stats(
         for method in methods:
             data |= fetch(method)
 
-        columns = [column.key for column in inspect(Stats).attrs if column.key != "id"]
-        db_data = {k: v for k, v in data.items() if k in columns}
+        db_data = {k: v for k, v in data.items() if k in MODEL_COLUMNS[Stats].insertable}
         db_data["date"] = parsed_day
         db_data["segment"] = segment
         db_data["period"] = period
@@ -571,14 +985,163 @@ def load_stats(
 @cli
 def init_db(env: str = "demo"):
     """Create the tables in the env database from current schema"""
-    engine = app.db.get_bind()
-    Base.metadata.create_all(engine)
+    connection = app.db.connection()
+    Base.metadata.create_all(connection)
+    create_views(connection)
+    app.db.commit()
+    for table in PARTITIONED_TABLES:
+        create_default_partition(app.db, table)
+    manage_partitions(env=env)
     # mark current schema as up-to-date re alembic
     os.environ["ALEMBIC_ENV"] = env
+    from alembic import command
+    from alembic.config import Config
+
     alembic_cfg = Config("alembic.ini")
     command.stamp(alembic_cfg, "head")
 
 
+@cli
+def migrate(envs: list[str] = [], revision: str = "head"):
+    """Upgrade the database of each env (demo and prod by default) in this process"""
+    from alembic import command
+    from alembic.config import Config
+
+    for env in envs or ["demo", "prod"]:
+        app.log.info(f"Upgrading env {env!r} to {revision}...")
+        # read by alembic/env.py
+        os.environ["ALEMBIC_ENV"] = env
+        command.upgrade(Config("alembic.ini"), revision)
+
+
+@cli
+def manage_partitions(
+    env: str = "demo", months_ahead: int = 3, keep_months: int = 0, drop: bool = False
+):
+    """
+    Create the upcoming monthly partitions of the metrics tables.
+
+    If `keep_months` is set, partitions older than `keep_months` months are detached
+    (and dropped if `drop`).
+    """
+    this_month = date.today().replace(day=1)
+    for table in PARTITIONED_TABLES:
+        for partition in ensure_partitions(
+            app.db, table, this_month, add_months(this_month, months_ahead)
+        ):
+            app.log.info(f"Created partition {partition.name}")
+        if keep_months:
+            for partition in detach_partitions(
+                app.db, table, add_months(this_month, -keep_months), drop=drop
+            ):
+                app.log.info(f"{'Dropped' if drop else 'Detached'} partition {partition.name}")
+
+
+@cli
+def downsample_metrics(env: str = "demo", keep_daily_months: int = 13):
+    """Roll daily metrics older than `keep_daily_months` months up into monthly averages"""
+    until = add_months(date.today(), -keep_daily_months - 1)
+    for table in PARTITIONED_TABLES:
+        if not (oldest := get_oldest_month(app.db, table)):
+            continue
+        for month in iter_months(oldest, until):
+            if nb_rows := downsample_month(app.db, table, month):
+                app.log.info(f"Downsampled {table} for {month:%Y-%m} into {nb_rows} rows")
+
+
+@cli
+def export(
+    env: str = "demo",
+    output: str = "export",
+    tables: list[str] = [],
+    full: bool = False,
+    batch_size: int = 10_000,
+):
+    """
+    Export tables snapshots (all by default) to partitioned Parquet files in `output/<env>/`.
+
+    Metrics tables are appended incrementally (rows written since the last export) unless `full`.
+    """
+    from export import EXPORTS, export_table
+
+    for table in tables or EXPORTS:
+        app.log.info(f"Exporting {table}...")
+        nb_rows = export_table(
+            app.db, table, Path(output) / env, incremental=not full, batch_size=batch_size
+        )
+        app.log.info(f"Exported {nb_rows} rows from {table}")
+
+
+@cli
+def build_snapshots(env: str = "demo", output: str = "snapshots", version: int = 0):
+    """
+    Render key aggregates into compressed JSON files in `output/<env>/<version>-<build>/`,
+    served by the API under /snapshots/. Defaults to the current load generation.
+    """
+    from snapshots import render_snapshots, write_snapshots
+
+    if not version:
+        version = app.db.execute(select(func.coalesce(func.max(LoadGeneration.id), 0))).scalar_one()
+    app.log.info(f"Building snapshots version {version}...")
+    target = write_snapshots(Path(output) / env, version, render_snapshots(app.db))
+    app.log.info(f"Snapshots written to {target}")
+
+
+@cli
+def refresh_views(env: str = "demo", blocking: bool = False):
+    """Refresh the materialized views used by dashboards, concurrently unless `blocking`"""
+    app.log.info("Refreshing dashboard views...")
+    refresh_materialized_views(app.db, concurrently=not blocking)
+
+
+@cli
+def index_report(env: str = "demo", min_live_tuples: int = 1000, limit: int = 10):
+    """Report index usage and missing-index candidates from Postgres statistics"""
+    indexes = get_index_usage(app.db)
+    for index in indexes:
+        app.log.info(f"{index.table}.{index.name}: {index.scans} scans, {index.size} bytes")
+    for index in unused_indexes(indexes):
+        app.log.warning(f"Unused index {index.name} on {index.table} ({index.size} bytes)")
+
+    for table in missing_index_candidates(get_table_scans(app.db), min_live_tuples):
+        app.log.warning(
+            f"Missing index candidate {table.table}: {table.seq_scan} seq scans "
+            f"({table.seq_tup_read} rows read) vs {table.idx_scan} index scans, "
+            f"{table.live_tuples} live rows"
+        )
+
+    statements = get_slow_statements(app.db, limit)
+    if statements is None:
+        app.log.info("pg_stat_statements is not installed, skipping statements report")
+        return
+    for stmt in statements:
+        app.log.info(
+            f"{stmt.total_exec_time:.0f}ms total, {stmt.calls} calls, "
+            f"{stmt.mean_exec_time:.2f}ms mean: {' '.join(stmt.query.split())[:200]}"
+        )
+
+
+@cli
+def bench_drivers(env: str = "demo", datasets: int = 200, metrics: int = 20_000):
+    """
+    Compare the database drivers on the bulk write paths of a load, replayed on `datasets`
+    datasets resources and `metrics` datasets metrics of the env database (rolled back)
+    """
+    from bench import replay_writes
+
+    for driver in DRIVERS:
+        config = get_engine_config(env, **{**app.engine_overrides, "driver": driver})
+        engine = create_tuned_engine(get_config_value(env, "dsn"), config)
+        try:
+            for phase, timing in replay_writes(engine, datasets, metrics).items():
+                app.log.info(
+                    f"{driver} {phase}: {timing.rows} rows in {timing.seconds:.2f}s "
+                    f"({timing.rows / max(timing.seconds, 1e-9):.0f} rows/s)"
+                )
+        finally:
+            engine.dispose()
+
+
 class LogRetry(Retry):
     def increment(
         self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None
@@ -589,14 +1152,23 @@ class LogRetry(Retry):
         return super().increment(method, url, response, error, _pool, _stacktrace)
 
 
-@wrap
-def initialize(env: str):
-    """Initialize App context for cli commands"""
-
-    app.log = logging.getLogger(f"cli[{env}]")
+@contextmanager
+def env_context(
+    env: str,
+    profiler: Profiler | None = None,
+    memory_report: MemoryReport | None = None,
+    **engine_overrides: int | str | None,
+):
+    """Set up the App context of `env` for the current thread"""
+    context = Context()
+    context.log = logging.getLogger(f"cli[{env}]")
+    context.engine_overrides = engine_overrides
+    context.profiler = profiler
+    context.memory_report = memory_report
+    token = _context.set(context)
     app.log.info(f"Working on env {env!r}")
 
-    app.req = Session()
+    context.req = Session()
     adapter = HTTPAdapter(
         max_retries=LogRetry(
             total=10,
@@ -610,18 +1182,86 @@ def initialize(env: str):
     app.req.mount("http://", adapter)
     app.req.mount("https://", adapter)
 
-    dsn = get_config_value(env, "dsn")
-    engine = create_engine(dsn)
-    connection = engine.connect()
-    app.db = scoped_session(sessionmaker(autoflush=True, bind=engine))
+    engine_config = get_engine_config(env, **engine_overrides)
+    engine = create_tuned_engine(get_config_value(env, "dsn"), engine_config)
+    pool_usage = PoolUsage(
+        engine, capacity=engine_config["pool_size"] + engine_config["max_overflow"]
+    )
+    context.db = scoped_session(sessionmaker(autoflush=True, bind=engine))
+
+    try:
+        yield context
+    finally:
+        app.db.close()
+        engine.dispose()
+        app.log.info(f"Connection pool usage: {pool_usage.report()}")
+        if pool_usage.exhausted():
+            app.log.warning("Connection pool exhausted, consider raising --pool-size")
+        _context.reset(token)
+
 
-    yield
+def command_name(argv: list[str]) -> str:
+    """Command(s) of the command line (they can be chained), e.g. `load-all`"""
+    commands = {name.replace("_", "-") for name, obj in globals().items() if hasattr(obj, "_cli")}
+    return " ".join(arg for arg in (a.replace("_", "-") for a in argv) if arg in commands) or "cli"
 
-    app.db.close()
-    connection.close()
+
+@wrap
+def initialize(
+    env: str,
+    pool_size: int | None = None,
+    max_overflow: int | None = None,
+    statement_timeout: int | None = None,
+    insertmanyvalues_page_size: int | None = None,
+    driver: str | None = None,
+    profile: bool = False,
+    profile_dir: str = "profiles",
+    memory_report: bool = False,
+):
+    """Initialize App context for cli commands"""
+    profiler = None
+    # started before the env context, to trace its setup too
+    transaction = tracing.transaction(command_name(sys.argv[1:]), env)
+    if profile:
+        profiler = Profiler(Path(profile_dir) / f"{env}-{datetime.now():%Y%m%dT%H%M%S}")
+    report = MemoryReport() if memory_report else None
+    with (
+        transaction,
+        env_context(
+            env,
+            profiler=profiler,
+            memory_report=report,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            statement_timeout=statement_timeout,
+            insertmanyvalues_page_size=insertmanyvalues_page_size,
+            driver=driver,
+        ),
+    ):
+        with ExitStack() as stack:
+            if profiler:
+                stack.enter_context(profiler)
+                stack.enter_context(profiler.profiling())
+            if report:
+                stack.enter_context(report)
+                stack.enter_context(report.phase("command", app.log))
+            yield
+        if profiler:
+            profiler.write(app.log)
 
 
 if __name__ == "__main__":
     # env is a global parameter that can be overloaded via --env
     # every cli command has access to it, but does not _need_ to declare it
-    run(env="demo")
+    # engine settings override the env ones (cf config.get_engine_config)
+    run(
+        env="demo",
+        pool_size={"default": None, "type": int},
+        max_overflow={"default": None, "type": int},
+        statement_timeout={"default": None, "type": int},
+        insertmanyvalues_page_size={"default": None, "type": int},
+        driver={"default": None, "type": str},
+        profile=False,
+        profile_dir="profiles",
+        memory_report=False,
+    )
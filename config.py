@@ -1,9 +1,48 @@
 import os
-from typing import Literal, TypedDict
+from typing import Literal, NotRequired, TypedDict
 
 import requests
 from requests.sessions import Session
-from yaml import safe_load
+
+from downloads import DownloadCache
+
+
+class EngineConfig(TypedDict):
+    """SQLAlchemy engine settings, cf `db.create_tuned_engine`"""
+
+    # "psycopg2" or "psycopg" (3, pipeline mode and binary COPY on the bulk write paths)
+    driver: str
+    pool_size: int
+    max_overflow: int
+    pool_pre_ping: bool
+    # seconds
+    pool_recycle: int
+    # milliseconds, 0 to disable
+    statement_timeout: int
+    # psycopg2 only, "values_plus_batch" also batches UPDATEs and DELETEs
+    executemany_mode: str
+    executemany_batch_page_size: int
+    insertmanyvalues_page_size: int
+    # server-side cursors for every query, `yield_per` enables them per query anyway
+    stream_results: bool
+
+
+DRIVERS = ("psycopg2", "psycopg")
+
+# tuned for the bulk loader: each `load` worker thread holds a connection (scoped session)
+# on top of the main thread's, and INSERTs are sent in large pages
+DEFAULT_ENGINE_CONFIG: EngineConfig = {
+    "driver": "psycopg2",
+    "pool_size": 8,
+    "max_overflow": 4,
+    "pool_pre_ping": True,
+    "pool_recycle": 1800,
+    "statement_timeout": 0,
+    "executemany_mode": "values_plus_batch",
+    "executemany_batch_page_size": 500,
+    "insertmanyvalues_page_size": 1000,
+    "stream_results": False,
+}
 
 
 class ConfigDict(TypedDict):
@@ -18,9 +57,14 @@ class ConfigDict(TypedDict):
     api_key: str | None
     metrics_api_url: str | None
     front_config_file: str | None
+    # overrides some of DEFAULT_ENGINE_CONFIG
+    engine: NotRequired[dict[str, int | bool | str]]
 
 
-ENVS_CONF: dict[Literal["prod", "demo", "local"], ConfigDict] = {
+# local stand-in of the upstreams, serving a synthetic catalog (cf standin.py)
+STANDIN_URL = os.getenv("STANDIN_URL", "http://localhost:7001")
+
+ENVS_CONF: dict[Literal["prod", "demo", "local", "synthetic"], ConfigDict] = {
     "prod": {
         "universe_name": "univers-ecospheres",
         "topic_slug": "univers-ecospheres",
@@ -33,6 +77,8 @@ ENVS_CONF: dict[Literal["prod", "demo", "local"], ConfigDict] = {
         "api_key": os.getenv("DATAGOUV_API_KEY_PROD"),
         "metrics_api_url": "https://metric-api.data.gouv.fr/api",
         "front_config_file": "https://raw.githubusercontent.com/opendatateam/udata-front-kit/refs/heads/ecospheres-prod/configs/ecospheres/config.yaml",
+        # the prod database is shared with Metabase, don't let a runaway query hold it
+        "engine": {"statement_timeout": 60 * 60 * 1000},
     },
     "demo": {
         "universe_name": "univers-ecospheres",
@@ -60,6 +106,19 @@ ENVS_CONF: dict[Literal["prod", "demo", "local"], ConfigDict] = {
         "metrics_api_url": None,
         "front_config_file": "https://raw.githubusercontent.com/opendatateam/udata-front-kit/refs/heads/main/configs/ecospheres/config.yaml",
     },
+    "synthetic": {
+        "universe_name": "univers-ecospheres",
+        "topic_slug": "univers-ecospheres-synthetique",
+        "base_url": STANDIN_URL,
+        "dsn": os.getenv("DATABASE_URL_SYNTHETIC", ""),
+        "stats_url": f"{STANDIN_URL}/index.php",
+        "stats_site_id": "1",
+        "stats_token": "synthetic",
+        "org_api": f"{STANDIN_URL}/organizations-datasets.json",
+        "api_key": None,
+        "metrics_api_url": f"{STANDIN_URL}/metrics/api",
+        "front_config_file": f"{STANDIN_URL}/config.yaml",
+    },
 }
 
 
@@ -71,9 +130,31 @@ def get_config_value(env: str, key: str) -> str:
     return ENVS_CONF[env][key]
 
 
-def get_front_config(env: str, session: Session | None = None) -> dict:
+def get_engine_config(env: str, **overrides: int | bool | str | None) -> EngineConfig:
+    """Engine settings of `env`: defaults, then `ENVS_CONF`, then the not None `overrides`"""
+    if env not in ENVS_CONF:
+        raise ValueError(f"Invalid environment '{env}'.")
+    overrides = {
+        **ENVS_CONF[env].get("engine", {}),
+        **{k: v for k, v in overrides.items() if v is not None},
+    }
+    if unknown := overrides.keys() - DEFAULT_ENGINE_CONFIG.keys():
+        raise ValueError(f"Invalid engine setting(s) {', '.join(sorted(unknown))}.")
+    config = {**DEFAULT_ENGINE_CONFIG, **overrides}
+    if config["driver"] not in DRIVERS:
+        raise ValueError(f"Invalid driver '{config['driver']}', use one of {', '.join(DRIVERS)}.")
+    return config  # type: ignore
+
+
+def get_front_config(
+    env: str, session: Session | None = None, cache: DownloadCache | None = None
+) -> dict:
+    from yaml import safe_load
+
     s = session or requests
     config_file = get_config_value(env, "front_config_file")
+    if cache:
+        return safe_load(cache.get(session or requests.Session(), config_file))
     r = s.get(config_file)
     r.raise_for_status()
     return safe_load(r.content)
@@ -1,15 +1,43 @@
-from typing import TypeAlias, TypeVar
+from collections.abc import Collection, Iterator
+from contextlib import contextmanager
+from threading import Lock
+from typing import Any, NamedTuple, TypeAlias, TypeVar, cast
 
+from sqlalchemy import (
+    CursorResult,
+    Engine,
+    String,
+    any_,
+    bindparam,
+    create_engine,
+    delete,
+    event,
+    make_url,
+    not_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert
 from sqlalchemy.orm import scoped_session
+from sqlalchemy.sql.schema import Table
 
-from models import Bouquet, Dataset, Metric, Organization, Resource, Stats
+from config import EngineConfig
+from models import MODEL_COLUMNS, Bouquet, Dataset, Metric, Organization, Resource, Stats
 
 Model: TypeAlias = Bouquet | Dataset | Metric | Organization | Resource | Stats
 T = TypeVar("T", bound=Model)
 
 
 def upsert(session: scoped_session, new: T, existing: T | None, auto_commit: bool = True) -> T:
-    if existing:
+    """
+    Insert `new` or merge it into `existing`. Models with a `content_hash` are not written
+    if it didn't change.
+    """
+    new_hash = getattr(new, "content_hash", None)
+    if existing and new_hash and new_hash == getattr(existing, "content_hash", None):
+        result = existing
+    elif existing:
         new.id = existing.id
         session.merge(new)
         result = existing
@@ -21,3 +49,239 @@ def upsert(session: scoped_session, new: T, existing: T | None, auto_commit: boo
     if auto_commit:
         session.commit()
     return result
+
+
+def mark_deleted(
+    session: scoped_session, model: type[Dataset | Bouquet], seen: Collection[str]
+) -> int:
+    """
+    Flag as deleted the rows of `model` whose external id is not in `seen`, in a single
+    UPDATE touching only those rows. Returns the number of newly deleted rows.
+
+    Their `content_hash` is reset, so that they are rewritten (undeleted) when seen again.
+    """
+    id_column = {Dataset: Dataset.dataset_id, Bouquet: Bouquet.bouquet_id}[model]
+    values: dict[str, Any] = {"deleted": True}
+    if hasattr(model, "content_hash"):
+        values["content_hash"] = None
+    stmt = (
+        update(model)
+        .where(~model.deleted, not_(id_column == any_(bindparam("seen", type_=ARRAY(String)))))
+        .values(values)
+        .execution_options(synchronize_session=False)
+    )
+    result = session.execute(stmt, {"seen": list(seen)})
+    session.commit()
+    return cast(CursorResult, result).rowcount
+
+
+class ResourceSync(NamedTuple):
+    inserted: int
+    updated: int
+    deleted: int
+
+
+def sync_resources(
+    session: scoped_session, dataset_id: str, resources: list[Resource]
+) -> ResourceSync:
+    """
+    Sync the resources of a dataset by `resource_id`: insert the new ones, update the ones
+    whose content hash changed and delete the ones that disappeared. Unchanged resources
+    are not touched.
+    """
+    existing = dict(
+        session.execute(
+            select(Resource.resource_id, Resource.content_hash).where(
+                Resource.dataset_id == dataset_id
+            )
+        ).all()
+    )
+    # the last one wins if the payload has duplicates
+    new = {r.resource_id: r for r in resources}
+    changed = [r for id, r in new.items() if id not in existing or existing[id] != r.content_hash]
+    gone = existing.keys() - new.keys()
+
+    # the delete and the upsert don't depend on each other: one round trip with psycopg 3
+    with pipeline(session):
+        if gone:
+            session.execute(
+                delete(Resource).where(
+                    Resource.dataset_id == dataset_id, Resource.resource_id.in_(gone)
+                )
+            )
+        if changed:
+            columns = MODEL_COLUMNS[Resource].insertable
+            stmt = insert(Resource).values([{k: getattr(r, k) for k in columns} for r in changed])
+            stmt = stmt.on_conflict_do_update(
+                constraint="uq_resources_dataset_id_resource_id",
+                set_={k: stmt.excluded[k] for k in columns - {"dataset_id", "resource_id"}},
+            )
+            session.execute(stmt)
+    nb_inserted = sum(1 for r in changed if r.resource_id not in existing)
+    return ResourceSync(nb_inserted, len(changed) - nb_inserted, len(gone))
+
+
+def uses_psycopg(session: scoped_session) -> bool:
+    """The session is bound to a psycopg 3 engine (pipeline mode and `COPY` from Python)"""
+    return session.get_bind().dialect.driver == "psycopg"
+
+
+@contextmanager
+def pipeline(session: scoped_session) -> Iterator[None]:
+    """
+    Send the statements of the block without waiting for each result (psycopg 3 pipeline
+    mode), they must not read results. A no-op with other drivers.
+    """
+    if not uses_psycopg(session):
+        yield
+        return
+    import psycopg
+
+    dbapi_connection = session.connection().connection.dbapi_connection
+    assert isinstance(dbapi_connection, psycopg.Connection)
+    with dbapi_connection.pipeline():
+        yield
+
+
+# psycopg 3 type names of the SQLAlchemy compiled types that differ, cf `upsert_rows`
+PG_TYPE_NAMES = {"double precision": "float8", "timestamp without time zone": "timestamp"}
+# below that, a multi-values INSERT is quicker than a staging table and a COPY
+COPY_MIN_ROWS = 1000
+
+
+def upsert_rows(
+    session: scoped_session,
+    table: Table,
+    rows: list[dict],
+    constraint: str,
+    update_columns: Collection[str],
+) -> int:
+    """
+    Insert `rows` (dicts with the same keys) into `table`, updating `update_columns` of
+    those conflicting on `constraint`. With psycopg 3, large batches are sent with a binary
+    `COPY` into a staging table. The caller commits.
+    """
+    if not rows:
+        return 0
+    columns = list(rows[0])
+    if uses_psycopg(session) and len(rows) >= COPY_MIN_ROWS:
+        _copy_upsert(session, table, rows, columns, constraint, update_columns)
+    else:
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            constraint=constraint, set_={k: stmt.excluded[k] for k in update_columns}
+        )
+        session.execute(stmt, rows)
+    return len(rows)
+
+
+def pg_type_names(table: Table, columns: list[str], dialect) -> list[str]:
+    names = [table.c[c].type.compile(dialect=dialect).lower() for c in columns]
+    return [PG_TYPE_NAMES.get(name, name) for name in names]
+
+
+def _copy_upsert(
+    session: scoped_session,
+    table: Table,
+    rows: list[dict],
+    columns: list[str],
+    constraint: str,
+    update_columns: Collection[str],
+):
+    import psycopg
+
+    staging = f"staging_{table.name}"
+    names = ", ".join(columns)
+    # no constraint is copied, `id` and co are left to the INSERT defaults
+    session.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+    session.execute(
+        text(
+            f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+            f"SELECT {names} FROM {table.name} WITH NO DATA"
+        )
+    )
+    types = pg_type_names(table, columns, session.get_bind().dialect)
+    dbapi_connection = session.connection().connection.dbapi_connection
+    assert isinstance(dbapi_connection, psycopg.Connection)
+    cursor = dbapi_connection.cursor()
+    with cursor.copy(f"COPY {staging} ({names}) FROM STDIN (FORMAT BINARY)") as copy:
+        copy.set_types(types)
+        for row in rows:
+            copy.write_row([row[c] for c in columns])
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in update_columns)
+    session.execute(
+        text(
+            f"INSERT INTO {table.name} ({names}) SELECT {names} FROM {staging} "
+            f"ON CONFLICT ON CONSTRAINT {constraint} DO UPDATE SET {updates}"
+        )
+    )
+
+
+PSYCOPG2_ONLY = ("executemany_mode", "executemany_batch_page_size")
+# not engine arguments, cf `create_tuned_engine`
+NOT_ENGINE_ARGS = ("driver", "statement_timeout", "stream_results")
+
+
+def create_tuned_engine(dsn: str, config: EngineConfig) -> Engine:
+    url = make_url(dsn)
+    if (driver := config.get("driver")) and url.get_backend_name() == "postgresql":
+        url = url.set(drivername=f"postgresql+{driver}")
+    kwargs = {k: v for k, v in config.items() if k not in NOT_ENGINE_ARGS}
+    if url.get_driver_name() != "psycopg2":
+        kwargs = {k: v for k, v in kwargs.items() if k not in PSYCOPG2_ONLY}
+    connect_args = {}
+    if config["statement_timeout"]:
+        connect_args["options"] = f"-c statement_timeout={config['statement_timeout']}"
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        execution_options={"stream_results": bool(config.get("stream_results"))},
+        **kwargs,
+    )
+
+
+class PoolUsage:
+    """Counters of an engine's connection pool, collected from pool events"""
+
+    def __init__(self, engine: Engine, capacity: int | None = None):
+        # max connections checked out at once (pool_size + max_overflow), if bounded
+        self.capacity = capacity
+        self.lock = Lock()
+        self.connections = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.invalidated = 0
+        event.listen(engine, "connect", self.on_connect)
+        event.listen(engine, "checkout", self.on_checkout)
+        event.listen(engine, "checkin", self.on_checkin)
+        event.listen(engine, "invalidate", self.on_invalidate)
+
+    def on_connect(self, *args):
+        with self.lock:
+            self.connections += 1
+
+    def on_checkout(self, *args):
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def on_checkin(self, *args):
+        with self.lock:
+            self.checked_out -= 1
+
+    def on_invalidate(self, *args):
+        with self.lock:
+            self.invalidated += 1
+
+    def exhausted(self) -> bool:
+        """All connections the pool allows have been checked out at the same time"""
+        return self.capacity is not None and self.peak_checked_out >= self.capacity
+
+    def report(self) -> str:
+        return (
+            f"{self.connections} connections opened, {self.invalidated} invalidated, "
+            f"{self.checkouts} checkouts, peak {self.peak_checked_out}/{self.capacity} "
+            "checked out at once"
+        )
@@ -0,0 +1,41 @@
+from concurrent.futures import Future
+from threading import Lock
+
+from requests.sessions import Session
+
+
+class DownloadCache:
+    """
+    Bodies of GET requests of the process, keyed by URL: concurrent requests for the same URL
+    wait for a single download. Failed downloads are not cached.
+
+    Envs of a `load-all` only share what they download from the same URL: demo and local share
+    the organizations list and the front config. demo and prod share nothing, their inputs
+    differ (hosts and branches), so their default `load-all` downloads as much as two `load`.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.items: dict[str, Future[bytes]] = {}
+
+    def get(self, session: Session, url: str) -> bytes:
+        with self.lock:
+            future = self.items.get(url)
+            owner = future is None
+            if owner:
+                future = self.items[url] = Future()
+        assert future
+        if owner:
+            try:
+                r = session.get(url)
+                r.raise_for_status()
+                future.set_result(r.content)
+            except Exception as e:
+                with self.lock:
+                    del self.items[url]
+                future.set_exception(e)
+        return future.result()
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
@@ -0,0 +1,167 @@
+import json
+import shutil
+from collections.abc import Mapping, Sequence
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    Table,
+    func,
+    select,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.orm import scoped_session
+
+from models import MODEL_COLUMNS, Base, Dataset, DatasetMetric, Metric, Stats
+
+STATE_FILE = "_state.json"
+
+
+class Export(NamedTuple):
+    model: type[Base]
+    # hive-style partition column, "month" is derived from the `date` column
+    partition_by: str
+    # only append rows written since the last export (by id)
+    incremental: bool
+
+
+EXPORTS = {
+    "catalog": Export(Dataset, "organization", False),
+    "metrics": Export(Metric, "month", True),
+    "datasets_metrics": Export(DatasetMetric, "month", True),
+    "stats": Export(Stats, "month", False),
+}
+
+
+def arrow_type(column: Column) -> pa.DataType:
+    # JSONB is checked first and exported as JSON strings, its shape varies between rows
+    if isinstance(column.type, JSONB):
+        return pa.string()
+    if isinstance(column.type, ARRAY):
+        return pa.list_(pa.string())
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def get_schema(table: Table, partition_by: str) -> pa.Schema:
+    fields = [pa.field(c.name, arrow_type(c)) for c in table.columns]
+    if partition_by == "month":
+        fields.append(pa.field("month", pa.string()))
+    return pa.schema(fields)
+
+
+def rows_to_table(
+    rows: Sequence[Mapping[Any, Any]], schema: pa.Schema, jsonb: frozenset[str]
+) -> pa.Table:
+    columns = {}
+    for field in schema:
+        if field.name == "month":
+            columns["month"] = [f"{r['date']:%Y-%m}" for r in rows]
+        elif field.name in jsonb:
+            columns[field.name] = [
+                json.dumps(r[field.name]) if r[field.name] is not None else None for r in rows
+            ]
+        else:
+            columns[field.name] = [r[field.name] for r in rows]
+    return pa.Table.from_pydict(columns, schema=schema)
+
+
+def read_state(output: Path) -> dict:
+    state_file = output / STATE_FILE
+    return json.loads(state_file.read_text()) if state_file.exists() else {}
+
+
+def write_state(output: Path, state: dict):
+    tmp = output / f"{STATE_FILE}.tmp"
+    tmp.write_text(json.dumps(state, indent=2))
+    tmp.replace(output / STATE_FILE)
+
+
+def export_table(
+    session: scoped_session,
+    name: str,
+    output: Path,
+    incremental: bool = True,
+    batch_size: int = 10_000,
+) -> int:
+    """
+    Stream `name` table through a server-side cursor into partitioned Parquet files
+    under `output/name`, returns the number of exported rows.
+
+    Incremental exports only append the rows of complete days written since the last
+    export (ids are from a sequence): rows of a date already exported are appended too, e.g.
+    data.gouv.fr metrics dated the 1st but loaded on the 2nd. Other exports replace the
+    previous files.
+    """
+    export = EXPORTS[name]
+    table = export.model.__table__
+    assert isinstance(table, Table)
+    schema = get_schema(table, export.partition_by)
+    # dictionary encoding for (mostly low cardinality) string columns
+    strings = [
+        c.name
+        for c in table.columns
+        if isinstance(c.type, String) and c.name != export.partition_by
+    ]
+    target = output / name
+    output.mkdir(parents=True, exist_ok=True)
+    state = read_state(output)
+
+    query = select(table)
+    # last exported id, a date (exports before ids were tracked) starts over
+    since = state.get(name) if export.incremental and incremental else None
+    if isinstance(since, int):
+        query = query.where(table.c.id > since)
+    else:
+        shutil.rmtree(target, ignore_errors=True)
+    if export.incremental:
+        # rows of the current day can still change: the export stops before the first one,
+        # the rows written after it are exported by the next run (after it, in id order)
+        query = query.where(table.c.date < date.today())
+        pending = select(func.min(table.c.id)).where(table.c.date >= date.today())
+        if isinstance(since, int):
+            pending = pending.where(table.c.id > since)
+        if first_pending := session.execute(pending).scalar():
+            query = query.where(table.c.id < first_pending)
+
+    run_id = f"{datetime.now():%Y%m%dT%H%M%S%f}"
+    nb_rows = 0
+    last_id = None
+    result = session.execute(query, execution_options={"yield_per": batch_size})
+    for i, rows in enumerate(result.mappings().partitions()):
+        batch = rows_to_table(rows, schema, MODEL_COLUMNS[export.model].jsonb)
+        pq.write_to_dataset(
+            batch,
+            target,
+            partition_cols=[export.partition_by],
+            basename_template=f"{run_id}-{i}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            use_dictionary=strings,
+        )
+        nb_rows += len(rows)
+        if export.incremental:
+            last_id = max(filter(None, [last_id, *(r["id"] for r in rows)]))
+
+    if export.incremental and last_id:
+        state[name] = last_id
+        write_state(output, state)
+    return nb_rows
@@ -0,0 +1,151 @@
+"""
+Latency and faults injected by the stand-in server (cf `standin.py`), per endpoint: response
+delays drawn from a distribution, rate limits answered with 429 and `Retry-After`, bursts
+of 5xx and slow bodies.
+
+Configured by a YAML file, keyed by endpoint (the `StandIn` route names), `"*"` for all
+the others:
+
+    "*":
+      latency: lognormal:0.08:0.6   # median 80ms
+    dataset:
+      rate_limit: 20                # requests per second
+    organization:
+      error_rate: 0.01              # 1% of the requests start a burst of 5 errors
+      error_burst: 5
+    datasets:
+      body_rate: 200000             # bytes per second
+"""
+
+import math
+import time
+from collections.abc import Callable
+from random import Random
+from threading import Lock
+from typing import NamedTuple
+
+DEFAULT_ENDPOINT = "*"
+ERROR_STATUSES = (500, 502, 503, 504)
+
+
+class Latency(NamedTuple):
+    """Delay before responding, in seconds: `fixed:a`, `uniform:a:b` or `lognormal:median:sigma`"""
+
+    kind: str = "fixed"
+    a: float = 0
+    b: float = 0
+
+    @classmethod
+    def parse(cls, spec: str | float) -> "Latency":
+        if isinstance(spec, (int, float)):
+            return cls("fixed", spec)
+        kind, *args = spec.split(":")
+        if kind not in ("fixed", "uniform", "lognormal") or not 1 <= len(args) <= 2:
+            raise ValueError(f"Invalid latency '{spec}'.")
+        return cls(kind, *map(float, args))
+
+    def sample(self, rng: Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(self.a), self.b) if self.a else 0
+        return self.a
+
+
+class EndpointFaults(NamedTuple):
+    latency: Latency = Latency()
+    # requests per second, above that 429 with a Retry-After
+    rate_limit: float | None = None
+    # probability that a request starts a burst of `error_burst` 5xx responses
+    error_rate: float = 0
+    error_burst: int = 1
+    error_statuses: tuple[int, ...] = ERROR_STATUSES
+    # bytes per second of the response bodies
+    body_rate: int | None = None
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "EndpointFaults":
+        if unknown := config.keys() - cls._fields:
+            raise ValueError(f"Invalid fault setting(s) {', '.join(sorted(unknown))}.")
+        config = dict(config)
+        if "latency" in config:
+            config["latency"] = Latency.parse(config["latency"])
+        if "error_statuses" in config:
+            config["error_statuses"] = tuple(config["error_statuses"])
+        return cls(**config)
+
+
+class Fault(NamedTuple):
+    status: int
+    headers: dict[str, str]
+
+
+class Bucket:
+    """Token bucket of a rate limit, `rate` tokens per second, bursts of up to `rate`"""
+
+    def __init__(self, rate: float, now: float):
+        self.rate = rate
+        self.capacity = max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = now
+
+    def take(self, now: float) -> float:
+        """0 if a token was taken, otherwise seconds until the next one"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Faults:
+    def __init__(
+        self,
+        endpoints: dict[str, EndpointFaults] | None = None,
+        seed: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.endpoints = endpoints or {}
+        self.rng = Random(seed)
+        self.clock = clock
+        self.lock = Lock()
+        self.buckets: dict[str, Bucket] = {}
+        # errors left in the current burst of each endpoint
+        self.bursts: dict[str, int] = {}
+
+    @classmethod
+    def from_dict(cls, config: dict, seed: int = 0) -> "Faults":
+        return cls({k: EndpointFaults.from_dict(v or {}) for k, v in config.items()}, seed=seed)
+
+    @classmethod
+    def load(cls, path: str, seed: int = 0) -> "Faults":
+        from yaml import safe_load
+
+        with open(path) as f:
+            return cls.from_dict(safe_load(f) or {}, seed=seed)
+
+    def of(self, endpoint: str) -> EndpointFaults:
+        return (
+            self.endpoints.get(endpoint) or self.endpoints.get(DEFAULT_ENDPOINT) or EndpointFaults()
+        )
+
+    def delay(self, endpoint: str) -> float:
+        with self.lock:
+            return self.of(endpoint).latency.sample(self.rng)
+
+    def fault(self, endpoint: str) -> Fault | None:
+        """The error to answer a request of `endpoint` with, if any"""
+        faults = self.of(endpoint)
+        with self.lock:
+            if faults.rate_limit:
+                now = self.clock()
+                bucket = self.buckets.setdefault(endpoint, Bucket(faults.rate_limit, now))
+                if wait := bucket.take(now):
+                    return Fault(429, {"Retry-After": str(math.ceil(wait))})
+            if not self.bursts.get(endpoint) and self.rng.random() < faults.error_rate:
+                self.bursts[endpoint] = faults.error_burst
+            if self.bursts.get(endpoint):
+                self.bursts[endpoint] -= 1
+                return Fault(self.rng.choice(faults.error_statuses), {})
+        return None
@@ -0,0 +1,88 @@
+from collections.abc import Collection, Iterator
+from logging import Logger
+from threading import Lock
+from typing import NamedTuple
+
+from requests.sessions import Session
+
+from rel import Page, iter_pages
+
+# max page size of the data.gouv.fr v1 datasets list
+BULK_PAGE_SIZE = 100
+# datasets fetched ahead of the topic elements at most, cf `BulkDatasets`
+BULK_MAX_BUFFERED = 10 * BULK_PAGE_SIZE
+
+
+class FetchedDataset(NamedTuple):
+    # v2-shaped payload, `resources` is a rel with its total
+    payload: dict
+    resources: list[dict]
+
+
+def from_v1_payload(payload: dict) -> FetchedDataset:
+    """v1 datasets embed their resources, v2 ones link to them"""
+    resources = payload.get("resources") or []
+    return FetchedDataset({**payload, "resources": {"total": len(resources)}}, resources)
+
+
+class BulkDatasets:
+    """
+    Datasets of a topic, fetched in pages from the v1 datasets list (resources included)
+    instead of one request per dataset plus its resources pages.
+
+    Pages are fetched in step with the topic elements: `prefetch` the datasets of a page of
+    elements before taking them. The list only has public datasets and isn't in the order
+    of the elements, so at most `max_buffered` datasets are kept ahead of the elements,
+    the others are left to per-id fetches by the caller: memory doesn't grow with the
+    catalog. Datasets are dropped once taken, those in `skip` (e.g. already loaded by a
+    resumed run) are not kept.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        topic_id: str,
+        headers: dict = {},
+        session: Session | None = None,
+        log: Logger | None = None,
+        skip: Collection[str] = (),
+        max_buffered: int = BULK_MAX_BUFFERED,
+    ):
+        url = f"{base_url}/api/1/datasets/?topic={topic_id}&page_size={BULK_PAGE_SIZE}"
+        self.pages: Iterator[Page] | None = iter_pages(
+            {"href": url}, headers=headers, session=session, log=log
+        )
+        self.skip = skip
+        self.max_buffered = max_buffered
+        self.lock = Lock()
+        self.datasets: dict[str, FetchedDataset] = {}
+        self.fetched = 0
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, dataset_ids: Collection[str]):
+        """
+        Fetch the next pages until `dataset_ids` are all there, the list is exhausted or
+        `max_buffered` datasets are waiting to be taken
+        """
+        with self.lock:
+            missing = set(dataset_ids) - self.datasets.keys()
+        while missing and self.pages and len(self.datasets) < self.max_buffered:
+            if (page := next(self.pages, None)) is None:
+                self.pages = None
+                break
+            self.fetched += len(page.data)
+            with self.lock:
+                for payload in page.data:
+                    if payload["id"] not in self.skip:
+                        self.datasets[payload["id"]] = from_v1_payload(payload)
+            missing -= {payload["id"] for payload in page.data}
+
+    def take(self, dataset_id: str) -> FetchedDataset | None:
+        with self.lock:
+            fetched = self.datasets.pop(dataset_id, None)
+            if fetched:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return fetched
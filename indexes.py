@@ -0,0 +1,88 @@
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import scoped_session
+
+
+class IndexUsage(NamedTuple):
+    table: str
+    name: str
+    scans: int
+    size: int
+    # primary key or unique constraint, enforces integrity whatever its usage
+    unique: bool = False
+
+
+class TableScans(NamedTuple):
+    table: str
+    seq_scan: int
+    seq_tup_read: int
+    idx_scan: int
+    live_tuples: int
+
+
+class StatementStats(NamedTuple):
+    query: str
+    calls: int
+    mean_exec_time: float
+    total_exec_time: float
+
+
+def get_index_usage(session: scoped_session) -> list[IndexUsage]:
+    q = """
+        SELECT relname, indexrelname, idx_scan, pg_relation_size(s.indexrelid),
+            i.indisprimary OR i.indisunique
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        ORDER BY idx_scan, relname
+    """
+    return [IndexUsage(*row) for row in session.execute(text(q))]
+
+
+def get_table_scans(session: scoped_session) -> list[TableScans]:
+    q = """
+        SELECT relname, seq_scan, seq_tup_read, coalesce(idx_scan, 0), n_live_tup
+        FROM pg_stat_user_tables
+        ORDER BY seq_tup_read DESC
+    """
+    return [TableScans(*row) for row in session.execute(text(q))]
+
+
+def get_slow_statements(session: scoped_session, limit: int = 10) -> list[StatementStats] | None:
+    """Top statements by total time, or None if pg_stat_statements is not installed"""
+    installed = session.execute(
+        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+    ).scalar()
+    if not installed:
+        return None
+    q = """
+        SELECT query, calls, mean_exec_time, total_exec_time
+        FROM pg_stat_statements
+        WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+        ORDER BY total_exec_time DESC
+        LIMIT :limit
+    """
+    return [StatementStats(*row) for row in session.execute(text(q), {"limit": limit})]
+
+
+def missing_index_candidates(
+    tables: list[TableScans], min_live_tuples: int = 1000, min_seq_ratio: float = 0.5
+) -> list[TableScans]:
+    """
+    Tables big enough for an index to matter, and mostly read through sequential scans.
+
+    `min_seq_ratio` is the share of sequential scans among all scans of the table.
+    """
+    candidates = []
+    for t in tables:
+        scans = t.seq_scan + t.idx_scan
+        if t.live_tuples < min_live_tuples or not scans:
+            continue
+        if t.seq_scan / scans >= min_seq_ratio:
+            candidates.append(t)
+    return candidates
+
+
+def unused_indexes(indexes: list[IndexUsage]) -> list[IndexUsage]:
+    """Never scanned indexes, that could be dropped (not primary keys nor unique ones)"""
+    return [i for i in indexes if i.scans == 0 and not i.unique]
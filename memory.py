@@ -0,0 +1,132 @@
+"""
+Memory report of a cli command (`--memory-report`), per phase: peak RSS, peak of the
+memory traced by tracemalloc and the allocation sites that grew the most.
+
+tracemalloc slows the process down, it is only started for the report. Memory is
+process-wide, concurrent phases (cf `load-all`) are measured together.
+"""
+
+import os
+import resource
+import tracemalloc
+from collections.abc import Iterator
+from contextlib import contextmanager
+from logging import Logger
+from threading import Event, Lock, Thread, get_ident
+from typing import NamedTuple
+
+# seconds between RSS samples
+RSS_INTERVAL = 0.1
+# allocation sites reported per phase
+TOP = 10
+MB = 1024 * 1024
+# allocations of the report itself, filtered out of the sites rather than of the snapshots
+# (`filter_traces` is slow on large ones)
+IGNORED_FILES = {tracemalloc.__file__, "<frozen importlib._bootstrap>"}
+
+
+def current_rss() -> int:
+    """Resident set size of the process, in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # not on Linux: the peak, in bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class PhaseMemory(NamedTuple):
+    phase: str
+    # bytes
+    rss_start: int
+    rss_peak: int
+    traced_peak: int
+    # allocation sites, by size growth over the phase
+    top: list[tracemalloc.StatisticDiff]
+
+    def format(self) -> str:
+        lines = [
+            f"Memory of phase {self.phase}: peak RSS {self.rss_peak / MB:.1f} MB "
+            f"(+{(self.rss_peak - self.rss_start) / MB:.1f} MB), "
+            f"peak traced {self.traced_peak / MB:.1f} MB"
+        ]
+        for stat in self.top:
+            frame = stat.traceback[0]
+            lines.append(
+                f"{stat.size_diff / MB:+9.2f} MB {stat.count_diff:+9} blocks  "
+                f"{frame.filename}:{frame.lineno}"
+            )
+        return "\n".join(lines)
+
+
+class MemoryReport:
+    def __init__(self, top: int = TOP, interval: float = RSS_INTERVAL):
+        self.top = top
+        self.interval = interval
+        self.lock = Lock()
+        # peaks of the phases in progress, by (phase, thread)
+        self.rss_peaks: dict[tuple[str, int], int] = {}
+        self.traced_peaks: dict[tuple[str, int], int] = {}
+        self.phases: list[PhaseMemory] = []
+        self.stopped = Event()
+        self.sampler = Thread(target=self.run, name="memory-report", daemon=True)
+
+    def __enter__(self) -> "MemoryReport":
+        tracemalloc.start()
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.sampler.join()
+        tracemalloc.stop()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss()
+        with self.lock:
+            for key, peak in self.rss_peaks.items():
+                self.rss_peaks[key] = max(peak, rss)
+
+    def fold_traced_peak(self):
+        peak = tracemalloc.get_traced_memory()[1]
+        for key, traced_peak in self.traced_peaks.items():
+            self.traced_peaks[key] = max(traced_peak, peak)
+
+    @contextmanager
+    def phase(self, name: str, log: Logger | None = None) -> Iterator[None]:
+        key = (name, get_ident())
+        rss_start = current_rss()
+        with self.lock:
+            self.rss_peaks[key] = rss_start
+            # the traced peak is process-wide, keep it for the phases in progress before a reset
+            self.fold_traced_peak()
+            self.traced_peaks[key] = 0
+            tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        try:
+            yield
+        finally:
+            self.sample()
+            after = tracemalloc.take_snapshot()
+            with self.lock:
+                self.fold_traced_peak()
+                rss_peak = self.rss_peaks.pop(key)
+                traced_peak = self.traced_peaks.pop(key)
+            memory = PhaseMemory(
+                name,
+                rss_start,
+                rss_peak,
+                traced_peak,
+                [
+                    stat
+                    for stat in after.compare_to(before, "lineno")
+                    if stat.traceback[0].filename not in IGNORED_FILES
+                ][: self.top],
+            )
+            self.phases.append(memory)
+            if log:
+                log.info(memory.format())
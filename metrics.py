@@ -1,30 +1,46 @@
 from datetime import date
-from typing import Type, TypeAlias
+from typing import Type, TypeAlias, cast
 
 import requests
 from requests.sessions import Session
-from sqlalchemy import text
+from sqlalchemy import Table, UniqueConstraint, text
 from sqlalchemy.orm import scoped_session
 
+from db import upsert_rows
 from models import DatasetMetric, Metric
-from utils import upsert
 
 MetricModel: TypeAlias = Type[Metric] | Type[DatasetMetric]
 
 
-def add_metric(
-    session: scoped_session,
-    measurement: str,
-    value: float | None,
-    metric_model: MetricModel = Metric,
-    at: date = date.today(),
-    **kwargs,
-):
-    metric_obj = metric_model(date=at, measurement=measurement, value=value, **kwargs)
-    existing = (
-        session.query(metric_model).filter_by(date=at, measurement=measurement, **kwargs).first()
-    )
-    return upsert(session, metric_obj, existing)
+class MetricsBatch:
+    """
+    Metrics of a model collected in memory and written with one upsert on `flush`,
+    instead of a select plus an insert or update per metric.
+    The last value added for a (date, measurement, organization or dataset) wins.
+    """
+
+    def __init__(self, metric_model: MetricModel = Metric, at: date | None = None):
+        self.metric_model = metric_model
+        self.at = at or date.today()
+        self.table = cast(Table, metric_model.__table__)
+        self.constraint = next(c for c in self.table.constraints if isinstance(c, UniqueConstraint))
+        self.rows: dict[tuple, dict] = {}
+
+    def add(self, measurement: str, value: float | None, at: date | None = None, **kwargs):
+        row = {c.name: None for c in self.constraint.columns}
+        # counts and numeric averages too, for the binary COPY (cf `upsert_rows`)
+        value = float(value) if value is not None else None
+        row |= {"date": at or self.at, "measurement": measurement, "value": value, **kwargs}
+        self.rows[tuple(row[c.name] for c in self.constraint.columns)] = row
+
+    def flush(self, session: scoped_session) -> int:
+        """Write the collected metrics, the caller commits"""
+        rows = list(self.rows.values())
+        self.rows.clear()
+        return upsert_rows(session, self.table, rows, str(self.constraint.name), ["value"])
+
+    def __len__(self) -> int:
+        return len(self.rows)
 
 
 def quality_score_query(organization: str | None = None) -> tuple[str, dict]:
@@ -41,6 +57,18 @@ def compute_quality_score(session: scoped_session, organization: str | None = No
     return session.execute(text(q), kwargs).scalar()
 
 
+def compute_quality_scores(session: scoped_session) -> dict[str, float | None]:
+    """Average quality score of every organization, in a single query"""
+    q = (
+        "SELECT organization, AVG((quality->>'score')::numeric) AS mean_score FROM catalog "
+        "WHERE organization IS NOT NULL GROUP BY organization"
+    )
+    return {
+        organization: float(score) if score is not None else None
+        for organization, score in session.execute(text(q))
+    }
+
+
 def get_datagouvfr_metrics(url: str, params: dict, session: Session | None = None) -> list:
     s = session or requests
     now = date.today()
@@ -1,13 +1,26 @@
+import hashlib
+import json
 import re
 from bisect import bisect_right
+from collections.abc import Collection
 from dataclasses import dataclass
 from datetime import date, datetime
 from enum import StrEnum
 from textwrap import shorten
-from typing import List, NamedTuple, Optional
+from typing import List, NamedTuple, Optional, cast
 
 from requests import Session
-from sqlalchemy import ForeignKey, Integer, String
+from sqlalchemy import (
+    ForeignKey,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    Table,
+    UniqueConstraint,
+    inspect,
+    text,
+)
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
@@ -45,6 +58,35 @@ class Base(DeclarativeBase):
     pass
 
 
+class ModelColumns(NamedTuple):
+    """Column names of a model, computed once from its SQLAlchemy mapper"""
+
+    # mapped columns that can be set from a payload (i.e. not the autoincrement primary key)
+    insertable: frozenset[str]
+    jsonb: frozenset[str]
+    harvest: frozenset[str]
+    # columns covered by `content_hash`
+    hashed: frozenset[str]
+
+    @classmethod
+    def from_model(cls, model: type[Base]) -> "ModelColumns":
+        columns = {attr.key: attr.columns[0] for attr in inspect(model).column_attrs}
+        table = cast(Table, model.__table__)
+        insertable = frozenset(k for k, c in columns.items() if c is not table.autoincrement_column)
+        return cls(
+            insertable=insertable,
+            jsonb=frozenset(k for k, c in columns.items() if isinstance(c.type, JSONB)),
+            harvest=frozenset(k for k in insertable if k.startswith("harvest__")),
+            hashed=insertable - {"content_hash"},
+        )
+
+
+def content_hash(obj: "Base") -> str:
+    """Hash of the mapped column values of `obj`, to skip writes when nothing changed"""
+    values = {k: getattr(obj, k) for k in sorted(MODEL_COLUMNS[type(obj)].hashed)}
+    return hashlib.md5(json.dumps(values, default=str, sort_keys=True).encode()).hexdigest()
+
+
 class DatasetComputedColumns:
     MISSING_PREFIX_MESSAGE = "[préfixe absent]"
     DESCRIPTION_MIN_LENGTH = 200
@@ -167,7 +209,7 @@ class DatasetComputedColumns:
                 repr(coords), width=self.SPATIAL_COORDINATES_MAX_LENGTH, placeholder="..."
             )
 
-    def get_harvest_info(self, keys: list[str]) -> dict:
+    def get_harvest_info(self, keys: Collection[str]) -> dict:
         harvest = self.payload.get("harvest") or {}
         return {f"harvest__{key}": val for key, val in harvest.items() if f"harvest__{key}" in keys}
 
@@ -218,6 +260,15 @@ class DatasetComputedColumns:
 
 class Dataset(Base):
     __tablename__ = "catalog"
+    __table_args__ = (
+        # dashboards and loader only look at live datasets, mostly per organization
+        Index(
+            "ix_catalog_organization_not_deleted",
+            "organization",
+            postgresql_where=text("NOT deleted"),
+        ),
+        Index("ix_catalog_deleted", "deleted", postgresql_where=text("deleted")),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     dataset_id: Mapped[str] = mapped_column(String, unique=True, nullable=False)
@@ -291,6 +342,8 @@ class Dataset(Base):
     contact_points__first__name: Mapped[str | None]
     contact_points__first__email: Mapped[str | None]
 
+    content_hash: Mapped[Optional[str]]
+
     # relationships
     resources: Mapped[List["Resource"]] = relationship("Resource", back_populates="dataset")
     bouquets: Mapped[list["Bouquet"]] = relationship(
@@ -321,21 +374,21 @@ class Dataset(Base):
 
         computed_columns = computer.get_computed_columns()
         indicators = computer.get_indicators()
-        harvest_info = computer.get_harvest_info(
-            [k for k in cls.__dict__.keys() if k.startswith("harvest__")]
-        )
+        harvest_info = computer.get_harvest_info(MODEL_COLUMNS[cls].harvest)
 
         # conflicts with relationship, needs to be removed after indicators are computed
         data.pop("resources")
 
-        return cls(
+        dataset = cls(
             **{
-                **{k: v for k, v in data.items() if hasattr(cls, k)},
+                **{k: v for k, v in data.items() if k in MODEL_COLUMNS[cls].insertable},
                 **computed_columns,
                 **indicators,
                 **harvest_info,
             }
         )
+        dataset.content_hash = content_hash(dataset)
+        return dataset
 
 
 class ResourceComputedColumns:
@@ -361,6 +414,10 @@ class ResourceComputedColumns:
 
 class Resource(Base):
     __tablename__ = "resources"
+    # also serves lookups by dataset_id
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "resource_id", name="uq_resources_dataset_id_resource_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     resource_id: Mapped[str]
@@ -390,6 +447,8 @@ class Resource(Base):
     # other computed columns
     schema__name: Mapped[str | None]
 
+    content_hash: Mapped[Optional[str]]
+
     # relationships
     dataset_id: Mapped[str] = mapped_column(ForeignKey("catalog.dataset_id"))
     dataset: Mapped["Dataset"] = relationship("Dataset", back_populates="resources")
@@ -405,14 +464,16 @@ class Resource(Base):
 
         computer = ResourceComputedColumns(data)
 
-        return cls(
+        resource = cls(
             **{
-                **{k: v for k, v in data.items() if hasattr(cls, k)},
+                **{k: v for k, v in data.items() if k in MODEL_COLUMNS[cls].insertable},
                 **computer.get_computed_columns(),
                 **computer.get_indicators(),
                 "dataset_id": dataset_id,
             }
         )
+        resource.content_hash = content_hash(resource)
+        return resource
 
 
 @dataclass
@@ -459,7 +520,7 @@ class Organization(Base):
 
         return cls(
             **{
-                **{k: v for k, v in data.items() if hasattr(cls, k)},
+                **{k: v for k, v in data.items() if k in MODEL_COLUMNS[cls].insertable},
                 "service_public": all(
                     k in [b["kind"] for b in data.get("badges", [])]
                     for k in ["public-service", "certified"]
@@ -515,7 +576,6 @@ class Bouquet(Base):
         data["theme"] = next((themes[tid] for tid in themes if tid in data["tags"]), None)
 
         factors = list(iter_rel(data.pop("elements"), session=session, log=None))
-        data["_factors"] = factors
         data["nb_datasets"] = len(
             [f for f in factors if f.get("element") and f["element"]["class"] == "Dataset"]
         )
@@ -547,7 +607,9 @@ class Bouquet(Base):
             + data["nb_factors_not_available"]
         )
 
-        return cls(**{k: v for k, v in data.items() if hasattr(cls, k)})
+        bouquet = cls(**{k: v for k, v in data.items() if k in MODEL_COLUMNS[cls].insertable})
+        bouquet._factors = factors
+        return bouquet
 
     @property
     def elements_ids(self) -> list[str]:
@@ -556,6 +618,10 @@ class Bouquet(Base):
 
 class DatasetBouquet(Base):
     __tablename__ = "datasets_bouquets"
+    __table_args__ = (
+        Index("ix_datasets_bouquets_bouquet_id_dataset_id", "bouquet_id", "dataset_id"),
+        Index("ix_datasets_bouquets_dataset_id", "dataset_id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     bouquet_id: Mapped[str] = mapped_column(String, ForeignKey("bouquets.bouquet_id"))
@@ -566,7 +632,9 @@ class DatasetBouquet(Base):
 
 
 class MetricMixin:
-    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # metrics tables are partitioned by date, which must be part of the primary key,
+    # cf `PrimaryKeyConstraint` in `__table_args__` and partitions.py
+    id: Mapped[int] = mapped_column(Integer, autoincrement=True)
     date: Mapped[date]
     measurement: Mapped[str]
     value: Mapped[float]
@@ -574,6 +642,17 @@ class MetricMixin:
 
 class Metric(Base, MetricMixin):
     __tablename__ = "metrics"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "date"),
+        UniqueConstraint(
+            "date",
+            "measurement",
+            "organization",
+            name="uq_metrics_date_measurement_organization",
+            postgresql_nulls_not_distinct=True,
+        ),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
     organization: Mapped[Optional[str]]
 
@@ -583,14 +662,35 @@ class Metric(Base, MetricMixin):
 
 class DatasetMetric(Base, MetricMixin):
     __tablename__ = "datasets_metrics"
+    __table_args__ = (
+        PrimaryKeyConstraint("id", "date"),
+        UniqueConstraint(
+            "date",
+            "measurement",
+            "dataset",
+            name="uq_datasets_metrics_date_measurement_dataset",
+            postgresql_nulls_not_distinct=True,
+        ),
+        {"postgresql_partition_by": "RANGE (date)"},
+    )
 
     dataset: Mapped[Optional[str]]
 
     def __repr__(self) -> str:
         return f"<Metric {self.measurement}{' of ' + self.dataset if self.dataset else ''} at {self.date}>"
 
+
 class Stats(Base):
     __tablename__ = "stats"
+    __table_args__ = (
+        UniqueConstraint(
+            "date",
+            "segment",
+            "period",
+            name="uq_stats_date_segment_period",
+            postgresql_nulls_not_distinct=True,
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     date: Mapped[date]
@@ -611,3 +711,81 @@ class Stats(Base):
     nb_downloads: Mapped[int]
     nb_uniq_visitors_returning: Mapped[int]
     nb_uniq_visitors_new: Mapped[int]
+
+
+class LoadGeneration(Base):
+    """One row per completed `load`, API caches are invalidated when a new one appears"""
+
+    __tablename__ = "load_generations"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    finished_at: Mapped[datetime]
+
+    def __repr__(self) -> str:
+        return f"<LoadGeneration {self.id} at {self.finished_at}>"
+
+
+class LoadRun(Base):
+    """Checkpoints of a `load`, so that an interrupted run can be resumed"""
+
+    __tablename__ = "load_runs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    started_at: Mapped[datetime]
+    updated_at: Mapped[datetime]
+    finished_at: Mapped[Optional[datetime]]
+    # current phase, cf runs.PHASES
+    phase: Mapped[str]
+    # next page of the topic elements to load, None before the first checkpoint
+    topic_page: Mapped[Optional[str]]
+    # ids of the datasets loaded by this run
+    processed: Mapped[List[str]] = mapped_column(ARRAY(String), default=list)
+
+    def __repr__(self) -> str:
+        return f"<LoadRun {self.id} {self.phase}>"
+
+
+class LoadFailure(Base):
+    """Datasets a `load` failed to process (after its retries), reprocessed by `retry-failed`"""
+
+    __tablename__ = "load_failures"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    dataset_id: Mapped[str] = mapped_column(String, unique=True)
+    factor_id: Mapped[Optional[str]]
+    # last `load` run that failed to process it
+    run_id: Mapped[Optional[int]] = mapped_column(ForeignKey("load_runs.id"))
+    # API URL of the dataset payload
+    payload_url: Mapped[str]
+    error_class: Mapped[str]
+    error: Mapped[str]
+    # across runs and retries
+    attempts: Mapped[int]
+    first_failed_at: Mapped[datetime]
+    failed_at: Mapped[datetime]
+
+    @property
+    def factor(self) -> dict:
+        """The (minimal) topic element `process_factor` expects"""
+        return {"id": self.factor_id, "element": {"class": "Dataset", "id": self.dataset_id}}
+
+    def __repr__(self) -> str:
+        return f"<LoadFailure {self.dataset_id} {self.error_class} x{self.attempts}>"
+
+
+MODEL_COLUMNS: dict[type[Base], ModelColumns] = {
+    model: ModelColumns.from_model(model)
+    for model in (
+        Dataset,
+        Resource,
+        Organization,
+        Bouquet,
+        DatasetBouquet,
+        Metric,
+        DatasetMetric,
+        Stats,
+        LoadGeneration,
+        LoadRun,
+        LoadFailure,
+    )
+}
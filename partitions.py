@@ -0,0 +1,158 @@
+import re
+from collections.abc import Iterator
+from datetime import date
+from typing import NamedTuple, cast
+
+from sqlalchemy import CursorResult, text
+from sqlalchemy.orm import scoped_session
+
+# tables range-partitioned by month on their `date` column, with the column identifying
+# the measured object
+PARTITIONED_TABLES = {"metrics": "organization", "datasets_metrics": "dataset"}
+
+
+class Partition(NamedTuple):
+    table: str
+    name: str
+    month: date
+
+
+def add_months(d: date, months: int) -> date:
+    """First of the month, `months` months after (or before) `d`"""
+    index = d.year * 12 + d.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def iter_months(start: date, end: date) -> Iterator[date]:
+    """First of each month from `start` to `end` (included)"""
+    current = start.replace(day=1)
+    while current <= end:
+        yield current
+        current = add_months(current, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+def parse_partition_name(table: str, name: str) -> Partition | None:
+    if m := re.fullmatch(rf"{table}_y(\d{{4}})m(\d{{2}})", name):
+        return Partition(table, name, date(int(m.group(1)), int(m.group(2)), 1))
+
+
+def is_partition(name: str) -> bool:
+    """Monthly (attached or detached) or default partition of one of `PARTITIONED_TABLES`"""
+    return any(
+        name == f"{table}_default" or parse_partition_name(table, name)
+        for table in PARTITIONED_TABLES
+    )
+
+
+def list_partitions(session: scoped_session, table: str) -> list[Partition]:
+    """Monthly partitions currently attached to `table`, oldest first"""
+    q = """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:table AS regclass)
+    """
+    names = session.execute(text(q), {"table": table}).scalars()
+    partitions = [p for n in names if (p := parse_partition_name(table, n))]
+    return sorted(partitions, key=lambda p: p.month)
+
+
+def create_default_partition(session: scoped_session, table: str):
+    session.execute(
+        text(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+    )
+
+
+def create_partition(session: scoped_session, table: str, month: date) -> Partition:
+    """
+    Create the partition of `table` for `month`.
+
+    Rows of that month which landed in the default partition are moved into it,
+    otherwise attaching the partition would fail.
+    """
+    name = partition_name(table, month)
+    bounds = {"start": month, "end": add_months(month, 1)}
+    session.execute(text(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)"))
+    session.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {table}_default "
+            "WHERE date >= :start AND date < :end RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved"
+        ),
+        bounds,
+    )
+    session.execute(
+        text(
+            f"ALTER TABLE {table} ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{bounds['start']}') TO ('{bounds['end']}')"
+        )
+    )
+    return Partition(table, name, month)
+
+
+def ensure_partitions(
+    session: scoped_session, table: str, since: date, until: date
+) -> list[Partition]:
+    """Create the missing monthly partitions of `table` between `since` and `until`"""
+    existing = {p.month for p in list_partitions(session, table)}
+    created = [
+        create_partition(session, table, month)
+        for month in iter_months(since, until)
+        if month not in existing
+    ]
+    session.commit()
+    return created
+
+
+def detach_partitions(
+    session: scoped_session, table: str, before: date, drop: bool = False
+) -> list[Partition]:
+    """
+    Detach the partitions of `table` for months before `before`.
+
+    Detached partitions are kept as standalone tables (for archiving) unless `drop`.
+    """
+    detached = [p for p in list_partitions(session, table) if p.month < before.replace(day=1)]
+    for partition in detached:
+        session.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition.name}"))
+        if drop:
+            session.execute(text(f"DROP TABLE {partition.name}"))
+    session.commit()
+    return detached
+
+
+def get_oldest_month(session: scoped_session, table: str) -> date | None:
+    if oldest := session.execute(text(f"SELECT min(date) FROM {table}")).scalar():
+        return oldest.replace(day=1)
+
+
+def downsample_month(session: scoped_session, table: str, month: date) -> int:
+    """
+    Replace the daily rows of `table` for `month` by one row per measured object and
+    measurement on the first of the month, holding the average value.
+
+    Returns the number of rows after rollup, 0 if the month was not daily.
+    """
+    key_column = PARTITIONED_TABLES[table]
+    bounds = {"start": month, "end": add_months(month, 1)}
+    nb_days = session.execute(
+        text(f"SELECT count(DISTINCT date) FROM {table} WHERE date >= :start AND date < :end"),
+        bounds,
+    ).scalar()
+    if not nb_days or nb_days < 2:
+        return 0
+    result = session.execute(
+        text(
+            f"WITH daily AS (DELETE FROM {table} WHERE date >= :start AND date < :end "
+            f"RETURNING measurement, {key_column}, value) "
+            f"INSERT INTO {table} (date, measurement, {key_column}, value) "
+            f"SELECT CAST(:start AS date), measurement, {key_column}, avg(value) FROM daily "
+            f"GROUP BY measurement, {key_column}"
+        ),
+        bounds,
+    )
+    session.commit()
+    return cast(CursorResult, result).rowcount
@@ -0,0 +1,186 @@
+"""
+Sampling profiler of a cli command (`--profile`), per phase and per thread.
+
+A background thread samples the stacks of the profiled threads (`sys._current_frames`)
+every `interval` seconds: cheap enough for production runs and, unlike cProfile which
+is process-wide since Python 3.12, each thread gets its own profile. Worker tasks are
+profiled with `Profiler.wrap`, under the phase of the thread that submitted them.
+
+Profiles are written in the speedscope format (https://www.speedscope.app).
+"""
+
+import json
+import sys
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable
+from contextlib import contextmanager
+from logging import Logger
+from pathlib import Path
+from threading import Event, Lock, Thread, current_thread, get_ident
+from types import FrameType
+from typing import Iterator, NamedTuple, ParamSpec, TypeAlias, TypeVar
+
+DEFAULT_PHASE = "command"
+# seconds between samples
+SAMPLE_INTERVAL = 0.005
+# hotspots logged per phase
+TOP = 20
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+# function name, file, first line
+Frame: TypeAlias = tuple[str, str, int]
+# outermost frame first
+Stack: TypeAlias = tuple[Frame, ...]
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+
+class Hotspot(NamedTuple):
+    function: str
+    # seconds in the function itself, then including its callees
+    own_time: float
+    cumulative_time: float
+
+
+def stack_of(frame: FrameType | None) -> Stack:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append((code.co_qualname, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    return tuple(reversed(frames))
+
+
+class Profiler:
+    def __init__(self, output: Path, interval: float = SAMPLE_INTERVAL):
+        self.output = output
+        self.interval = interval
+        self.lock = Lock()
+        # profiled threads: ident -> (phase, thread name)
+        self.threads: dict[int, tuple[str, str]] = {}
+        # (phase, thread name) -> number of samples per stack
+        self.samples: dict[tuple[str, str], Counter[Stack]] = defaultdict(Counter)
+        self.stopped = Event()
+        self.sampler = Thread(target=self.run, name="profiler", daemon=True)
+
+    def __enter__(self) -> "Profiler":
+        self.sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.sampler.join()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        frames = sys._current_frames()
+        with self.lock:
+            threads = list(self.threads.items())
+        for ident, key in threads:
+            if (frame := frames.get(ident)) is not None:
+                self.samples[key][stack_of(frame)] += 1
+
+    def current_phase(self) -> str:
+        return self.threads.get(get_ident(), (DEFAULT_PHASE, ""))[0]
+
+    @contextmanager
+    def profiling(self, phase: str | None = None) -> Iterator[None]:
+        """Sample the current thread in the block, as `phase` (by default its current one)"""
+        ident = get_ident()
+        previous = self.threads.get(ident)
+        with self.lock:
+            self.threads[ident] = (phase or self.current_phase(), current_thread().name)
+        try:
+            yield
+        finally:
+            with self.lock:
+                if previous:
+                    self.threads[ident] = previous
+                else:
+                    del self.threads[ident]
+
+    def wrap(self, func: Callable[P, R]) -> Callable[P, R]:
+        """Profile `func` in the thread it runs in, under the current phase of this one"""
+        phase = self.current_phase()
+
+        def profiled(*args: P.args, **kwargs: P.kwargs) -> R:
+            with self.profiling(phase):
+                return func(*args, **kwargs)
+
+        return profiled
+
+    def write(self, log: Logger | None = None) -> list[Path]:
+        """
+        Write a speedscope file per phase (`<phase>.speedscope.json`, one profile per thread)
+        and log the hotspots of each phase. To be called once the sampler is stopped.
+        """
+        self.output.mkdir(parents=True, exist_ok=True)
+        by_phase: dict[str, dict[str, Counter[Stack]]] = defaultdict(dict)
+        for (phase, thread), samples in self.samples.items():
+            by_phase[phase][thread] = samples
+        paths = []
+        for phase, threads in by_phase.items():
+            path = self.output / f"{phase}.speedscope.json"
+            path.write_text(json.dumps(speedscope(phase, threads, self.interval)))
+            paths.append(path)
+            if log:
+                log.info(
+                    f"Hotspots of phase {phase} ({len(threads)} threads, {path}):\n"
+                    + "\n".join(
+                        f"{h.own_time:9.3f}s own {h.cumulative_time:9.3f}s cumulative  {h.function}"
+                        for h in hotspots(threads.values(), self.interval)
+                    )
+                )
+        return paths
+
+
+def format_frame(frame: Frame) -> str:
+    name, file, line = frame
+    return f"{name} ({file}:{line})"
+
+
+def hotspots(samples: Iterable[Counter[Stack]], interval: float, top: int = TOP) -> list[Hotspot]:
+    """Functions taking the most time by themselves"""
+    own: Counter[Frame] = Counter()
+    cumulative: Counter[Frame] = Counter()
+    for counter in samples:
+        for stack, count in counter.items():
+            if stack:
+                own[stack[-1]] += count
+            # recursive functions are counted once per sample
+            for frame in set(stack):
+                cumulative[frame] += count
+    return [
+        Hotspot(format_frame(frame), count * interval, cumulative[frame] * interval)
+        for frame, count in own.most_common(top)
+    ]
+
+
+def speedscope(phase: str, threads: dict[str, Counter[Stack]], interval: float) -> dict:
+    frames: dict[Frame, int] = {}
+    profiles = [
+        {
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(samples.values()) * interval,
+            "samples": [
+                [frames.setdefault(frame, len(frames)) for frame in stack] for stack in samples
+            ],
+            "weights": [count * interval for count in samples.values()],
+        }
+        for thread, samples in threads.items()
+    ]
+    return {
+        "$schema": SPEEDSCOPE_SCHEMA,
+        "name": phase,
+        "shared": {
+            "frames": [{"name": name, "file": file, "line": line} for name, file, line in frames]
+        },
+        "profiles": profiles,
+    }
@@ -1,24 +1,43 @@
 import math
 import re
 import time
+from collections.abc import Iterator
 from logging import Logger
-from typing import TypedDict
+from typing import NamedTuple, TypedDict
 
 import requests
+from requests.models import Response
 from requests.sessions import Session
 
+# seconds to wait after a 429 without a usable Retry-After
+RATE_LIMIT_WAIT = 10
+
 
 class Rel(TypedDict):
     href: str
 
 
-def iter_rel(
+class Page(NamedTuple):
+    url: str
+    data: list[dict]
+    next_page: str | None
+
+
+def retry_after(response: Response) -> float:
+    """Seconds to wait before retrying a rate limited request, cf its Retry-After (in seconds)"""
+    try:
+        return max(0.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return RATE_LIMIT_WAIT
+
+
+def iter_pages(
     rel: Rel,
     page_size: int | None = None,
     headers: dict = {},
     session: Session | None = None,
     log: Logger | None = None,
-):
+) -> Iterator[Page]:
     current_url = rel["href"]
     s = session or requests
     if page_size:
@@ -30,9 +49,10 @@ def iter_rel(
             r = s.get(current_url, headers=headers)
             if not r.ok:
                 if r.status_code == 429:
+                    wait = retry_after(r)
                     if log:
-                        log.warning("429 hit, waiting a bit")
-                    time.sleep(10)
+                        log.warning(f"429 hit, waiting {wait}s")
+                    time.sleep(wait)
                     continue
                 else:
                     r.raise_for_status()
@@ -41,6 +61,16 @@ def iter_rel(
         total_pages = math.ceil(payload["total"] / payload["page_size"])
         if log:
             log.info(f"Handling page {payload['page']}/{total_pages}")
+        yield Page(current_url, payload["data"], payload["next_page"])
         current_url = payload["next_page"]
-        for d in payload["data"]:
-            yield d
+
+
+def iter_rel(
+    rel: Rel,
+    page_size: int | None = None,
+    headers: dict = {},
+    session: Session | None = None,
+    log: Logger | None = None,
+):
+    for page in iter_pages(rel, page_size, headers, session, log):
+        yield from page.data
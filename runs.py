@@ -0,0 +1,128 @@
+from collections.abc import Collection, Iterable
+from datetime import datetime
+from typing import cast
+
+from sqlalchemy import CursorResult, String, any_, bindparam, delete, func, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.orm import scoped_session
+
+from models import LoadFailure, LoadRun
+
+# phases of a `load`, in order, a resumed run skips the ones already completed
+PHASES = ("datasets", "organizations", "bouquets", "metrics", "stats", "views", "publish")
+FINISHED = "finished"
+
+
+def get_resumable_run(session: scoped_session) -> LoadRun | None:
+    """Last run if it didn't finish"""
+    run = session.scalars(select(LoadRun).order_by(LoadRun.id.desc()).limit(1)).first()
+    return run if run and run.finished_at is None else None
+
+
+def start_run(session: scoped_session, resume: bool = False) -> tuple[LoadRun, bool]:
+    """Resume the last unfinished run if `resume` (and there is one), returns (run, resumed)"""
+    if resume and (run := get_resumable_run(session)):
+        return run, True
+    now = datetime.now()
+    run = LoadRun(started_at=now, updated_at=now, phase=PHASES[0], topic_page=None, processed=[])
+    session.add(run)
+    session.commit()
+    return run, False
+
+
+def is_done(run: LoadRun, phase: str) -> bool:
+    if run.phase == FINISHED:
+        return True
+    return PHASES.index(run.phase) > PHASES.index(phase)
+
+
+def checkpoint(
+    session: scoped_session,
+    run: LoadRun,
+    phase: str | None = None,
+    topic_page: str | None = None,
+    processed: Iterable[str] | None = None,
+):
+    """Persist the progress of `run`, only given values are updated"""
+    # re-attach it if a batch cleared the session in the meantime (`expunge_all`)
+    session.add(run)
+    if phase:
+        run.phase = phase
+    if topic_page:
+        run.topic_page = topic_page
+    if processed is not None:
+        # a new list, in-place changes of ARRAY columns are not tracked
+        run.processed = sorted(processed)
+    run.updated_at = datetime.now()
+    if run.phase == FINISHED:
+        run.finished_at = run.updated_at
+    session.commit()
+
+
+def next_phase(phase: str) -> str:
+    index = PHASES.index(phase) + 1
+    return PHASES[index] if index < len(PHASES) else FINISHED
+
+
+def record_failure(
+    session: scoped_session,
+    factor: dict,
+    payload_url: str,
+    error: Exception,
+    attempts: int,
+    run_id: int | None = None,
+):
+    """
+    Record (or update) the failure of the dataset of `factor` in `load_failures`.
+    A `retry-failed` (no `run_id`) keeps the run of the failure it retried.
+    """
+    now = datetime.now()
+    stmt = insert(LoadFailure).values(
+        dataset_id=factor["element"]["id"],
+        factor_id=factor.get("id"),
+        run_id=run_id,
+        payload_url=payload_url,
+        error_class=type(error).__name__,
+        error=str(error),
+        attempts=attempts,
+        first_failed_at=now,
+        failed_at=now,
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[LoadFailure.dataset_id],
+            set_={
+                "factor_id": stmt.excluded.factor_id,
+                "run_id": func.coalesce(stmt.excluded.run_id, LoadFailure.run_id),
+                "payload_url": stmt.excluded.payload_url,
+                "error_class": stmt.excluded.error_class,
+                "error": stmt.excluded.error,
+                "attempts": LoadFailure.attempts + stmt.excluded.attempts,
+                "failed_at": stmt.excluded.failed_at,
+            },
+        )
+    )
+    session.commit()
+
+
+def get_failures(session: scoped_session, run_id: int | None = None) -> list[LoadFailure]:
+    """Failures not reprocessed yet, of the run `run_id` only if given"""
+    query = select(LoadFailure).order_by(LoadFailure.id)
+    if run_id:
+        query = query.where(LoadFailure.run_id == run_id)
+    return list(session.scalars(query))
+
+
+def clear_failures(
+    session: scoped_session, loaded: Collection[str], run_id: int | None = None
+) -> int:
+    """
+    Delete the failures of the `loaded` datasets and, given the run that just loaded the
+    topic, those it didn't fail on (gone from the topic). Returns the number deleted.
+    """
+    condition = LoadFailure.dataset_id == any_(bindparam("loaded", type_=ARRAY(String)))
+    if run_id:
+        condition = or_(condition, LoadFailure.run_id.is_distinct_from(run_id))
+    result = session.execute(delete(LoadFailure).where(condition), {"loaded": list(loaded)})
+    session.commit()
+    return cast(CursorResult, result).rowcount
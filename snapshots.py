@@ -0,0 +1,137 @@
+import gzip
+import json
+import re
+import shutil
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+import brotli
+from sqlalchemy import text
+from sqlalchemy.orm import scoped_session
+
+from api import ORGANIZATIONS_SQL, Response, dump, negotiate_encoding
+
+CURRENT_FILE = "current.json"
+ENCODINGS = {"gzip": ("gz", gzip.compress), "br": ("br", brotli.compress)}
+# `<version>-<build>` directories, and `<version>` ones written before builds were named
+BUILD_DIRECTORY = re.compile(r"(\d+)(?:-(\d+))?")
+
+
+def rows(session: scoped_session, sql: str) -> list[dict]:
+    return [dict(row) for row in session.execute(text(sql)).mappings()]
+
+
+def render_global_metrics(session: scoped_session) -> dict:
+    series = defaultdict(list)
+    for row in rows(
+        session,
+        "SELECT measurement, date, value FROM metrics WHERE organization IS NULL ORDER BY date",
+    ):
+        series[row["measurement"]].append({"date": row["date"], "value": row["value"]})
+    return series
+
+
+def render_organization_metrics(session: scoped_session) -> dict:
+    series = defaultdict(lambda: defaultdict(list))
+    for row in rows(
+        session,
+        """
+        SELECT organization, measurement, date, value FROM metrics
+        WHERE organization IS NOT NULL ORDER BY organization, date
+        """,
+    ):
+        series[row["organization"]][row["measurement"]].append(
+            {"date": row["date"], "value": row["value"]}
+        )
+    return series
+
+
+def render_stats(session: scoped_session) -> dict:
+    series = defaultdict(list)
+    for row in rows(session, "SELECT * FROM stats ORDER BY date"):
+        row.pop("id")
+        series[row.pop("period")].append(row)
+    return series
+
+
+SNAPSHOTS = {
+    "global_metrics": render_global_metrics,
+    "organization_metrics": render_organization_metrics,
+    "organizations": lambda session: rows(session, f"{ORGANIZATIONS_SQL} ORDER BY organization"),
+    "bouquets": lambda session: rows(session, "SELECT * FROM mv_bouquet_composition"),
+    "stats": render_stats,
+}
+
+
+def render_snapshots(session: scoped_session) -> dict[str, Any]:
+    return {name: render(session) for name, render in SNAPSHOTS.items()}
+
+
+def write_snapshots(root: Path, version: int, payloads: dict[str, Any], keep: int = 3) -> Path:
+    """
+    Write compressed `payloads` to a new `root/<version>-<build>/<name>.json.(gz|br)`, then
+    point `root/current.json` to it with an atomic rename. A rebuilt version gets a new
+    directory too, so the served one is never modified. Only the `keep` most recent builds
+    are kept.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    target = root / f"{version}-{time.time_ns()}"
+    target.mkdir()
+    for name, payload in payloads.items():
+        body = dump(payload)
+        for extension, compress in ENCODINGS.values():
+            (target / f"{name}.json.{extension}").write_bytes(compress(body))
+
+    current_tmp = root / f"{CURRENT_FILE}.tmp"
+    current_tmp.write_text(json.dumps({"version": version, "directory": target.name}))
+    current_tmp.replace(root / CURRENT_FILE)
+
+    builds = sorted(
+        (
+            (int(match[2] or 0), path)
+            for path in root.iterdir()
+            if (match := BUILD_DIRECTORY.fullmatch(path.name))
+        ),
+        reverse=True,
+    )
+    for _, old in builds[keep:]:
+        shutil.rmtree(old)
+    return target
+
+
+def read_current(root: Path) -> tuple[int, str] | None:
+    """Current version and the directory of its build"""
+    try:
+        current = json.loads((root / CURRENT_FILE).read_text())
+    except FileNotFoundError:
+        return None
+    return current["version"], current.get("directory", str(current["version"]))
+
+
+def read_current_version(root: Path) -> int | None:
+    current = read_current(root)
+    return current[0] if current else None
+
+
+def serve_snapshot(root: Path, name: str, headers: dict[str, str]) -> Response:
+    """Serve the current version of a snapshot, `headers` are lower-cased request headers"""
+    current = read_current(root)
+    if current is None or name not in SNAPSHOTS:
+        return Response(404, dump({"error": "Not found"}), [("Content-Type", "application/json")])
+    _, directory = current
+    etag = f'"snapshot-{directory}-{name}"'
+    common_headers = [("ETag", etag), ("Vary", "Accept-Encoding"), ("Cache-Control", "no-cache")]
+    if etag in headers.get("if-none-match", ""):
+        return Response(304, b"", common_headers)
+
+    encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+    extension = ENCODINGS[encoding or "gzip"][0]
+    body = (root / directory / f"{name}.json.{extension}").read_bytes()
+    response_headers = [("Content-Type", "application/json"), *common_headers]
+    if encoding:
+        response_headers.append(("Content-Encoding", encoding))
+    else:
+        body = gzip.decompress(body)
+    return Response(200, body, response_headers)
@@ -0,0 +1,345 @@
+"""
+Local stand-in for the upstreams of the loader (data.gouv.fr APIs, ecospheres-universe
+organizations list, front config, metric API and Matomo), serving a `SyntheticCatalog`.
+
+    python standin.py serve --scale 10 [--port 7001] [--seed 0] [--faults faults.yaml]
+
+then load it with the `synthetic` env (cf `config.py`):
+
+    DATABASE_URL_SYNTHETIC=... python cli.py load --env synthetic
+
+Latency, rate limits, 5xx bursts and slow bodies are injected per endpoint, cf `faults.py`.
+The requests served are logged per endpoint and status at exit.
+"""
+
+import json
+import logging
+import re
+import signal
+import time
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlsplit
+
+from minicli import cli, run
+
+from faults import Faults
+from synthetic import (
+    CURRENT_SIZE,
+    TOPIC_ID,
+    TOPIC_SLUG,
+    CatalogSize,
+    SyntheticCatalog,
+    object_index,
+    page,
+)
+
+DEFAULT_PORT = 7001
+
+log = logging.getLogger("standin")
+
+
+class NotFound(Exception):
+    pass
+
+
+class Request:
+    def __init__(self, method: str, path: str, query: dict[str, str], form: dict[str, str]):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.form = form
+
+    def int_arg(self, name: str, default: int) -> int:
+        try:
+            return int(self.query.get(name, default))
+        except ValueError:
+            return default
+
+
+class Response:
+    def __init__(
+        self,
+        body: bytes,
+        content_type: str = "application/json",
+        status: int = 200,
+        headers: dict[str, str] | None = None,
+    ):
+        self.body = body
+        self.content_type = content_type
+        self.status = status
+        self.headers = headers or {}
+        # bytes per second, all at once if None
+        self.body_rate: int | None = None
+
+    @classmethod
+    def json(cls, payload: dict | list) -> "Response":
+        return cls(json.dumps(payload).encode())
+
+    @classmethod
+    def text(cls, text: str, content_type: str = "text/plain") -> "Response":
+        return cls(text.encode(), content_type=f"{content_type}; charset=utf-8")
+
+
+Route = Callable[..., Response]
+
+
+class StandIn:
+    """Routes of the upstream APIs used by the cli, by method and path pattern"""
+
+    def __init__(self, catalog: SyntheticCatalog, faults: Faults | None = None):
+        self.catalog = catalog
+        self.faults = faults or Faults()
+        self.lock = Lock()
+        # requests served, by endpoint (route name) and status
+        self.counts: Counter[tuple[str, int]] = Counter()
+        self.routes: list[tuple[str, re.Pattern, Route]] = [
+            ("GET", re.compile(r"/api/1/datasets/licenses/"), self.licenses),
+            ("GET", re.compile(r"/api/1/datasets/"), self.datasets),
+            ("GET", re.compile(r"/api/2/datasets/(?P<id>[^/]+)/"), self.dataset),
+            ("GET", re.compile(r"/api/2/datasets/(?P<id>[^/]+)/resources/"), self.resources),
+            ("GET", re.compile(r"/api/2/topics/"), self.bouquets),
+            ("GET", re.compile(r"/api/2/topics/(?P<id>[^/]+)/"), self.topic),
+            ("GET", re.compile(r"/api/2/topics/(?P<id>[^/]+)/elements/"), self.elements),
+            ("GET", re.compile(r"/api/1/organizations/(?P<id>[^/]+)/"), self.organization),
+            ("GET", re.compile(r"/organizations-datasets.json"), self.universe_organizations),
+            ("GET", re.compile(r"/config.yaml"), self.front_config),
+            (
+                "GET",
+                re.compile(r"/metrics/api/(?P<kind>datasets|organizations)/data/"),
+                self.metrics,
+            ),
+            ("POST", re.compile(r"/index.php"), self.matomo),
+        ]
+
+    def handle(self, request: Request) -> Response:
+        endpoint, response = "not_found", None
+        for method, pattern, route in self.routes:
+            if method == request.method and (match := pattern.fullmatch(request.path)):
+                endpoint = route.__name__
+                response = self.respond(endpoint, route, request, match.groupdict())
+                break
+        if response is None:
+            response = error(404, "Not found")
+        with self.lock:
+            self.counts[(endpoint, response.status)] += 1
+        return response
+
+    def respond(self, endpoint: str, route: Route, request: Request, args: dict) -> Response | None:
+        time.sleep(self.faults.delay(endpoint))
+        if fault := self.faults.fault(endpoint):
+            return error(fault.status, "Injected fault", fault.headers)
+        try:
+            response = route(request, **args)
+        except NotFound:
+            return None
+        response.body_rate = self.faults.of(endpoint).body_rate
+        return response
+
+    def index(self, id: str, size: int) -> int:
+        i = object_index(id)
+        if i is None or i >= size:
+            raise NotFound
+        return i
+
+    def licenses(self, request: Request) -> Response:
+        return Response.json(self.catalog.licenses())
+
+    def datasets(self, request: Request) -> Response:
+        if request.query.get("topic") != TOPIC_ID:
+            raise NotFound
+        return Response.json(
+            self.catalog.datasets_page(request.int_arg("page", 1), request.int_arg("page_size", 20))
+        )
+
+    def dataset(self, request: Request, id: str) -> Response:
+        return Response.json(self.catalog.dataset(self.index(id, self.catalog.size.datasets)))
+
+    def resources(self, request: Request, id: str) -> Response:
+        i = self.index(id, self.catalog.size.datasets)
+        return Response.json(
+            self.catalog.resources_page(
+                i, request.int_arg("page", 1), request.int_arg("page_size", 50)
+            )
+        )
+
+    def bouquets(self, request: Request) -> Response:
+        return Response.json(
+            self.catalog.bouquets_page(request.int_arg("page", 1), request.int_arg("page_size", 20))
+        )
+
+    def bouquet_index(self, id: str) -> int:
+        match = re.fullmatch(r"bouquet-(\d+)", id)
+        if not match or int(match[1]) >= self.catalog.size.bouquets:
+            raise NotFound
+        return int(match[1])
+
+    def topic(self, request: Request, id: str) -> Response:
+        if id in (TOPIC_ID, TOPIC_SLUG):
+            return Response.json(self.catalog.topic())
+        return Response.json(self.catalog.bouquet(self.bouquet_index(id)))
+
+    def elements(self, request: Request, id: str) -> Response:
+        page_number, page_size = request.int_arg("page", 1), request.int_arg("page_size", 20)
+        if id == TOPIC_ID:
+            return Response.json(self.catalog.elements_page(page_number, page_size))
+        return Response.json(
+            self.catalog.bouquet_elements_page(self.bouquet_index(id), page_number, page_size)
+        )
+
+    def organization(self, request: Request, id: str) -> Response:
+        return Response.json(
+            self.catalog.organization(self.index(id, self.catalog.size.organizations))
+        )
+
+    def universe_organizations(self, request: Request) -> Response:
+        return Response.json(self.catalog.universe_organizations())
+
+    def front_config(self, request: Request) -> Response:
+        return Response.text(self.catalog.front_config(), content_type="application/yaml")
+
+    def metrics(self, request: Request, kind: str) -> Response:
+        id_field = "dataset_id" if kind == "datasets" else "organization_id"
+        ids = [id for id in request.query.get(f"{id_field}__in", "").split(",") if id]
+        data = self.catalog.metrics(kind, ids, request.query.get("metric_month__exact"))
+        return Response.json(page(data, 1, request.int_arg("page_size", 20), len(data), None))
+
+    def matomo(self, request: Request) -> Response:
+        return Response.json(
+            self.catalog.matomo(
+                request.form.get("method", ""),
+                request.form.get("date", "2025-01-01"),
+                request.form.get("segment"),
+            )
+        )
+
+
+def error(status: int, message: str, headers: dict[str, str] | None = None) -> Response:
+    body = json.dumps({"message": message, "status": status}).encode()
+    return Response(body, status=status, headers=headers)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.respond("GET")
+
+    def do_POST(self):
+        self.respond("POST")
+
+    def respond(self, method: str):
+        url = urlsplit(self.path)
+        form = {}
+        if length := int(self.headers.get("Content-Length") or 0):
+            form = flatten(parse_qs(self.rfile.read(length).decode()))
+        request = Request(method, url.path, flatten(parse_qs(url.query)), form)
+        assert isinstance(self.server, StandInServer)
+        response = self.server.standin.handle(request)
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(response.body)))
+        for name, value in response.headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not response.body_rate:
+            self.wfile.write(response.body)
+            return
+        # in chunks of a tenth of a second
+        chunk_size = max(1, response.body_rate // 10)
+        for start in range(0, len(response.body), chunk_size):
+            self.wfile.write(response.body[start : start + chunk_size])
+            self.wfile.flush()
+            time.sleep(0.1)
+
+    def log_message(self, format: str, *args):
+        log.debug(format, *args)
+
+
+def flatten(params: dict[str, list[str]]) -> dict[str, str]:
+    return {k: v[-1] for k, v in params.items()}
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = DEFAULT_PORT,
+        scale: float = 1.0,
+        seed: int = 0,
+        size: CatalogSize = CURRENT_SIZE,
+        faults: Faults | None = None,
+    ):
+        super().__init__((host, port), Handler)
+        # once bound, for the links of the payloads to point to the actual port
+        catalog = SyntheticCatalog(self.url, scale=scale, seed=seed, size=size)
+        self.standin = StandIn(catalog, faults)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+@contextmanager
+def running(port: int = 0, **options) -> Iterator[StandInServer]:
+    """Serve a synthetic catalog in a background thread (on a free port by default)"""
+    server = StandInServer(port=port, **options)
+    thread = Thread(target=server.serve_forever, name="standin", daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+@cli
+def serve(
+    scale: float = 1.0,
+    seed: int = 0,
+    host: str = "localhost",
+    port: int = DEFAULT_PORT,
+    faults: str = "",
+):
+    """Serve a synthetic catalog of `scale` times the current size, with `faults` (YAML file)"""
+    server = StandInServer(
+        host=host,
+        port=port,
+        scale=scale,
+        seed=seed,
+        faults=Faults.load(faults, seed=seed) if faults else None,
+    )
+    catalog = server.standin.catalog
+    log.info(
+        f"Serving {catalog.size.datasets} datasets, {catalog.size.organizations} organizations "
+        f"and {catalog.size.bouquets} bouquets on {server.url}"
+    )
+    # stopped by a plain `kill` too
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        log.info(
+            "Requests served:\n"
+            + "\n".join(
+                f"{count:9} {endpoint} {status}"
+                for (endpoint, status), count in sorted(server.standin.counts.items())
+            )
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s: %(message)s"
+    )
+    run()
@@ -0,0 +1,463 @@
+"""
+Synthetic Ecospheres universe, at `scale` times the current catalog size: topic elements,
+datasets (v1 and v2 payloads, varied harvest blocks, large spatial geometries, many
+resources), organizations, bouquets with their factors, Matomo and metric API responses.
+
+Payloads are generated on request, from a random generator seeded by the item: the same
+`seed` always gives the same catalog, whatever the order in which it is read, and a large
+scale costs no memory. They are served over HTTP by `standin.py`.
+"""
+
+import copy
+import json
+import math
+from datetime import datetime, timedelta
+from pathlib import Path
+from random import Random
+from typing import NamedTuple
+
+FIXTURES = Path(__file__).parent / "tests" / "fixtures"
+TOPIC_ID = "synthetic-universe"
+TOPIC_SLUG = "univers-ecospheres-synthetique"
+UNIVERSE_NAME = "univers-ecospheres"
+FILTER_PREFIX = "ecospheres"
+THEMES = {
+    "mieux-se-deplacer": "Mieux se déplacer",
+    "mieux-se-loger": "Mieux se loger",
+    "preserver-la-biodiversite": "Préserver la biodiversité",
+    "mieux-produire": "Mieux produire",
+}
+LICENSES = [
+    {"id": "lov2", "title": "Licence Ouverte / Open Licence version 2.0"},
+    {"id": "odc-odbl", "title": "Open Data Commons Open Database License (ODbL)"},
+    {"id": "fr-lo", "title": "Licence Ouverte / Open Licence"},
+    {"id": "notspecified", "title": "License Not Specified"},
+    {"id": "other-at", "title": "Other (Attribution)"},
+]
+HARVEST_BACKENDS = ["CSW-DCAT", "CSW-ISO-19139", "DCAT", "CKAN", "OGC"]
+FREQUENCIES = ["unknown", "daily", "weekly", "monthly", "annual", "irregular"]
+FORMATS = ["csv", "json", "geojson", "shp", "zip", "pdf", "xlsx", "wms", "wfs"]
+AVAILABILITIES = ["available", "url available", "missing", "not available"]
+ORGANIZATION_TYPES = ["Etat", "Collectivité", "Etablissement public", "Entreprise"]
+EPOCH = datetime(2015, 1, 1)
+
+
+class CatalogSize(NamedTuple):
+    datasets: int
+    organizations: int
+    bouquets: int
+
+
+# rough size of the Ecospheres universe in 2025, `scale` multiplies it
+CURRENT_SIZE = CatalogSize(datasets=6000, organizations=300, bouquets=60)
+
+
+def load_fixture(name: str) -> dict:
+    with open(FIXTURES / name) as f:
+        return json.load(f)
+
+
+def object_id(i: int) -> str:
+    """data.gouv.fr ids look like MongoDB ones"""
+    return f"{i:024x}"
+
+
+def object_index(id: str) -> int | None:
+    try:
+        return int(id, 16) if len(id) == 24 else None
+    except ValueError:
+        return None
+
+
+def iso(d: datetime) -> str:
+    return d.isoformat() + "+00:00"
+
+
+def page(data: list, page: int, page_size: int, total: int, next_page: str | None) -> dict:
+    return {
+        "data": data,
+        "page": page,
+        "page_size": page_size,
+        "total": total,
+        "next_page": next_page,
+    }
+
+
+def geometry(rng: Random, nb_points: int) -> dict:
+    """A MultiPolygon of `nb_points` around a random point of France"""
+    lon, lat = rng.uniform(-4.5, 8), rng.uniform(42.5, 51)
+    ring = [
+        [
+            round(lon + math.cos(2 * math.pi * p / nb_points) * rng.uniform(0.1, 0.3), 6),
+            round(lat + math.sin(2 * math.pi * p / nb_points) * rng.uniform(0.1, 0.3), 6),
+        ]
+        for p in range(nb_points)
+    ]
+    return {"type": "MultiPolygon", "coordinates": [[ring + ring[:1]]]}
+
+
+class SyntheticCatalog:
+    def __init__(
+        self,
+        base_url: str,
+        scale: float = 1.0,
+        seed: int = 0,
+        size: CatalogSize = CURRENT_SIZE,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.scale = scale
+        self.seed = seed
+        self.size = CatalogSize(*(max(1, round(n * scale)) for n in size))
+        self.dataset_template = load_fixture("payload_ok.json")
+        self.resource_template = load_fixture("resource_payload_ok.json")
+        self.bouquet_template = load_fixture("bouquet_payload_ok.json")
+        # the v1 datasets list only has public datasets
+        self.public_datasets = [i for i in range(self.size.datasets) if not self.is_private(i)]
+
+    def rng(self, kind: str, i: int) -> Random:
+        return Random(f"{self.seed}-{kind}-{i}")
+
+    # datasets
+
+    def is_private(self, i: int) -> bool:
+        return self.rng("private", i).random() < 0.01
+
+    def organization_of(self, i: int) -> int:
+        """A few organizations publish most datasets"""
+        return int(self.size.organizations * self.rng("organization-of", i).random() ** 3)
+
+    def nb_resources(self, i: int) -> int:
+        rng = self.rng("nb-resources", i)
+        # some series have hundreds of resources (one per year, per département...)
+        return rng.randint(100, 500) if rng.random() < 0.02 else rng.randint(0, 10)
+
+    def harvest(self, rng: Random, i: int) -> dict | None:
+        if rng.random() < 0.2:
+            return None
+        backend = rng.choice(HARVEST_BACKENDS)
+        domain = f"catalogue-{rng.randint(1, 40)}.example.gouv.fr"
+        remote_id = f"{rng.getrandbits(128):032x}"
+        created_at = EPOCH + timedelta(days=rng.randint(0, 3000))
+        harvest = {
+            "backend": backend,
+            "domain": domain,
+            "source_id": object_id(rng.getrandbits(64)),
+            "remote_id": remote_id,
+            "last_update": iso(created_at + timedelta(days=rng.randint(0, 500))),
+        }
+        # harvested metadata depends on the source
+        if rng.random() < 0.8:
+            harvest["created_at"] = iso(created_at)
+        if rng.random() < 0.6:
+            harvest["issued_at"] = iso(created_at + timedelta(days=1))
+        if rng.random() < 0.5:
+            harvest["modified_at"] = iso(created_at + timedelta(days=rng.randint(1, 300)))
+        if backend.startswith("CSW") or rng.random() < 0.5:
+            harvest["remote_url"] = f"https://{domain}/catalogue/resource/{remote_id}"
+            harvest["uri"] = harvest["remote_url"]
+        if backend == "DCAT":
+            harvest["dct_identifier"] = remote_id
+        return harvest
+
+    def dataset_base(self, i: int) -> dict:
+        """Common to the v1 and v2 payloads, without resources"""
+        rng = self.rng("dataset", i)
+        payload = copy.deepcopy(self.dataset_template)
+        organization = self.organization(self.organization_of(i))
+        created_at = EPOCH + timedelta(days=rng.randint(0, 3000))
+        payload.update(
+            {
+                "id": object_id(i),
+                "slug": f"dataset-{i}",
+                "title": f"Jeu de données synthétique {i}",
+                "description": "Lorem ipsum dolor sit amet. " * int(rng.expovariate(1 / 30)),
+                "created_at": iso(created_at),
+                "last_modified": iso(created_at + timedelta(days=rng.randint(0, 1000))),
+                "private": self.is_private(i),
+                "organization": {
+                    **payload["organization"],
+                    "id": organization["id"],
+                    "name": organization["name"],
+                    "slug": organization["slug"],
+                },
+                "license": rng.choice(LICENSES)["id"],
+                "frequency": rng.choice(FREQUENCIES),
+                "harvest": self.harvest(rng, i),
+                "tags": rng.sample(["donnees-ouvertes", "environnement", "mobilite", "energie"], 2),
+                "quality": {**payload["quality"], "score": round(rng.random(), 4)},
+            }
+        )
+        if rng.random() < 0.5:
+            payload["temporal_coverage"] = {
+                "start": f"{rng.randint(2000, 2015)}-01-01",
+                "end": f"{rng.randint(2016, 2025)}-12-31",
+            }
+        if (draw := rng.random()) < 0.05:
+            payload["spatial"] = {
+                "geom": geometry(rng, rng.randint(2_000, 20_000)),
+                "zones": ["country:fr"],
+                "granularity": "other",
+            }
+        elif draw < 0.5:
+            payload["spatial"] = {"geom": None, "zones": ["country:fr"], "granularity": "fr:region"}
+        if rng.random() < 0.6:
+            payload["contact_points"] = [
+                {"name": f"Contact {i}", "email": f"contact-{i}@example.gouv.fr", "role": "contact"}
+            ]
+        return payload
+
+    def dataset(self, i: int) -> dict:
+        """v2 payload, resources are a rel"""
+        payload = self.dataset_base(i)
+        payload["resources"] = {
+            "rel": "subsection",
+            "href": f"{self.base_url}/api/2/datasets/{object_id(i)}/resources/?page=1&page_size=50",
+            "type": "GET",
+            "total": self.nb_resources(i),
+        }
+        return payload
+
+    def dataset_v1(self, i: int) -> dict:
+        """v1 payload, resources are embedded"""
+        payload = self.dataset_base(i)
+        payload["resources"] = [self.resource(i, r) for r in range(self.nb_resources(i))]
+        return payload
+
+    def resource(self, i: int, r: int) -> dict:
+        rng = self.rng(f"resource-{i}", r)
+        format = rng.choice(FORMATS)
+        created_at = EPOCH + timedelta(days=rng.randint(0, 3000))
+        return {
+            **self.resource_template,
+            "id": f"{object_id(i)}-{r}",
+            "title": f"Ressource {r} du jeu de données {i}" if rng.random() < 0.95 else None,
+            "description": "Description de la ressource." if rng.random() < 0.5 else None,
+            "format": format,
+            "type": rng.choice(["main", "main", "documentation", "api", "update"]),
+            "url": f"https://files.example.gouv.fr/{object_id(i)}/{r}.{format}",
+            "latest": f"{self.base_url}/fr/datasets/r/{object_id(i)}-{r}",
+            "filesize": rng.randint(1_000, 500_000_000) if rng.random() < 0.7 else None,
+            "created_at": iso(created_at),
+            "last_modified": iso(created_at + timedelta(days=rng.randint(0, 300))),
+            "extras": {"check:available": rng.random() < 0.9},
+            "schema": {"name": "etalab/schema-irve-statique"} if rng.random() < 0.05 else None,
+        }
+
+    def resources_page(self, i: int, page_number: int, page_size: int) -> dict:
+        total = self.nb_resources(i)
+        start = (page_number - 1) * page_size
+        resources = [self.resource(i, r) for r in range(start, min(start + page_size, total))]
+        url = f"{self.base_url}/api/2/datasets/{object_id(i)}/resources/"
+        next_page = (
+            f"{url}?page={page_number + 1}&page_size={page_size}"
+            if start + page_size < total
+            else None
+        )
+        return page(resources, page_number, page_size, total, next_page)
+
+    def datasets_page(self, page_number: int, page_size: int) -> dict:
+        """v1 datasets list of the topic"""
+        start = (page_number - 1) * page_size
+        indexes = self.public_datasets[start : start + page_size]
+        total = len(self.public_datasets)
+        next_page = (
+            f"{self.base_url}/api/1/datasets/?topic={TOPIC_ID}"
+            f"&page={page_number + 1}&page_size={page_size}"
+            if start + page_size < total
+            else None
+        )
+        return page([self.dataset_v1(i) for i in indexes], page_number, page_size, total, next_page)
+
+    # topic and bouquets
+
+    def topic(self) -> dict:
+        return {
+            "id": TOPIC_ID,
+            "name": "Univers Ecospheres synthétique",
+            "slug": TOPIC_SLUG,
+            "elements": {
+                "rel": "subsection",
+                "href": f"{self.base_url}/api/2/topics/{TOPIC_ID}/elements/?page=1&page_size=20",
+                "type": "GET",
+                "total": self.size.datasets,
+            },
+        }
+
+    def factor(self, i: int, availability: str = "available") -> dict:
+        element = {"class": "Dataset", "id": object_id(i)} if availability == "available" else None
+        uri = (
+            f"https://catalogue.example.gouv.fr/dataset/{i}"
+            if availability in ("available", "url available")
+            else None
+        )
+        return {
+            "id": f"factor-{i}",
+            "title": f"Facteur {i}",
+            "element": element,
+            "extras": {"ecospheres": {"availability": availability, "uri": uri}},
+        }
+
+    def elements_page(self, page_number: int, page_size: int) -> dict:
+        start = (page_number - 1) * page_size
+        total = self.size.datasets
+        factors = [self.factor(i) for i in range(start, min(start + page_size, total))]
+        url = f"{self.base_url}/api/2/topics/{TOPIC_ID}/elements/"
+        next_page = (
+            f"{url}?page={page_number + 1}&page_size={page_size}"
+            if start + page_size < total
+            else None
+        )
+        return page(factors, page_number, page_size, total, next_page)
+
+    def bouquet_id(self, b: int) -> str:
+        return f"bouquet-{b}"
+
+    def bouquet_factors(self, b: int) -> list[dict]:
+        rng = self.rng("bouquet-factors", b)
+        nb_factors = min(self.size.datasets, int(rng.expovariate(1 / 15)) + 1)
+        datasets = rng.sample(range(self.size.datasets), nb_factors)
+        return [
+            self.factor(i, rng.choices(AVAILABILITIES, weights=[80, 10, 5, 5])[0]) for i in datasets
+        ]
+
+    def bouquet(self, b: int) -> dict:
+        rng = self.rng("bouquet", b)
+        payload = copy.deepcopy(self.bouquet_template)
+        organization = self.organization(self.organization_of(b))
+        theme = rng.choice(list(THEMES))
+        payload.update(
+            {
+                "id": self.bouquet_id(b),
+                "name": f"Bouquet synthétique {b}",
+                "slug": f"bouquet-{b}",
+                "tags": [f"{FILTER_PREFIX}-theme-{theme}", UNIVERSE_NAME],
+                "private": rng.random() < 0.1,
+                "organization": {**payload["organization"], "id": organization["id"]},
+                "elements": {
+                    "rel": "subsection",
+                    "href": f"{self.base_url}/api/2/topics/{self.bouquet_id(b)}/elements/",
+                    "type": "GET",
+                    "total": len(self.bouquet_factors(b)),
+                },
+            }
+        )
+        return payload
+
+    def bouquets_page(self, page_number: int, page_size: int) -> dict:
+        start = (page_number - 1) * page_size
+        total = self.size.bouquets
+        bouquets = [self.bouquet(b) for b in range(start, min(start + page_size, total))]
+        next_page = (
+            f"{self.base_url}/api/2/topics/?tag={UNIVERSE_NAME}"
+            f"&page={page_number + 1}&page_size={page_size}"
+            if start + page_size < total
+            else None
+        )
+        return page(bouquets, page_number, page_size, total, next_page)
+
+    def bouquet_elements_page(self, b: int, page_number: int, page_size: int) -> dict:
+        factors = self.bouquet_factors(b)
+        start = (page_number - 1) * page_size
+        url = f"{self.base_url}/api/2/topics/{self.bouquet_id(b)}/elements/"
+        next_page = (
+            f"{url}?page={page_number + 1}&page_size={page_size}"
+            if start + page_size < len(factors)
+            else None
+        )
+        return page(
+            factors[start : start + page_size], page_number, page_size, len(factors), next_page
+        )
+
+    # organizations
+
+    def organization(self, j: int) -> dict:
+        rng = self.rng("organization", j)
+        badges = [{"kind": "public-service"}, {"kind": "certified"}] if rng.random() < 0.7 else []
+        return {
+            "id": object_id(j),
+            "name": f"Organisation synthétique {j}",
+            "acronym": f"OS{j}" if rng.random() < 0.3 else None,
+            "slug": f"organisation-{j}",
+            "badges": badges,
+        }
+
+    def universe_organizations(self) -> list[dict]:
+        """ecospheres-universe organizations list (`org_api`)"""
+        return [
+            {**self.organization(j), "type": self.rng("type", j).choice(ORGANIZATION_TYPES)}
+            for j in range(self.size.organizations)
+        ]
+
+    # other inputs
+
+    def licenses(self) -> list[dict]:
+        return LICENSES
+
+    def front_config(self) -> str:
+        values = "".join(
+            f"          - id: {id}\n            name: {name}\n" for id, name in THEMES.items()
+        )
+        return (
+            "pages:\n  bouquets:\n"
+            f"    filter_prefix: {FILTER_PREFIX}\n"
+            "    filters:\n      - id: theme\n        values:\n" + values
+        )
+
+    def matomo(self, method: str, date: str, segment: str | None = None) -> dict:
+        """Matomo API (`index.php`) response of `method`, cf `cli.load_stats`"""
+        rng = self.rng(f"matomo-{method}-{segment}", int(date.replace("-", "")))
+        visits = int(rng.uniform(500, 5_000) * self.scale)
+        if method == "VisitsSummary.get":
+            bounce_count = int(visits * rng.uniform(0.3, 0.6))
+            return {
+                "nb_uniq_visitors": int(visits * 0.8),
+                "nb_visits": visits,
+                "nb_actions": visits * 3,
+                "nb_visits_converted": 0,
+                "bounce_count": bounce_count,
+                "sum_visit_length": visits * 120,
+                "max_actions": rng.randint(50, 500),
+                "bounce_rate": f"{round(100 * bounce_count / visits)}%",
+                "nb_actions_per_visit": 3,
+                "avg_time_on_site": 120,
+            }
+        if method == "Actions.get":
+            return {
+                "nb_pageviews": visits * 2,
+                "nb_uniq_pageviews": int(visits * 1.5),
+                "nb_downloads": int(visits * 0.1),
+                "nb_uniq_downloads": int(visits * 0.08),
+            }
+        if method == "VisitFrequency.get":
+            return {
+                "nb_uniq_visitors_returning": int(visits * 0.3),
+                "nb_uniq_visitors_new": int(visits * 0.5),
+            }
+        return {"result": "error", "message": f"Unknown method {method}"}
+
+    def metrics(self, kind: str, ids: list[str], month: str | None = None) -> list[dict]:
+        """metric API (`metrics_api_url`) data of `ids`, `kind` is datasets or organizations"""
+        data = []
+        for id in ids:
+            if (i := object_index(id)) is None:
+                continue
+            rng = self.rng(f"metrics-{kind}-{month}", i)
+            if kind == "datasets":
+                data.append(
+                    {
+                        "dataset_id": id,
+                        "metric_month": month,
+                        "monthly_visit": rng.randint(0, 2_000),
+                        "monthly_download_resource": rng.randint(0, 500),
+                    }
+                )
+            else:
+                data.append(
+                    {
+                        "organization_id": id,
+                        "metric_month": month,
+                        "monthly_visit_dataset": rng.randint(0, 20_000),
+                        "monthly_download_resource": rng.randint(0, 5_000),
+                    }
+                )
+        return data
@@ -0,0 +1,163 @@
+import gzip
+import json
+from datetime import date
+
+import brotli
+import pytest
+
+from api import HTTPError, Query, ResponseCache, handle, make_etag, route
+
+METRICS = [{"date": date(2025, 6, d), "value": float(d)} for d in range(1, 4)]
+
+
+class MockDB:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+        self.queries: list[Query] = []
+
+    def execute(self, query: Query) -> list[dict]:
+        self.queries.append(query)
+        return self.rows[: query.params.get("limit")]
+
+
+def get(path, query_string="", headers={}, generation=1, cache=None, db=None):
+    params = dict(p.split("=") for p in query_string.split("&") if p)
+    return handle(
+        path,
+        query_string,
+        params,
+        headers,
+        generation,
+        cache or ResponseCache(),
+        (db or MockDB(METRICS)).execute,
+    )
+
+
+def test_route():
+    assert route("/api/metrics", {"measurement": "nb_datasets"}).cursor == "date"
+    assert route("/api/organizations/", {}).cursor == "organization"
+    assert route("/api/organizations/xxx", {}).params == {"organization": "xxx"}
+    with pytest.raises(HTTPError):
+        route("/api/unknown", {})
+    with pytest.raises(HTTPError):
+        route("/api/metrics", {})
+    with pytest.raises(HTTPError):
+        route("/api/stats", {"limit": "0"})
+
+
+def test_pagination():
+    response = get("/api/metrics", "measurement=nb_datasets&limit=2")
+
+    payload = json.loads(response.body)
+    assert response.status == 200
+    assert payload["data"] == [
+        {"date": "2025-06-01", "value": 1.0},
+        {"date": "2025-06-02", "value": 2.0},
+    ]
+    assert payload["next_page"] == "/api/metrics?measurement=nb_datasets&limit=2&after=2025-06-02"
+
+
+def test_null_filters():
+    query = route("/api/metrics", {"measurement": "nb_datasets"})
+    assert "organization IS NULL" in query.sql
+    query = route("/api/metrics", {"measurement": "nb_datasets", "organization": "xxx"})
+    assert "organization = :organization" in query.sql
+    assert "segment IS NULL" in route("/api/stats", {}).sql
+    assert "segment = :segment" in route("/api/stats", {"segment": "all"}).sql
+
+
+def test_after():
+    assert route("/api/stats", {"after": "2025-06-02"}).params["after"] == date(2025, 6, 2)
+    response = get("/api/metrics", "measurement=nb_datasets&after=garbage")
+
+    assert response.status == 400
+    assert json.loads(response.body) == {"error": "after must be a date (YYYY-MM-DD)"}
+
+
+def test_last_page():
+    response = get("/api/metrics", "measurement=nb_datasets&limit=5")
+
+    assert json.loads(response.body)["next_page"] is None
+
+
+def test_not_found():
+    response = get("/api/organizations/xxx", db=MockDB([]))
+
+    assert response.status == 404
+
+
+def test_etag():
+    etag = make_etag(1, "/api/metrics", "measurement=nb_datasets", None)
+
+    response = get("/api/metrics", "measurement=nb_datasets", headers={"if-none-match": etag})
+    assert response.status == 304
+    assert response.body == b""
+
+    response = get(
+        "/api/metrics", "measurement=nb_datasets", headers={"if-none-match": etag}, generation=2
+    )
+    assert response.status == 200
+    etag = make_etag(2, "/api/metrics", "measurement=nb_datasets", None)
+    assert ("ETag", etag) in response.headers
+
+
+def test_etag_per_encoding():
+    etag = make_etag(1, "/api/metrics", "measurement=nb_datasets", None)
+
+    response = get(
+        "/api/metrics",
+        "measurement=nb_datasets",
+        headers={"if-none-match": etag, "accept-encoding": "gzip"},
+    )
+    assert response.status == 200
+    etag = make_etag(1, "/api/metrics", "measurement=nb_datasets", "gzip")
+    assert ("ETag", etag) in response.headers
+
+
+def test_etag_after_routing():
+    etag = make_etag(1, "/api/unknown", "", None)
+    assert get("/api/unknown", headers={"if-none-match": etag}).status == 404
+
+    etag = make_etag(1, "/api/metrics", "limit=0", None)
+    assert get("/api/metrics", "limit=0", headers={"if-none-match": etag}).status == 400
+
+
+@pytest.mark.parametrize(
+    "encoding,decompress", [("gzip", gzip.decompress), ("br", brotli.decompress)]
+)
+def test_compression(encoding, decompress):
+    response = get("/api/metrics", "measurement=nb_datasets", headers={"accept-encoding": encoding})
+
+    assert ("Content-Encoding", encoding) in response.headers
+    assert len(json.loads(decompress(response.body))["data"]) == 3
+
+
+def test_cache_invalidated_by_generation():
+    cache = ResponseCache()
+    db = MockDB(METRICS)
+
+    get("/api/metrics", "measurement=nb_datasets", cache=cache, db=db)
+    get("/api/metrics", "measurement=nb_datasets", cache=cache, db=db)
+    assert len(db.queries) == 1
+
+    get("/api/metrics", "measurement=nb_datasets", cache=cache, db=db, generation=2)
+    assert len(db.queries) == 2
+
+
+def test_cache_lru():
+    cache = ResponseCache(maxsize=2)
+    cache.set("a", b"a")
+    cache.set("b", b"b")
+    cache.get("a")
+    cache.set("c", b"c")
+
+    assert cache.get("a") == b"a"
+    assert cache.get("b") is None
+    assert cache.get("c") == b"c"
+
+
+def test_cache_ttl():
+    cache = ResponseCache(ttl=-1)
+    cache.set("a", b"a")
+
+    assert cache.get("a") is None
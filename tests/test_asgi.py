@@ -0,0 +1,183 @@
+import asyncio
+import json
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+import asgi
+from api import Query, ResponseCache
+from models import LoadGeneration, Metric
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+METRICS = [{"date": date(2025, 6, d), "value": float(d)} for d in range(1, 4)]
+
+
+class MockDB:
+    def __init__(self, rows: list[dict], delay: float = 0):
+        self.rows = rows
+        self.delay = delay
+        self.queries: list[Query] = []
+
+    async def execute(self, query: Query) -> list[dict]:
+        self.queries.append(query)
+        await asyncio.sleep(self.delay)
+        if query.sql.startswith("SELECT coalesce"):
+            return [{"generation": 1}]
+        after = query.params.get("after")
+        rows = [row for row in self.rows if after is None or row["date"] > after]
+        return rows[: query.params.get("limit")]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = MockDB(METRICS)
+    monkeypatch.setattr(asgi.state, "execute", db.execute)
+    monkeypatch.setattr(asgi.state, "cache", ResponseCache())
+    monkeypatch.setattr(asgi.state, "generation", asgi.GenerationChecker())
+    return db
+
+
+async def get(path, query_string="", method="GET"):
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string.encode(),
+        "headers": [],
+    }
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi.application(scope, None, send)
+    start, body = messages
+    return start["status"], body["body"]
+
+
+def test_healthcheck(db):
+    assert asyncio.run(get("/")) == (200, b"ok")
+    assert asyncio.run(get("/api/metrics", method="POST"))[0] == 405
+    assert not db.queries
+
+
+def test_get(db):
+    status, body = asyncio.run(get("/api/metrics", "measurement=nb_datasets&limit=2"))
+
+    assert status == 200
+    assert len(json.loads(body)["data"]) == 2
+    # generation + metrics
+    assert len(db.queries) == 2
+
+
+async def follow_pages(path: str) -> list[dict]:
+    """Rows of every page, following the `next_page` links"""
+    rows = []
+    while path:
+        status, body = await get(*path.split("?"))
+        assert status == 200
+        payload = json.loads(body)
+        rows += payload["data"]
+        path = payload["next_page"]
+    return rows
+
+
+def test_pagination(db):
+    rows = asyncio.run(follow_pages("/api/metrics?measurement=nb_datasets&limit=2"))
+
+    assert [row["date"] for row in rows] == ["2025-06-01", "2025-06-02", "2025-06-03"]
+    assert db.queries[-1].params["after"] == date(2025, 6, 2)
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_pagination_asyncpg(monkeypatch):
+    """The `after` cursor is bound by asyncpg, which doesn't cast strings to dates"""
+    assert TEST_DATABASE_URL
+    with create_engine(TEST_DATABASE_URL).begin() as connection:
+        connection.execute(text("DROP SCHEMA public CASCADE"))
+        connection.execute(text("CREATE SCHEMA public"))
+        tables = [Metric.__table__, LoadGeneration.__table__]
+        Metric.metadata.create_all(connection, tables=tables)  # type: ignore
+        connection.execute(text("CREATE TABLE metrics_default PARTITION OF metrics DEFAULT"))
+        connection.execute(
+            text("INSERT INTO metrics (date, measurement, value) VALUES (:date, :m, :value)"),
+            [{**row, "m": "nb_datasets"} for row in METRICS],
+        )
+    monkeypatch.setattr(asgi.state, "cache", ResponseCache())
+    monkeypatch.setattr(asgi.state, "generation", asgi.GenerationChecker())
+    url = make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg")
+    monkeypatch.setattr(asgi.state, "engine", create_async_engine(url))
+
+    async def run():
+        try:
+            return await follow_pages("/api/metrics?measurement=nb_datasets&limit=2")
+        finally:
+            await asgi.state.get_engine().dispose()
+
+    assert [row["value"] for row in asyncio.run(run())] == [1.0, 2.0, 3.0]
+
+
+def test_coalescing(db):
+    db.delay = 0.05
+
+    async def concurrent_gets():
+        return await asyncio.gather(
+            *(get("/api/metrics", "measurement=nb_datasets") for _ in range(5))
+        )
+
+    responses = asyncio.run(concurrent_gets())
+
+    assert {status for status, _ in responses} == {200}
+    assert len({body for _, body in responses}) == 1
+    # one generation check and one metrics query for the 5 requests
+    assert len(db.queries) == 2
+    assert not asgi.state.coalescer.in_flight
+
+
+def test_timeout(db, monkeypatch):
+    monkeypatch.setattr(asgi.state.generation, "checked_at", float("inf"))
+    db.delay = 0.2
+    monkeypatch.setattr(
+        asgi, "route", lambda path, params: Query("SELECT 1", {}, "date", 1, timeout=0.01)
+    )
+
+    status, body = asyncio.run(get("/api/metrics"))
+
+    assert status == 504
+    assert json.loads(body) == {"error": "Query timed out"}
+
+
+def test_generation_timeout(db, monkeypatch):
+    db.delay = 0.2
+    monkeypatch.setattr(asgi, "GENERATION_TIMEOUT", 0.01)
+
+    status, body = asyncio.run(get("/api/metrics", "measurement=nb_datasets"))
+
+    assert status == 504
+    assert json.loads(body) == {"error": "Query timed out"}
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_statement_timeout(monkeypatch):
+    """The server cancels a query past its timeout, and the connection is given back"""
+    assert TEST_DATABASE_URL
+    url = make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg")
+    engine = create_async_engine(url, pool_size=1, max_overflow=0)
+    monkeypatch.setattr(asgi.state, "engine", engine)
+
+    async def run():
+        try:
+            with pytest.raises(DBAPIError) as error:
+                await asgi.state.execute(Query("SELECT pg_sleep(5)", {}, None, 1, timeout=0.1))
+            assert getattr(error.value.orig, "sqlstate", None) == asgi.QUERY_CANCELED
+            assert engine.pool.checkedout() == 0  # type: ignore
+            return await asgi.state.execute(Query("SELECT 1 AS one", {}, None, 1))
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(run()) == [{"one": 1}]
@@ -1,6 +1,6 @@
 import pytest
 
-from config import get_config_value
+from config import DEFAULT_ENGINE_CONFIG, ENVS_CONF, get_config_value, get_engine_config
 
 
 def test_wrong_env():
@@ -12,3 +12,24 @@ def test_get_simple_value():
     assert get_config_value("local", "universe_name") == "ecospheres"
     assert get_config_value("demo", "universe_name") == "univers-ecospheres"
     assert get_config_value("prod", "universe_name") == "univers-ecospheres"
+
+
+def test_get_engine_config():
+    config = get_engine_config("prod", pool_size=2, max_overflow=None)
+
+    assert config["pool_size"] == 2
+    assert config["max_overflow"] == DEFAULT_ENGINE_CONFIG["max_overflow"]
+    # from ENVS_CONF
+    assert config["statement_timeout"] == 3_600_000
+    assert get_engine_config("demo")["statement_timeout"] == 0
+
+
+def test_get_engine_config_invalid(monkeypatch):
+    with pytest.raises(ValueError):
+        get_engine_config("demo", pool_sise=2)
+    with pytest.raises(ValueError):
+        get_engine_config("demo", driver="pg8000")
+    # settings of ENVS_CONF are checked too
+    monkeypatch.setitem(ENVS_CONF, "demo", {**ENVS_CONF["demo"], "engine": {"pool_sise": 2}})
+    with pytest.raises(ValueError):
+        get_engine_config("demo")
@@ -0,0 +1,202 @@
+from typing import Any, cast
+
+from sqlalchemy import QueuePool, Table, create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import psycopg2
+
+from config import get_engine_config
+from db import (
+    PoolUsage,
+    ResourceSync,
+    create_tuned_engine,
+    mark_deleted,
+    pg_type_names,
+    sync_resources,
+    upsert,
+    upsert_rows,
+)
+from models import Bouquet, Dataset, DatasetMetric, Resource
+
+
+class MockSession:
+    def __init__(self):
+        self.statements = []
+
+    def get_bind(self):
+        class Bind:
+            dialect = psycopg2.dialect()
+
+        return Bind()
+
+    def execute(self, stmt, params=None):
+        self.statements.append((str(stmt.compile(dialect=postgresql.dialect())), params))
+
+        class Result:
+            rowcount = 2
+
+        return Result()
+
+    def commit(self):
+        pass
+
+
+def test_mark_deleted():
+    session = MockSession()
+
+    assert mark_deleted(session, Dataset, {"a", "b"}) == 2  # type: ignore
+
+    [(sql, params)] = session.statements
+    assert sql == (
+        "UPDATE catalog SET deleted=%(deleted)s, content_hash=%(content_hash)s::VARCHAR "
+        "WHERE NOT catalog.deleted AND NOT (catalog.dataset_id = ANY (%(seen)s::VARCHAR[]))"
+    )
+    assert sorted(params["seen"]) == ["a", "b"]
+
+
+def test_mark_deleted_bouquets():
+    session = MockSession()
+
+    mark_deleted(session, Bouquet, [])  # type: ignore
+
+    assert "bouquets.bouquet_id = ANY" in session.statements[0][0]
+
+
+class MockUpsertSession(MockSession):
+    def __init__(self):
+        super().__init__()
+        self.written = []
+
+    def merge(self, obj):
+        self.written.append(obj)
+
+    def add(self, obj):
+        self.written.append(obj)
+
+    def flush(self):
+        pass
+
+
+def test_upsert_unchanged():
+    session = MockUpsertSession()
+    existing = Dataset(id=1, dataset_id="a", title="Titre", content_hash="abc")
+
+    new = Dataset(dataset_id="a", title="Titre", content_hash="abc")
+    assert upsert(session, new, existing)  # type: ignore
+    assert not session.written
+
+    new = Dataset(dataset_id="a", title="Autre", content_hash="def")
+    upsert(session, new, existing)  # type: ignore
+    assert len(session.written) == 1
+
+
+class MockSyncSession(MockSession):
+    def __init__(self, existing: list[tuple[str, str]]):
+        super().__init__()
+        self.existing = existing
+
+    def execute(self, stmt, params=None) -> Any:
+        super().execute(stmt, params)
+        existing = self.existing
+
+        class Result:
+            def all(self):
+                return existing
+
+        return Result()
+
+
+def make_resource(resource_id: str, content_hash: str) -> Resource:
+    return Resource(dataset_id="d", resource_id=resource_id, content_hash=content_hash)
+
+
+def test_sync_resources():
+    session = MockSyncSession([("unchanged", "h1"), ("changed", "h2"), ("gone", "h3")])
+
+    resources = [
+        make_resource("unchanged", "h1"),
+        make_resource("changed", "h4"),
+        make_resource("new", "h5"),
+    ]
+    sync = sync_resources(session, "d", resources)  # type: ignore
+
+    assert sync == ResourceSync(inserted=1, updated=1, deleted=1)
+    select_sql, delete_sql, insert_sql = (sql for sql, _ in session.statements)
+    assert delete_sql.startswith("DELETE FROM resources")
+    assert "ON CONFLICT ON CONSTRAINT uq_resources_dataset_id_resource_id DO UPDATE" in insert_sql
+    # 2 rows inserted
+    assert insert_sql.count("%(resource_id_m") == 2
+
+
+def test_sync_resources_unchanged():
+    session = MockSyncSession([("a", "h1")])
+
+    sync = sync_resources(session, "d", [make_resource("a", "h1")])  # type: ignore
+    assert sync == ResourceSync(0, 0, 0)
+    # only the select
+    assert len(session.statements) == 1
+
+
+def test_create_tuned_engine(tmp_path):
+    config = get_engine_config("demo", statement_timeout=1000)
+
+    engine = create_tuned_engine("postgresql+psycopg2://user@localhost/db", config)
+
+    dialect = cast(psycopg2.PGDialect_psycopg2, engine.dialect)
+    assert cast(QueuePool, engine.pool).size() == config["pool_size"]
+    assert dialect.insertmanyvalues_page_size == config["insertmanyvalues_page_size"]
+    assert dialect.executemany_batch_page_size == config["executemany_batch_page_size"]
+    # psycopg2 options are not given to other drivers
+    assert create_tuned_engine(
+        f"sqlite:///{tmp_path}/db.sqlite", {**config, "statement_timeout": 0}
+    )
+
+
+def test_create_tuned_engine_driver():
+    config = get_engine_config("demo")
+
+    engine = create_tuned_engine("postgresql://user@localhost/db", config)
+    assert engine.dialect.driver == "psycopg2"
+
+    engine = create_tuned_engine("postgresql://user@localhost/db", {**config, "driver": "psycopg"})
+    assert engine.dialect.driver == "psycopg"
+    assert not hasattr(engine.dialect, "executemany_batch_page_size")
+
+
+def test_pg_type_names():
+    table = cast(Table, DatasetMetric.__table__)
+    columns = ["date", "measurement", "value", "dataset"]
+
+    types = pg_type_names(table, columns, postgresql.dialect())
+
+    assert types == ["date", "varchar", "float8", "varchar"]
+
+
+def test_upsert_rows():
+    session = MockSession()
+    rows = [{"date": "2025-06-01", "measurement": "m", "value": 1.0, "dataset": "d"}] * 3
+
+    table = cast(Table, DatasetMetric.__table__)
+    assert upsert_rows(session, table, rows, "uq", ["value"]) == 3  # type: ignore
+
+    # a single statement, not a COPY with psycopg2
+    [(sql, params)] = session.statements
+    assert sql.startswith("INSERT INTO datasets_metrics")
+    assert "ON CONFLICT ON CONSTRAINT uq DO UPDATE SET value = excluded.value" in sql
+    assert params == rows
+    assert upsert_rows(session, table, [], "uq", ["value"]) == 0  # type: ignore
+
+
+def test_pool_usage(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/db.sqlite", pool_size=1, max_overflow=1)
+    usage = PoolUsage(engine, capacity=2)
+
+    with engine.connect(), engine.connect():
+        pass
+    with engine.connect():
+        pass
+
+    assert usage.checkouts == 3
+    assert usage.peak_checked_out == 2
+    assert usage.checked_out == 0
+    assert usage.exhausted()
+    assert "peak 2/2" in usage.report()
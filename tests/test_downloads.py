@@ -0,0 +1,31 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from downloads import DownloadCache
+
+URL = "https://example.com/api/1/datasets/licenses/"
+
+
+def test_download_cache(mock_requests):
+    mock_requests.get(URL, content=b"[]")
+    cache = DownloadCache()
+    session = requests.Session()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        bodies = list(executor.map(lambda _: cache.get(session, URL), range(8)))
+
+    assert bodies == [b"[]"] * 8
+    assert mock_requests.call_count == 1
+
+
+def test_download_cache_error(mock_requests):
+    mock_requests.get(URL, [{"status_code": 500}, {"content": b"[]"}])
+    cache = DownloadCache()
+    session = requests.Session()
+
+    with pytest.raises(requests.HTTPError):
+        cache.get(session, URL)
+    # errors are not cached
+    assert cache.get(session, URL) == b"[]"
@@ -0,0 +1,85 @@
+from datetime import date
+
+import pyarrow.parquet as pq
+
+from export import EXPORTS, export_table, get_schema, read_state, rows_to_table
+from models import Metric
+
+
+class MockSession:
+    def __init__(self, rows: list[dict], first_pending: int | None = None):
+        self.rows = rows
+        # first id of a row of the current day, if any
+        self.first_pending = first_pending
+        self.queries = []
+
+    def execute(self, query, execution_options=None):
+        self.queries.append(query)
+        rows = self.rows
+        first_pending = self.first_pending
+
+        class MockResult:
+            def scalar(self):
+                return first_pending
+
+            def mappings(self):
+                return self
+
+            def partitions(self):
+                yield rows
+
+        return MockResult()
+
+
+METRICS = [
+    {"id": 1, "date": date(2025, 5, 31), "measurement": "nb_datasets", "value": 3.0},
+    {"id": 2, "date": date(2025, 6, 1), "measurement": "nb_datasets", "value": 4.0},
+]
+
+
+def test_get_schema():
+    schema = get_schema(Metric.__table__, "month")  # type: ignore
+
+    assert schema.names == ["organization", "id", "date", "measurement", "value", "month"]
+
+
+def test_rows_to_table_jsonb():
+    schema = get_schema(EXPORTS["catalog"].model.__table__, "organization")  # type: ignore
+    rows = [{name: None for name in schema.names} | {"extras": {"foo": "bar"}, "tags": ["a"]}]
+
+    table = rows_to_table(rows, schema, frozenset({"extras"}))
+
+    assert table.column("extras").to_pylist() == ['{"foo": "bar"}']
+    assert table.column("tags").to_pylist() == [["a"]]
+
+
+def test_export_table_incremental(tmp_path):
+    rows = [{"organization": "org", **m} for m in METRICS]
+    session = MockSession(rows)
+
+    assert export_table(session, "metrics", tmp_path) == 2  # type: ignore
+
+    dataset = pq.read_table(tmp_path / "metrics")
+    assert sorted(dataset.column("month").to_pylist()) == ["2025-05", "2025-06"]
+    assert read_state(tmp_path) == {"metrics": 2}
+
+    # next run asks for rows written since, whatever their date, up to the current day
+    late = {"organization": "org", **METRICS[0], "id": 5}
+    session = MockSession([late], first_pending=4)
+    assert export_table(session, "metrics", tmp_path) == 1  # type: ignore
+    query = session.queries[-1].compile()
+    assert "metrics.id >" in str(query) and "metrics.id <" in str(query)
+    assert {query.params["id_1"], query.params["id_2"]} == {2, 4}
+    assert read_state(tmp_path) == {"metrics": 5}
+    assert pq.read_table(tmp_path / "metrics").num_rows == 3
+
+
+def test_export_table_date_state(tmp_path):
+    # state of an export by date, before ids were tracked: exported again from scratch
+    session = MockSession([{"organization": "org", **m} for m in METRICS])
+    export_table(session, "metrics", tmp_path)  # type: ignore
+    (tmp_path / "_state.json").write_text('{"metrics": "2025-06-01"}')
+
+    assert export_table(session, "metrics", tmp_path) == 2  # type: ignore
+    assert "metrics.id >" not in str(session.queries[-1])
+    assert pq.read_table(tmp_path / "metrics").num_rows == 2
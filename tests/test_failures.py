@@ -0,0 +1,136 @@
+import psycopg
+import pytest
+from requests import Response
+from requests.exceptions import ConnectionError, HTTPError
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+import cli
+from config import ENVS_CONF
+from models import Dataset, LoadFailure
+from tests.test_query_budget import (
+    BASE_URL,
+    TEST_CONFIG,
+    TEST_DATABASE_URL,
+    Universe,
+    load,
+    page,
+    reset_database,
+)
+
+FACTOR = {"id": "factor", "element": {"class": "Dataset", "id": "dataset"}}
+
+
+def http_error(status: int, headers: dict | None = None) -> HTTPError:
+    response = Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return HTTPError(response=response)
+
+
+@pytest.fixture
+def context(monkeypatch):
+    # the engine is never connected to
+    config = {**ENVS_CONF["demo"], "dsn": "postgresql://localhost/unused"}
+    monkeypatch.setitem(ENVS_CONF, "demo", config)
+    with cli.env_context("demo"):
+        yield
+
+
+@pytest.fixture
+def waits(monkeypatch) -> list[float]:
+    waits = []
+    monkeypatch.setattr(cli.time, "sleep", waits.append)
+    return waits
+
+
+def failing(monkeypatch, errors: list[Exception]) -> list:
+    """`process_factor` raising `errors` in turn, then loading the dataset"""
+    calls = []
+
+    def process_factor(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return "dataset"
+
+    monkeypatch.setattr(cli, "process_factor", process_factor)
+    return calls
+
+
+def test_is_transient():
+    assert cli.is_transient(ConnectionError())
+    assert cli.is_transient(http_error(429))
+    assert cli.is_transient(http_error(502))
+    assert not cli.is_transient(http_error(404))
+    assert not cli.is_transient(KeyError("resources"))
+    # database connections, but not statements cancelled by the statement timeout
+    assert cli.is_transient(OperationalError("SELECT 1", {}, psycopg.OperationalError()))
+    assert not cli.is_transient(OperationalError("SELECT 1", {}, psycopg.errors.QueryCanceled()))
+
+
+def test_retries_with_backoff(context, monkeypatch, waits):
+    calls = failing(monkeypatch, [ConnectionError(), http_error(429, {"Retry-After": "60"})])
+
+    assert cli.process_factor_with_retries("demo", FACTOR, [], False) == "dataset"
+    assert len(calls) == 3
+    # exponential, or the Retry-After of a rate limit
+    assert waits == [cli.RETRY_BACKOFF, 60]
+
+
+def test_gives_up(context, monkeypatch, waits):
+    failing(monkeypatch, [ConnectionError()] * cli.DATASET_ATTEMPTS)
+
+    with pytest.raises(cli.DatasetFailed) as info:
+        cli.process_factor_with_retries("demo", FACTOR, [], False)
+    assert info.value.attempts == cli.DATASET_ATTEMPTS
+    assert isinstance(info.value.error, ConnectionError)
+
+    # not retried
+    calls = failing(monkeypatch, [http_error(404)])
+    with pytest.raises(cli.DatasetFailed) as info:
+        cli.process_factor_with_retries("demo", FACTOR, [], False)
+    assert info.value.attempts == 1
+    assert len(calls) == 1
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_retry_failed(monkeypatch, mock_requests):
+    monkeypatch.setitem(ENVS_CONF, "demo", {**ENVS_CONF["demo"], **TEST_CONFIG})
+    universe = Universe(nb_datasets=5, nb_organizations=2, nb_bouquets=1)
+    universe.register(mock_requests)
+    cli.downloads.clear()
+    with cli.env_context("demo"):
+        reset_database()
+        load()
+
+        # dataset-1 is missing from the bulk fetch and can't be fetched by id
+        bulk = f"{BASE_URL}/api/1/datasets/?topic=topic&page_size=100"
+        datasets = [universe.dataset(i) for i in range(5) if i != 1]
+        mock_requests.get(bulk, json=page(datasets, page_size=100), complete_qs=True)
+        dataset_url = f"{BASE_URL}/api/2/datasets/dataset-1/"
+        mock_requests.get(dataset_url, status_code=404)
+        load()
+
+        [failure] = cli.app.db.scalars(select(LoadFailure))
+        assert (failure.dataset_id, failure.factor_id) == ("dataset-1", "factor-1")
+        assert (failure.error_class, failure.attempts) == ("HTTPError", 1)
+        assert failure.payload_url == dataset_url
+        # kept as it was, not flagged as deleted
+        deleted = cli.app.db.scalars(select(Dataset.dataset_id).where(Dataset.deleted)).all()
+        assert deleted == []
+
+        cli.retry_failed(env="demo")
+        assert cli.app.db.scalars(select(LoadFailure)).all()[0].attempts == 2
+
+        # v2 payload, its resources are not fetched with `skip_related`
+        resources = {"href": f"{dataset_url}resources/", "total": universe.nb_resources}
+        mock_requests.get(dataset_url, json={**universe.dataset(1), "resources": resources})
+        requests_before = mock_requests.call_count
+        cli.retry_failed(env="demo", skip_related=True)
+
+        assert cli.app.db.scalars(select(LoadFailure)).all() == []
+        # only the failed dataset is fetched again
+        fetched = [r.url for r in mock_requests.request_history[requests_before:]]
+        assert dataset_url in fetched
+        assert not any("/api/2/datasets/dataset-0/" in url for url in fetched)
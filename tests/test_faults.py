@@ -0,0 +1,77 @@
+from random import Random
+
+import pytest
+import requests
+
+from faults import EndpointFaults, Faults, Latency
+from standin import running
+from synthetic import CatalogSize, object_id
+
+
+def test_latency():
+    rng = Random(0)
+
+    assert Latency.parse("fixed:0.1").sample(rng) == 0.1
+    assert Latency.parse(0.2) == Latency("fixed", 0.2)
+    assert 0.1 <= Latency.parse("uniform:0.1:0.3").sample(rng) <= 0.3
+    samples = sorted(Latency.parse("lognormal:0.05:0.5").sample(rng) for _ in range(1001))
+    assert samples[500] == pytest.approx(0.05, rel=0.2)
+    with pytest.raises(ValueError):
+        Latency.parse("normal:1")
+
+
+def test_rate_limit():
+    now = [0.0]
+    faults = Faults({"dataset": EndpointFaults(rate_limit=2)}, clock=lambda: now[0])
+
+    assert faults.fault("dataset") is None
+    assert faults.fault("dataset") is None
+    assert faults.fault("dataset") == (429, {"Retry-After": "1"})
+    # other endpoints are not limited
+    assert faults.fault("organization") is None
+    now[0] = 0.5
+    assert faults.fault("dataset") is None
+    assert (fault := faults.fault("dataset")) and fault.status == 429
+
+
+def test_error_bursts():
+    faults = Faults.from_dict({"*": {"error_rate": 0.1, "error_burst": 3, "error_statuses": [503]}})
+
+    statuses = [f.status if (f := faults.fault("dataset")) else 200 for _ in range(1000)]
+
+    assert set(statuses) == {200, 503}
+    # errors come in bursts of 3
+    bursts = "".join("x" if s == 503 else "." for s in statuses).split(".")
+    assert {len(b) % 3 for b in bursts} == {0}
+    assert 0.1 < statuses.count(503) / len(statuses) < 0.5
+    with pytest.raises(ValueError, match="error_ratio"):
+        Faults.from_dict({"*": {"error_ratio": 0.1}})
+
+
+def test_standin_faults():
+    faults = Faults.from_dict(
+        {
+            "organization": {"rate_limit": 1},
+            "licenses": {"error_rate": 1, "error_statuses": [502]},
+            "dataset": {"latency": "fixed:0.05", "body_rate": 10_000},
+        }
+    )
+    with running(size=CatalogSize(10, 2, 1), faults=faults) as server:
+        url = f"{server.url}/api/1/organizations/{object_id(0)}/"
+        assert requests.get(url).ok
+        limited = requests.get(url)
+        assert limited.status_code == 429
+        assert limited.headers["Retry-After"] == "1"
+        assert requests.get(f"{server.url}/api/1/datasets/licenses/").status_code == 502
+
+        r = requests.get(f"{server.url}/api/2/datasets/{object_id(1)}/")
+        assert r.json()["id"] == object_id(1)
+        # latency, then a tenth of a second per 1000 bytes
+        assert r.elapsed.total_seconds() >= 0.05
+
+    assert server.standin.counts == {
+        ("organization", 200): 1,
+        ("organization", 429): 1,
+        ("licenses", 502): 1,
+        ("dataset", 200): 1,
+    }
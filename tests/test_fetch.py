@@ -0,0 +1,95 @@
+import json
+
+import requests
+
+from fetch import BulkDatasets, from_v1_payload
+from models import Dataset, Resource
+
+BASE_URL = "https://example.com"
+
+
+def v1_payload() -> dict:
+    with open("tests/fixtures/payload_ok.json") as f:
+        payload = json.load(f)
+    with open("tests/fixtures/resource_payload_ok.json") as f:
+        resource = json.load(f)
+    return {**payload, "resources": [resource, {**resource, "id": "other"}]}
+
+
+def test_from_v1_payload():
+    payload, resources = from_v1_payload(v1_payload())
+
+    dataset = Dataset.from_payload(payload, BASE_URL, [])
+    assert dataset.nb_resources == 2
+    assert Resource.from_payload(resources[1], dataset.dataset_id).resource_id == "other"
+
+
+def mock_bulk_pages(mock_requests) -> dict:
+    """Two pages of the datasets list, returns the dataset of the first one"""
+    payload = v1_payload()
+    mock_requests.get(
+        f"{BASE_URL}/api/1/datasets/?topic=t&page_size=100",
+        json={
+            "data": [payload],
+            "page": 1,
+            "page_size": 100,
+            "total": 2,
+            "next_page": f"{BASE_URL}/api/1/datasets/?topic=t&page_size=100&page=2",
+        },
+    )
+    mock_requests.get(
+        f"{BASE_URL}/api/1/datasets/?topic=t&page_size=100&page=2",
+        json={
+            "data": [{**payload, "id": "other", "resources": []}],
+            "page": 2,
+            "page_size": 100,
+            "total": 2,
+            "next_page": None,
+        },
+    )
+    return payload
+
+
+def test_bulk_datasets(mock_requests):
+    payload = mock_bulk_pages(mock_requests)
+    bulk = BulkDatasets(BASE_URL, "t", session=requests.Session())
+
+    # pages are only fetched until the datasets asked for are found
+    bulk.prefetch([payload["id"]])
+    assert mock_requests.call_count == 1
+    taken = bulk.take(payload["id"])
+    assert taken and taken.payload["resources"] == {"total": 2}
+    # taken datasets are dropped
+    assert bulk.take(payload["id"]) is None
+
+    bulk.prefetch(["other", "private"])
+    assert mock_requests.call_count == 2
+    taken = bulk.take("other")
+    assert taken and taken.resources == []
+    # the list is exhausted
+    bulk.prefetch(["private"])
+    assert mock_requests.call_count == 2
+    assert bulk.take("private") is None
+    assert (bulk.hits, bulk.misses, bulk.fetched) == (2, 2, 2)
+
+
+def test_bulk_datasets_bounded(mock_requests):
+    payload = mock_bulk_pages(mock_requests)
+    bulk = BulkDatasets(BASE_URL, "t", session=requests.Session(), max_buffered=1)
+
+    # the first dataset is not taken yet, the next page is not fetched
+    bulk.prefetch(["other"])
+    assert mock_requests.call_count == 1
+    assert bulk.take("other") is None
+
+    assert bulk.take(payload["id"])
+    bulk.prefetch(["other"])
+    assert bulk.take("other")
+
+
+def test_bulk_datasets_skip(mock_requests):
+    payload = mock_bulk_pages(mock_requests)
+    bulk = BulkDatasets(BASE_URL, "t", session=requests.Session(), skip={payload["id"]})
+
+    bulk.prefetch([payload["id"], "other"])
+    assert list(bulk.datasets) == ["other"]
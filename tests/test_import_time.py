@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+# heavy dependencies only some commands need, they must be imported lazily
+LAZY_MODULES = {"alembic", "sentry_sdk", "progressist", "pyarrow", "yaml"}
+# generous, only meant to catch a heavy import slipping back at module level
+IMPORT_TIME_BUDGET_S = 2
+
+
+def import_cli() -> tuple[set[str], float]:
+    """Top-level packages imported by `import cli` and its cumulated import time (seconds)"""
+    code = "import sys, cli; print(','.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        # without SENTRY_DSN
+        env={"PATH": ""},
+    )
+    modules = {m.split(".")[0] for m in result.stdout.strip().split(",")}
+    # "import time: self [us] | cumulative [us] | module"
+    cli_line = next(line for line in result.stderr.splitlines() if line.endswith("| cli"))
+    return modules, int(cli_line.split("|")[1]) / 1_000_000
+
+
+def test_cli_lazy_imports():
+    modules, _ = import_cli()
+
+    assert not modules & LAZY_MODULES
+
+
+def test_cli_import_time_budget():
+    _, import_time = import_cli()
+
+    assert import_time < IMPORT_TIME_BUDGET_S
@@ -0,0 +1,32 @@
+from indexes import IndexUsage, TableScans, missing_index_candidates, unused_indexes
+
+
+def test_missing_index_candidates():
+    tables = [
+        # mostly sequential scans on a big table
+        TableScans("catalog", seq_scan=90, seq_tup_read=900_000, idx_scan=10, live_tuples=10_000),
+        # mostly index scans
+        TableScans("resources", seq_scan=1, seq_tup_read=50_000, idx_scan=99, live_tuples=50_000),
+        # too small to matter
+        TableScans("bouquets", seq_scan=100, seq_tup_read=5_000, idx_scan=0, live_tuples=50),
+        # never scanned
+        TableScans("stats", seq_scan=0, seq_tup_read=0, idx_scan=0, live_tuples=5_000),
+    ]
+
+    assert [t.table for t in missing_index_candidates(tables)] == ["catalog"]
+    assert [t.table for t in missing_index_candidates(tables, min_live_tuples=10)] == [
+        "catalog",
+        "bouquets",
+    ]
+
+
+def test_unused_indexes():
+    indexes = [
+        IndexUsage("catalog", "ix_catalog_deleted", scans=0, size=8192),
+        IndexUsage("catalog", "catalog_pkey", scans=12, size=8192, unique=True),
+        # never used for lookups, but they enforce the natural keys
+        IndexUsage("stats", "stats_pkey", scans=0, size=8192, unique=True),
+        IndexUsage("stats", "uq_stats_date_segment_period", scans=0, size=8192, unique=True),
+    ]
+
+    assert unused_indexes(indexes) == [indexes[0]]
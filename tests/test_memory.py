@@ -0,0 +1,34 @@
+import logging
+
+from memory import MB, MemoryReport, current_rss
+
+
+def allocate(size: int) -> bytearray:
+    return bytearray(size)
+
+
+def test_memory_report(caplog):
+    with MemoryReport(interval=0.01) as report:
+        with caplog.at_level(logging.INFO), report.phase("outer", logging.getLogger("test")):
+            with report.phase("inner"):
+                # freed before the end of the phase, only in the peak
+                allocate(8 * MB)
+            # still referenced at the end of the phase
+            kept = allocate(2 * MB)
+
+    inner, outer = report.phases
+    assert len(kept) == 2 * MB
+    assert inner.phase == "inner"
+    assert inner.traced_peak >= 8 * MB
+    # the peak of a nested phase counts for its parent
+    assert outer.traced_peak >= inner.traced_peak
+    assert outer.rss_peak >= outer.rss_start > 0
+    [top] = outer.top[:1]
+    assert top.traceback[0].filename == __file__
+    assert top.size_diff >= 2 * MB
+    assert "Memory of phase outer: peak RSS" in caplog.text
+    assert not report.sampler.is_alive()
+
+
+def test_current_rss():
+    assert current_rss() > MB
@@ -1,7 +1,13 @@
 from datetime import date
 from unittest.mock import patch
 
-from metrics import compute_quality_score, get_datagouvfr_metrics, quality_score_query
+from metrics import (
+    MetricsBatch,
+    compute_quality_score,
+    get_datagouvfr_metrics,
+    quality_score_query,
+)
+from models import DatasetMetric
 
 
 def test_compute_quality_score():
@@ -63,3 +69,30 @@ def test_get_datagouvfr_metrics_not_found(mock_requests):
     mock_requests.get(url, status_code=404)
     result = get_datagouvfr_metrics(url, {})
     assert result == []
+
+
+def test_metrics_batch(monkeypatch):
+    written = []
+    monkeypatch.setattr(
+        "metrics.upsert_rows",
+        lambda session, table, rows, constraint, columns: (
+            written.append((table.name, rows, constraint)) or len(rows)
+        ),
+    )
+    at = date(2025, 6, 1)
+    batch = MetricsBatch(DatasetMetric, at=at)
+
+    batch.add("nb_visits", 1, dataset="a")
+    batch.add("nb_visits", 2, dataset="a")
+    batch.add("nb_visits", 3, dataset="b")
+    batch.add("nb_visits", 4)
+
+    assert len(batch) == 3
+    assert batch.flush(None) == 3  # type: ignore
+    [(table, rows, constraint)] = written
+    assert table == "datasets_metrics"
+    assert constraint == "uq_datasets_metrics_date_measurement_dataset"
+    # last value wins, missing keys are None
+    assert {"date": at, "measurement": "nb_visits", "value": 2, "dataset": "a"} in rows
+    assert {"date": at, "measurement": "nb_visits", "value": 4, "dataset": None} in rows
+    assert not len(batch)
@@ -6,6 +6,7 @@ from math import ulp
 import pytest
 
 from models import (
+    MODEL_COLUMNS,
     Bouquet,
     ContactPoint,
     Dataset,
@@ -385,9 +386,7 @@ def test_computed_get_spatial_coordinates_too_long():
 def test_computed_harvest_spread(fixture_payload):
     base = DatasetComputedColumns(fixture_payload, base_url="http://example.com")
 
-    actual = base.get_harvest_info(
-        [k for k in Dataset.__dict__.keys() if k.startswith("harvest__")]
-    )
+    actual = base.get_harvest_info(MODEL_COLUMNS[Dataset].harvest)
 
     expected = {
         "harvest__backend": "CSW-DCAT",
@@ -413,11 +412,49 @@ def test_computed_harvest_spread_with_harvest_none(fixture_payload):
         payload_with_empty_harvest = fixture_payload
 
         base = DatasetComputedColumns(payload_with_empty_harvest, base_url="http://example.com")
-        base.get_harvest_info([k for k in Dataset.__dict__.keys() if k.startswith("harvest__")])
+        base.get_harvest_info(MODEL_COLUMNS[Dataset].harvest)
     except Exception:
         pytest.fail()
 
 
+def test_model_columns():
+    columns = MODEL_COLUMNS[Dataset]
+
+    assert "id" not in columns.insertable
+    assert "dataset_id" in columns.insertable
+    # relationships are not columns
+    assert "resources" not in columns.insertable
+    assert "organization_rel" not in columns.insertable
+    assert columns.jsonb >= {"extras", "spatial", "quality", "internal", "contact_points"}
+    assert "tags" not in columns.jsonb
+    assert "harvest__backend" in columns.harvest
+    assert columns.harvest <= columns.insertable
+
+
+@pytest.mark.parametrize("fixture_payload", ["payload_ok.json"], indirect=["fixture_payload"])
+def test_dataset_from_payload(fixture_payload):
+    dataset = Dataset.from_payload(fixture_payload, "http://example.com", [])
+
+    assert dataset.dataset_id == fixture_payload["id"]
+    assert dataset.deleted is False
+    assert dataset.harvest__backend == "CSW-DCAT"
+    # payload keys without a matching column are ignored
+    assert not hasattr(dataset, "badges")
+
+
+@pytest.mark.parametrize("fixture_payload", ["payload_ok.json"], indirect=["fixture_payload"])
+def test_dataset_content_hash(fixture_payload):
+    dataset = Dataset.from_payload(fixture_payload, "http://example.com", [])
+    same = Dataset.from_payload(dict(reversed(fixture_payload.items())), "http://example.com", [])
+    changed = Dataset.from_payload(
+        {**fixture_payload, "title": "Autre titre"}, "http://example.com", []
+    )
+
+    assert dataset.content_hash == same.content_hash
+    assert dataset.content_hash != changed.content_hash
+    assert "content_hash" not in MODEL_COLUMNS[Dataset].hashed
+
+
 def test_computed_get_license_title_not_found_key():
     base = DatasetComputedColumns(
         {}, base_url="http://example.com", licenses=[{"id": "foo", "title": "bar"}]
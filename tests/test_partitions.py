@@ -0,0 +1,49 @@
+from datetime import date
+
+from partitions import (
+    Partition,
+    add_months,
+    is_partition,
+    iter_months,
+    parse_partition_name,
+    partition_name,
+)
+
+
+def test_add_months():
+    assert add_months(date(2025, 6, 15), 1) == date(2025, 7, 1)
+    assert add_months(date(2025, 12, 31), 1) == date(2026, 1, 1)
+    assert add_months(date(2025, 1, 1), -1) == date(2024, 12, 1)
+    assert add_months(date(2025, 3, 1), -14) == date(2024, 1, 1)
+    assert add_months(date(2025, 3, 10), 0) == date(2025, 3, 1)
+
+
+def test_iter_months():
+    assert list(iter_months(date(2024, 11, 20), date(2025, 2, 1))) == [
+        date(2024, 11, 1),
+        date(2024, 12, 1),
+        date(2025, 1, 1),
+        date(2025, 2, 1),
+    ]
+    assert list(iter_months(date(2025, 2, 1), date(2025, 1, 1))) == []
+
+
+def test_partition_name():
+    name = partition_name("metrics", date(2025, 3, 1))
+
+    assert name == "metrics_y2025m03"
+    assert parse_partition_name("metrics", name) == Partition(
+        "metrics", "metrics_y2025m03", date(2025, 3, 1)
+    )
+
+
+def test_parse_partition_name_other():
+    assert parse_partition_name("metrics", "metrics_default") is None
+    assert parse_partition_name("metrics", "datasets_metrics_y2025m03") is None
+
+
+def test_is_partition():
+    assert is_partition("metrics_y2025m03")
+    assert is_partition("datasets_metrics_default")
+    assert not is_partition("metrics")
+    assert not is_partition("stats_y2025m03")
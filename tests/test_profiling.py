@@ -0,0 +1,82 @@
+import json
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+
+import pytest
+
+from profiling import DEFAULT_PHASE, Profiler, hotspots, speedscope
+
+
+def test_profiler_phases_and_threads(tmp_path, caplog):
+    profiler = Profiler(tmp_path)
+    started, release = Event(), Event()
+
+    def task():
+        started.set()
+        release.wait(1)
+
+    with profiler.profiling():
+        with profiler.profiling("datasets"):
+            with ThreadPoolExecutor(1, thread_name_prefix="worker") as executor:
+                future = executor.submit(profiler.wrap(task))
+                started.wait(1)
+                profiler.sample()
+                release.set()
+                future.result()
+        assert profiler.current_phase() == DEFAULT_PHASE
+        profiler.sample()
+    # threads are only sampled while profiled
+    profiler.sample()
+
+    assert set(profiler.samples) == {
+        ("datasets", "MainThread"),
+        ("datasets", "worker_0"),
+        (DEFAULT_PHASE, "MainThread"),
+    }
+    [worker_stack] = profiler.samples[("datasets", "worker_0")]
+    assert any(name.endswith("task") for name, _, _ in worker_stack)
+
+    with caplog.at_level(logging.INFO):
+        paths = profiler.write(logging.getLogger("test"))
+
+    assert {p.name for p in paths} == {"datasets.speedscope.json", "command.speedscope.json"}
+    profile = json.loads((tmp_path / "datasets.speedscope.json").read_text())
+    assert {p["name"] for p in profile["profiles"]} == {"MainThread", "worker_0"}
+    assert "Hotspots of phase datasets (2 threads" in caplog.text
+
+
+def test_profiler_sampler(tmp_path):
+    with Profiler(tmp_path, interval=0.001) as profiler, profiler.profiling():
+        Event().wait(0.05)
+
+    assert profiler.samples[(DEFAULT_PHASE, "MainThread")]
+    assert not profiler.sampler.is_alive()
+
+
+a = ("a", "app.py", 1)
+b = ("b", "app.py", 10)
+c = ("c", "lib.py", 1)
+
+
+def test_hotspots():
+    samples = [Counter({(a, b): 3, (a, c): 1}), Counter({(a, b, c): 2})]
+
+    spots = hotspots(samples, interval=0.5)
+
+    assert [s.function for s in spots] == ["b (app.py:10)", "c (lib.py:1)"]
+    assert spots[0].own_time == 1.5
+    assert spots[0].cumulative_time == 2.5
+    assert spots[1] == ("c (lib.py:1)", 1.5, 1.5)
+    assert hotspots(samples, interval=0.5, top=1) == spots[:1]
+
+
+def test_speedscope():
+    profile = speedscope("datasets", {"main": Counter({(a, b): 2, (a, c): 1})}, interval=0.5)
+
+    assert [f["name"] for f in profile["shared"]["frames"]] == ["a", "b", "c"]
+    [main] = profile["profiles"]
+    assert main["samples"] == [[0, 1], [0, 2]]
+    assert main["weights"] == [1.0, 0.5]
+    assert main["endValue"] == pytest.approx(1.5)
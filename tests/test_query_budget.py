@@ -0,0 +1,277 @@
+"""
+SQL statements and HTTP requests budgets of the loader commands, run against a Postgres
+database (`TEST_DATABASE_URL`, the tests are skipped without it) with replayed HTTP payloads.
+
+Each command is run on a small and on a larger universe: budgets are per loaded object and
+must not depend on the size of the catalog, a query per element of a collection (N+1)
+makes them fail as the catalog grows. Budgets are the exact counts: a statement saved must
+lower them too.
+"""
+
+import copy
+import json
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import NamedTuple
+
+import pytest
+from sqlalchemy import Engine, event, text
+
+import cli
+from config import ENVS_CONF
+from models import Base
+from partitions import PARTITIONED_TABLES, create_default_partition
+from views import create_views
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+BASE_URL = "https://demo.data.gouv.fr"
+TOPIC_ID = "topic"
+STATS_URL = "https://stats.example.com/index.php"
+ORG_API = "https://example.com/organizations-datasets.json"
+FRONT_CONFIG = "https://example.com/config.yaml"
+TEST_CONFIG = {
+    "base_url": BASE_URL,
+    "dsn": TEST_DATABASE_URL,
+    "stats_url": STATS_URL,
+    "stats_site_id": "1",
+    "stats_token": "token",
+    "org_api": ORG_API,
+    "api_key": None,
+    "metrics_api_url": None,
+    "front_config_file": FRONT_CONFIG,
+}
+
+with open("tests/fixtures/payload_ok.json") as f:
+    DATASET_PAYLOAD = json.load(f)
+with open("tests/fixtures/resource_payload_ok.json") as f:
+    RESOURCE_PAYLOAD = json.load(f)
+with open("tests/fixtures/bouquet_payload_ok.json") as f:
+    BOUQUET_PAYLOAD = json.load(f)
+
+
+def page(data: list, page_size: int = 0) -> dict:
+    return {
+        "data": data,
+        "page": 1,
+        "page_size": page_size or max(len(data), 1),
+        "total": len(data),
+        "next_page": None,
+    }
+
+
+class Universe(NamedTuple):
+    """Topic elements, datasets (with resources), organizations and bouquets"""
+
+    nb_datasets: int
+    nb_organizations: int
+    nb_bouquets: int
+    nb_resources: int = 3
+
+    def dataset_id(self, i: int) -> str:
+        return f"dataset-{i}"
+
+    def organization_id(self, i: int) -> str:
+        return f"organization-{i % self.nb_organizations}"
+
+    def dataset(self, i: int) -> dict:
+        """v1 payload, with its resources"""
+        payload = copy.deepcopy(DATASET_PAYLOAD)
+        payload["id"] = self.dataset_id(i)
+        payload["slug"] = self.dataset_id(i)
+        payload["organization"] = {**payload["organization"], "id": self.organization_id(i)}
+        payload["resources"] = [
+            {**RESOURCE_PAYLOAD, "id": f"{self.dataset_id(i)}-resource-{r}"}
+            for r in range(self.nb_resources)
+        ]
+        return payload
+
+    def factor(self, i: int) -> dict:
+        return {
+            "id": f"factor-{i}",
+            "element": {"class": "Dataset", "id": self.dataset_id(i)},
+            "extras": {},
+        }
+
+    def bouquet(self, b: int) -> dict:
+        payload = copy.deepcopy(BOUQUET_PAYLOAD)
+        payload["id"] = f"bouquet-{b}"
+        payload["elements"] = {"href": f"{BASE_URL}/api/2/topics/bouquet-{b}/elements/"}
+        return payload
+
+    def register(self, m):
+        """Replay the data.gouv.fr, ecospheres-universe and Matomo responses"""
+        elements = f"{BASE_URL}/api/2/topics/{TOPIC_ID}/elements/?page=1&page_size=200"
+        m.get(
+            f"{BASE_URL}/api/2/topics/univers-ecospheres/",
+            json={"id": TOPIC_ID, "elements": {"href": elements}},
+        )
+        factors = [self.factor(i) for i in range(self.nb_datasets)]
+        m.get(elements, json=page(factors, page_size=200), complete_qs=True)
+        m.get(f"{BASE_URL}/api/1/datasets/licenses/", json=[])
+        bulk = f"{BASE_URL}/api/1/datasets/?topic={TOPIC_ID}&page_size=100"
+        datasets = [self.dataset(i) for i in range(self.nb_datasets)]
+        m.get(bulk, json=page(datasets, page_size=100), complete_qs=True)
+
+        organizations = [
+            {
+                "id": f"organization-{o}",
+                "name": f"Organization {o}",
+                "slug": f"organization-{o}",
+                "acronym": None,
+                "badges": [],
+            }
+            for o in range(self.nb_organizations)
+        ]
+        for organization in organizations:
+            m.get(f"{BASE_URL}/api/1/organizations/{organization['id']}/", json=organization)
+        m.get(ORG_API, json=[{**o, "type": "Etat"} for o in organizations])
+
+        m.get(
+            FRONT_CONFIG,
+            text=(
+                "pages:\n  bouquets:\n    filter_prefix: ecospheres\n    filters:\n"
+                "      - id: theme\n        values:\n"
+                "          - id: mieux-se-deplacer\n            name: Mieux se déplacer\n"
+            ),
+        )
+        bouquets_url = f"{BASE_URL}/api/2/topics/?tag=univers-ecospheres"
+        bouquets = [self.bouquet(b) for b in range(self.nb_bouquets)]
+        m.get(bouquets_url, json=page(bouquets), complete_qs=True)
+        for b, bouquet in enumerate(bouquets):
+            # each bouquet has its share of the datasets, growing with the catalog
+            elements = [self.factor(i) for i in range(b, self.nb_datasets, self.nb_bouquets)]
+            m.get(bouquet["elements"]["href"], json=page(elements))
+
+        m.post(
+            STATS_URL,
+            json={
+                "nb_uniq_visitors": 10,
+                "nb_visits": 12,
+                "nb_actions": 30,
+                "nb_visits_converted": 0,
+                "bounce_count": 4,
+                "sum_visit_length": 600,
+                "max_actions": 8,
+                "bounce_rate": "33%",
+                "nb_actions_per_visit": 2.5,
+                "avg_time_on_site": 50,
+                "nb_pageviews": 25,
+                "nb_downloads": 2,
+                "nb_uniq_visitors_returning": 3,
+                "nb_uniq_visitors_new": 7,
+            },
+        )
+
+
+SMALL = Universe(nb_datasets=20, nb_organizations=4, nb_bouquets=2)
+LARGE = Universe(nb_datasets=60, nb_organizations=12, nb_bouquets=6)
+
+
+class Usage(NamedTuple):
+    statements: int
+    requests: int
+
+
+@contextmanager
+def count_statements() -> Iterator[list[str]]:
+    """Statements sent by any engine (executemany batches count for one)"""
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+
+
+def reset_database():
+    connection = cli.app.db.connection()
+    connection.execute(text("DROP SCHEMA public CASCADE"))
+    connection.execute(text("CREATE SCHEMA public"))
+    Base.metadata.create_all(connection)
+    create_views(connection)
+    for table in PARTITIONED_TABLES:
+        create_default_partition(cli.app.db, table)
+    cli.app.db.commit()
+
+
+@pytest.fixture
+def measure(monkeypatch, mock_requests):
+    monkeypatch.setitem(ENVS_CONF, "demo", {**ENVS_CONF["demo"], **TEST_CONFIG})
+
+    def measure(universe: Universe, command: Callable, prepare: Callable | None = None) -> Usage:
+        """Run `command` on a fresh database loaded with `prepare`, count what it sends"""
+        cli.downloads.clear()
+        mock_requests.reset_mock()
+        universe.register(mock_requests)
+        with cli.env_context("demo"):
+            reset_database()
+            if prepare:
+                prepare()
+            nb_requests = mock_requests.call_count
+            with count_statements() as statements:
+                command()
+            return Usage(len(statements), mock_requests.call_count - nb_requests)
+
+    return measure
+
+
+def load():
+    cli.load(env="demo", skip_stats=True, skip_views=True, skip_snapshots=True, max_workers=2)
+
+
+def budget(universe: Universe, base: int, per_dataset=0, per_organization=0, per_bouquet=0):
+    return (
+        base
+        + per_dataset * universe.nb_datasets
+        + per_organization * universe.nb_organizations
+        + per_bouquet * universe.nb_bouquets
+    )
+
+
+def test_load_budget(measure):
+    for universe in (SMALL, LARGE):
+        usage = measure(universe, load)
+        # per dataset: select and insert it, select its organization, select and insert
+        # its resources. Per organization: fetch and insert it, then refresh it.
+        # Per bouquet: select and insert it, select its datasets and link them
+        assert usage.statements == budget(universe, 63, 5, 5, 5), usage
+        # topic, elements, bulk datasets, licenses, front config, organizations list and
+        # bouquets list, then each organization (twice) and the elements of each bouquet
+        assert usage.requests == budget(universe, 7, per_organization=2, per_bouquet=1), usage
+
+
+def test_load_bouquets_budget(measure):
+    for universe in (SMALL, LARGE):
+        usage = measure(universe, lambda: cli.load_bouquets(env="demo"), prepare=load)
+        # whatever the number of datasets in each bouquet
+        assert usage.statements == budget(universe, 2, per_bouquet=5), usage
+        assert usage.requests == budget(universe, 1, per_bouquet=1), usage
+
+
+def test_compute_metrics_budget(measure):
+    small = measure(SMALL, lambda: cli.compute_metrics(env="demo"), prepare=load)
+    large = measure(LARGE, lambda: cli.compute_metrics(env="demo"), prepare=load)
+
+    # whatever the number of datasets, organizations and bouquets
+    assert small == large
+    assert large.statements == 6
+    assert large.requests == 0
+
+
+def test_load_stats_budget(measure):
+    day = (date.today() - timedelta(days=1)).isoformat()
+    small = measure(SMALL, lambda: cli.load_stats(env="demo", day=day), prepare=load)
+    large = measure(LARGE, lambda: cli.load_stats(env="demo", day=day), prepare=load)
+
+    # per segment: 3 Matomo methods, select and insert the stats of the day
+    assert small == large
+    assert large.statements == 5 * 2
+    assert large.requests == 5 * 3
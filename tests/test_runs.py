@@ -0,0 +1,110 @@
+from datetime import datetime
+
+import rel
+from models import LoadRun
+from rel import iter_pages, iter_rel
+from runs import FINISHED, PHASES, checkpoint, is_done, next_phase
+
+
+def make_run(phase: str) -> LoadRun:
+    return LoadRun(started_at=datetime.now(), updated_at=datetime.now(), phase=phase)
+
+
+def test_next_phase():
+    assert next_phase("datasets") == "organizations"
+    assert next_phase(PHASES[-1]) == FINISHED
+
+
+def test_is_done():
+    run = make_run("metrics")
+
+    assert is_done(run, "datasets")
+    assert is_done(run, "bouquets")
+    assert not is_done(run, "metrics")
+    assert not is_done(run, "publish")
+    assert all(is_done(make_run(FINISHED), phase) for phase in PHASES)
+
+
+def test_checkpoint_reattaches_run():
+    class MockSession:
+        def __init__(self):
+            self.added = []
+
+        def add(self, obj):
+            self.added.append(obj)
+
+        def commit(self):
+            pass
+
+    session = MockSession()
+    run = make_run("datasets")
+
+    checkpoint(session, run, phase=FINISHED, processed={"b", "a"})  # type: ignore
+
+    assert session.added == [run]
+    assert run.processed == ["a", "b"]
+    assert run.finished_at == run.updated_at
+
+
+def mock_pages(mock_requests):
+    mock_requests.get(
+        "https://example.com/elements?page=1&page_size=2",
+        json={
+            "data": [{"id": "a"}, {"id": "b"}],
+            "page": 1,
+            "page_size": 2,
+            "total": 3,
+            "next_page": "https://example.com/elements?page=2&page_size=2",
+        },
+    )
+    mock_requests.get(
+        "https://example.com/elements?page=2&page_size=2",
+        json={"data": [{"id": "c"}], "page": 2, "page_size": 2, "total": 3, "next_page": None},
+    )
+
+
+def test_iter_pages(mock_requests):
+    mock_pages(mock_requests)
+
+    pages = list(iter_pages({"href": "https://example.com/elements?page=1&page_size=2"}))
+
+    assert [page.url for page in pages] == [
+        "https://example.com/elements?page=1&page_size=2",
+        "https://example.com/elements?page=2&page_size=2",
+    ]
+    assert pages[-1].next_page is None
+
+
+def test_iter_rel_from_checkpoint(mock_requests):
+    mock_pages(mock_requests)
+
+    elements = iter_rel({"href": "https://example.com/elements?page=2&page_size=2"})
+
+    assert [e["id"] for e in elements] == ["c"]
+    assert mock_requests.call_count == 1
+
+
+def test_iter_pages_retry_after(mock_requests, monkeypatch):
+    waits = []
+    monkeypatch.setattr(rel.time, "sleep", waits.append)
+    mock_pages(mock_requests)
+    url = "https://example.com/elements?page=2&page_size=2"
+    mock_requests.get(
+        url,
+        [
+            {"status_code": 429, "headers": {"Retry-After": "3"}},
+            {"status_code": 429},
+            {
+                "json": {
+                    "data": [{"id": "c"}],
+                    "page": 2,
+                    "page_size": 2,
+                    "total": 3,
+                    "next_page": None,
+                }
+            },
+        ],
+    )
+
+    assert [e["id"] for e in iter_rel({"href": url})] == ["c"]
+    assert waits == [3, rel.RATE_LIMIT_WAIT]
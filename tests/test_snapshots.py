@@ -0,0 +1,105 @@
+import gzip
+import json
+
+import brotli
+
+from snapshots import (
+    read_current_version,
+    render_organization_metrics,
+    serve_snapshot,
+    write_snapshots,
+)
+
+PAYLOADS = {"bouquets": [{"bouquet_id": "b1", "nb_factors": 3}]}
+
+
+def test_write_snapshots(tmp_path):
+    target = write_snapshots(tmp_path, 1, PAYLOADS)
+
+    assert target.parent == tmp_path
+    assert target.name.startswith("1-")
+    assert read_current_version(tmp_path) == 1
+    assert (
+        json.loads(gzip.decompress((target / "bouquets.json.gz").read_bytes()))
+        == PAYLOADS["bouquets"]
+    )
+    assert (
+        json.loads(brotli.decompress((target / "bouquets.json.br").read_bytes()))
+        == PAYLOADS["bouquets"]
+    )
+
+
+def test_write_snapshots_keeps_recent_versions(tmp_path):
+    # written before builds had their own directory
+    (tmp_path / "1").mkdir()
+    targets = [write_snapshots(tmp_path, version, PAYLOADS, keep=2) for version in range(2, 6)]
+
+    assert read_current_version(tmp_path) == 5
+    assert sorted(tmp_path.iterdir()) == [*targets[-2:], tmp_path / "current.json"]
+
+
+def test_rebuild_snapshots(tmp_path):
+    first = write_snapshots(tmp_path, 1, PAYLOADS)
+    etag = dict(serve_snapshot(tmp_path, "bouquets", {}).headers)["ETag"]
+    payloads = {"bouquets": [{"bouquet_id": "b1", "nb_factors": 4}]}
+    second = write_snapshots(tmp_path, 1, payloads)
+
+    # the served build is left as is, a new one replaces it
+    assert first != second
+    assert (first / "bouquets.json.gz").exists()
+    response = serve_snapshot(tmp_path, "bouquets", {"if-none-match": etag})
+    assert response.status == 200
+    assert json.loads(response.body) == payloads["bouquets"]
+
+
+def test_read_current_version_missing(tmp_path):
+    assert read_current_version(tmp_path) is None
+
+
+def test_serve_snapshot(tmp_path):
+    write_snapshots(tmp_path, 7, PAYLOADS)
+
+    response = serve_snapshot(tmp_path, "bouquets", {"accept-encoding": "gzip, br"})
+    assert response.status == 200
+    assert ("Content-Encoding", "br") in response.headers
+    assert json.loads(brotli.decompress(response.body)) == PAYLOADS["bouquets"]
+
+    response = serve_snapshot(tmp_path, "bouquets", {})
+    assert json.loads(response.body) == PAYLOADS["bouquets"]
+
+    etag = dict(response.headers)["ETag"]
+    assert serve_snapshot(tmp_path, "bouquets", {"if-none-match": etag}).status == 304
+
+
+def test_serve_snapshot_previous_layout(tmp_path):
+    target = write_snapshots(tmp_path, 1, PAYLOADS)
+    target.rename(tmp_path / "1")
+    (tmp_path / "current.json").write_text(json.dumps({"version": 1}))
+
+    response = serve_snapshot(tmp_path, "bouquets", {})
+    assert json.loads(response.body) == PAYLOADS["bouquets"]
+
+
+def test_render_organization_metrics():
+    class Session:
+        def execute(self, statement):
+            return self
+
+        def mappings(self):
+            return [
+                {"organization": "o1", "measurement": "nb_datasets", "date": 1, "value": 1.0},
+                {"organization": "o1", "measurement": "nb_datasets", "date": 2, "value": 2.0},
+                {"organization": "o2", "measurement": "nb_bouquets", "date": 1, "value": 3.0},
+            ]
+
+    assert render_organization_metrics(Session()) == {  # type: ignore
+        "o1": {"nb_datasets": [{"date": 1, "value": 1.0}, {"date": 2, "value": 2.0}]},
+        "o2": {"nb_bouquets": [{"date": 1, "value": 3.0}]},
+    }
+
+
+def test_serve_snapshot_not_found(tmp_path):
+    assert serve_snapshot(tmp_path, "bouquets", {}).status == 404
+
+    write_snapshots(tmp_path, 1, PAYLOADS)
+    assert serve_snapshot(tmp_path, "unknown", {}).status == 404
@@ -0,0 +1,85 @@
+import requests
+import yaml
+
+from fetch import BulkDatasets
+from models import Bouquet, Dataset, Organization, Resource
+from rel import iter_rel
+from standin import running
+from synthetic import TOPIC_ID, TOPIC_SLUG, CatalogSize, SyntheticCatalog, object_id
+
+SIZE = CatalogSize(datasets=120, organizations=10, bouquets=5)
+
+
+def test_catalog_scale_and_determinism():
+    catalog = SyntheticCatalog("http://standin", scale=2, seed=1, size=SIZE)
+
+    assert catalog.size == (240, 20, 10)
+    same = SyntheticCatalog("http://standin", scale=2, seed=1, size=SIZE)
+    # whatever the order payloads are read in
+    assert [same.dataset(i) for i in reversed(range(5))][::-1] == [
+        catalog.dataset(i) for i in range(5)
+    ]
+    other = SyntheticCatalog("http://standin", scale=2, seed=2, size=SIZE)
+    assert other.dataset(0) != catalog.dataset(0)
+
+
+def test_catalog_payloads():
+    catalog = SyntheticCatalog("http://standin", size=SIZE)
+
+    for i in range(SIZE.datasets):
+        dataset = Dataset.from_payload(catalog.dataset(i), catalog.base_url, catalog.licenses())
+        assert dataset.nb_resources == catalog.nb_resources(i)
+        assert dataset.organization == object_id(catalog.organization_of(i))
+    assert Resource.from_payload(catalog.resource(0, 0), object_id(0)).resource_id
+    assert Organization.from_payload(catalog.organization(0)).organization_id == object_id(0)
+    # varied enough to exercise the indicators
+    datasets = [catalog.dataset(i) for i in range(SIZE.datasets)]
+    assert any(d["harvest"] is None for d in datasets)
+    assert any(d["harvest"] and "remote_url" not in d["harvest"] for d in datasets)
+    assert any(((d["spatial"] or {}).get("geom") or {}).get("coordinates") for d in datasets)
+
+    elements = [f for p in range(1, 4) for f in catalog.elements_page(p, 50)["data"]]
+    assert [f["element"]["id"] for f in elements] == [object_id(i) for i in range(SIZE.datasets)]
+    assert catalog.elements_page(3, 50)["next_page"] is None
+    assert {"nb_visits", "bounce_rate"} <= catalog.matomo("VisitsSummary.get", "2025-01-01").keys()
+    front_config = yaml.safe_load(catalog.front_config())
+    assert front_config["pages"]["bouquets"]["filters"][0]["id"] == "theme"
+
+
+def test_standin_server():
+    with running(size=SIZE) as server:
+        catalog = server.standin.catalog
+        assert catalog.base_url == server.url
+
+        topic = requests.get(f"{server.url}/api/2/topics/{TOPIC_SLUG}/").json()
+        assert topic["id"] == TOPIC_ID
+        factors = list(iter_rel(topic["elements"], page_size=50))
+        assert len(factors) == SIZE.datasets
+
+        bulk = BulkDatasets(server.url, TOPIC_ID, max_buffered=SIZE.datasets)
+        bulk.prefetch([object_id(i) for i in range(SIZE.datasets)])
+        assert bulk.fetched == len(catalog.public_datasets)
+
+        dataset = requests.get(f"{server.url}/api/2/datasets/{object_id(7)}/").json()
+        resources = list(iter_rel(dataset["resources"], page_size=3))
+        assert len(resources) == catalog.nb_resources(7)
+
+        bouquets = list(iter_rel({"href": f"{server.url}/api/2/topics/?tag=univers-ecospheres"}))
+        assert len(bouquets) == SIZE.bouquets
+        bouquet = Bouquet.from_payload(bouquets[0], {})
+        assert bouquet.nb_factors == len(catalog.bouquet_factors(0))
+
+        assert requests.get(f"{server.url}/api/1/organizations/{object_id(3)}/").ok
+        missing = requests.get(f"{server.url}/api/1/organizations/{object_id(SIZE.organizations)}/")
+        assert missing.status_code == 404
+
+        metrics = requests.get(
+            f"{server.url}/metrics/api/datasets/data/",
+            params={"dataset_id__in": f"{object_id(1)},{object_id(2)}", "page_size": 50},
+        ).json()["data"]
+        assert [m["dataset_id"] for m in metrics] == [object_id(1), object_id(2)]
+
+        stats = requests.post(
+            f"{server.url}/index.php", data={"method": "VisitFrequency.get", "date": "2025-01-01"}
+        ).json()
+        assert set(stats) == {"nb_uniq_visitors_returning", "nb_uniq_visitors_new"}
@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+import pytest
+import requests
+import sentry_sdk
+from sentry_sdk.transport import Transport
+from sqlalchemy import create_engine, text
+
+import cli
+import tracing
+from standin import running
+from synthetic import CatalogSize, object_id
+
+
+class Capture(Transport):
+    def __init__(self):
+        super().__init__()
+        self.envelopes = []
+
+    def capture_envelope(self, envelope):
+        self.envelopes.append(envelope)
+
+    def transactions(self) -> list[dict]:
+        return [t for e in self.envelopes if (t := e.get_transaction_event())]
+
+
+@pytest.fixture
+def capture():
+    capture = Capture()
+    tracing.init("https://key@sentry.example.com/1", traces_sample_rate=1.0, transport=capture)
+    yield capture
+    tracing.enabled = False
+    sentry_sdk.init()
+
+
+def test_disabled():
+    assert not tracing.enabled
+    with tracing.transaction("load", "demo") as transaction, tracing.span("phase", "datasets"):
+        assert transaction is None
+
+    def func():
+        pass
+
+    assert tracing.propagated(func) is func
+
+
+def test_command_name():
+    assert cli.command_name(["--pool-size", "12", "load", "--skip-stats"]) == "load"
+    assert cli.command_name(["load_all", "--envs", "demo"]) == "load-all"
+    assert cli.command_name(["compute-metrics", "refresh-views"]) == "compute-metrics refresh-views"
+    assert cli.command_name([]) == "cli"
+
+
+def test_spans(capture):
+    engine = create_engine("sqlite://")
+
+    with running(size=CatalogSize(datasets=4, organizations=1, bouquets=1)) as server:
+
+        def process(i: int):
+            with tracing.span("dataset", object_id(i)):
+                requests.get(f"{server.url}/api/2/datasets/{object_id(i)}/").raise_for_status()
+                with engine.connect() as connection:
+                    connection.execute(text("SELECT 1"))
+
+        with tracing.transaction("load", "demo"), tracing.span("phase", "datasets"):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [
+                    executor.submit(copy_context().run, tracing.propagated(process), i)
+                    for i in range(4)
+                ]
+            for future in futures:
+                future.result()
+
+    [transaction] = capture.transactions()
+    assert transaction["transaction"] == "load"
+    assert transaction["tags"]["env"] == "demo"
+    spans = {span["span_id"]: span for span in transaction["spans"]}
+
+    def parent(span: dict) -> str:
+        parent_id = span["parent_span_id"]
+        return spans[parent_id]["op"] if parent_id in spans else "transaction"
+
+    [phase] = [span for span in spans.values() if span["op"] == "phase"]
+    assert parent(phase) == "transaction"
+    datasets = [span for span in spans.values() if span["op"] == "dataset"]
+    assert sorted(span["description"] for span in datasets) == [object_id(i) for i in range(4)]
+    assert all(parent(span) == "phase" for span in datasets)
+    # each request and statement under the dataset it was sent for
+    for op in ("http.client", "db"):
+        children = [span for span in spans.values() if span["op"] == op]
+        assert len(children) == 4
+        assert all(parent(span) == "dataset" for span in children)
+        assert {span["parent_span_id"] for span in children} == {s["span_id"] for s in datasets}
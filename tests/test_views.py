@@ -0,0 +1,25 @@
+from models import DatasetComputedColumns
+from views import VIEWS, MaterializedView
+
+
+def test_view_create_statements():
+    view = MaterializedView("mv_test", "SELECT 1 AS a, 2 AS b", ["a", "b"])
+
+    assert view.create_statements() == [
+        "CREATE MATERIALIZED VIEW mv_test AS SELECT 1 AS a, 2 AS b",
+        "CREATE UNIQUE INDEX uq_mv_test ON mv_test (a, b)",
+    ]
+
+
+def test_views_cover_all_indicators():
+    views = {view.name: view for view in VIEWS}
+
+    for indicator in DatasetComputedColumns.indicators:
+        field = indicator["field"]
+        assert f"has_{field}) AS nb_{field}" in views["mv_indicators_per_organization"].query
+        assert f"'nb_{field}') AS nb_{field}" in views["mv_metrics_pivot"].query
+
+
+def test_views_have_unique_columns():
+    # required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+    assert all(view.unique_columns for view in VIEWS)
@@ -0,0 +1,94 @@
+"""
+Sentry error capture and performance tracing of cli commands, enabled by `SENTRY_DSN`.
+
+`SENTRY_TRACES_SAMPLE_RATE` of the runs (none by default) are traced: a transaction per
+command line, with spans per phase of `load`, per env of `load-all` and per dataset, and as
+their children the HTTP requests (sentry_sdk stdlib integration, `app.req` included) and
+the SQL statements (SQLAlchemy integration). Sentry keeps up to 1000 spans per transaction.
+
+sentry_sdk is only imported when enabled. Its current scope is held by a context variable
+but spans are set on the scope object: worker tasks are run in a fork of it (`propagated`),
+their spans are children of the span they were submitted from.
+"""
+
+import os
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, ParamSpec, TypeVar
+
+SENTRY_DSN = os.getenv("SENTRY_DSN")
+TRACES_SAMPLE_RATE = float(os.getenv("SENTRY_TRACES_SAMPLE_RATE") or 0)
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+# set by `init`
+enabled = False
+
+
+def init(dsn: str | None = SENTRY_DSN, traces_sample_rate: float = TRACES_SAMPLE_RATE, **options):
+    """Capture errors, and trace `traces_sample_rate` of the runs, if a `dsn` is given"""
+    global enabled
+    if not dsn:
+        return
+    import sentry_sdk
+    from sentry_sdk.integrations.sqlalchemy import SqlalchemyIntegration
+
+    sentry_sdk.init(
+        dsn=dsn,
+        # None disables tracing altogether, 0 would still create (unsampled) transactions
+        traces_sample_rate=traces_sample_rate or None,
+        integrations=[SqlalchemyIntegration()],
+        **options,
+    )
+    enabled = True
+
+
+@contextmanager
+def transaction(name: str, env: str) -> Iterator[Any]:
+    """Transaction of a command line, tagged with its `env`"""
+    if not enabled:
+        yield None
+        return
+    import sentry_sdk
+
+    with sentry_sdk.start_transaction(op="cli", name=name) as transaction:
+        transaction.set_tag("env", env)
+        yield transaction
+
+
+@contextmanager
+def span(op: str, name: str) -> Iterator[Any]:
+    """Child span of the current one (if any)"""
+    if not enabled:
+        yield None
+        return
+    import sentry_sdk
+
+    with sentry_sdk.start_span(op=op, name=name) as span:
+        yield span
+
+
+def propagated(func: Callable[P, R]) -> Callable[P, R]:
+    """`func`, to be run in a worker thread in a fork of the current scope"""
+    if not enabled:
+        return func
+    import sentry_sdk
+    from sentry_sdk.scope import use_scope
+
+    scope = sentry_sdk.get_current_scope().fork()
+
+    @wraps(func)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+        with use_scope(scope):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def capture_exception(error: Exception):
+    if enabled:
+        import sentry_sdk
+
+        sentry_sdk.capture_exception(error)
@@ -0,0 +1,124 @@
+from typing import NamedTuple
+
+from sqlalchemy import Connection, text
+from sqlalchemy.orm import scoped_session
+
+from models import DatasetComputedColumns
+
+INDICATOR_FIELDS = [indicator["field"] for indicator in DatasetComputedColumns.indicators]
+
+# measurements from `compute_metrics`, pivoted as one column each
+PIVOT_MEASUREMENTS = [
+    "nb_datasets",
+    "avg_quality__score",
+    *[f"nb_{field}" for field in INDICATOR_FIELDS],
+]
+
+
+class MaterializedView(NamedTuple):
+    name: str
+    query: str
+    # a unique index is required by REFRESH MATERIALIZED VIEW CONCURRENTLY
+    unique_columns: list[str]
+
+    def create_statements(self) -> list[str]:
+        return [
+            f"CREATE MATERIALIZED VIEW {self.name} AS {self.query}",
+            f"CREATE UNIQUE INDEX uq_{self.name} ON {self.name} ({', '.join(self.unique_columns)})",
+        ]
+
+    def drop_statement(self) -> str:
+        return f"DROP MATERIALIZED VIEW IF EXISTS {self.name}"
+
+
+def _indicators_per_organization_query() -> str:
+    indicators = ", ".join(
+        f"count(*) FILTER (WHERE has_{field}) AS nb_{field}" for field in INDICATOR_FIELDS
+    )
+    return f"""
+        SELECT organization, count(*) AS nb_datasets,
+        avg(quality__score) AS avg_quality__score, {indicators}
+        FROM catalog
+        WHERE NOT deleted AND organization IS NOT NULL
+        GROUP BY organization
+    """
+
+
+def _metrics_pivot_query() -> str:
+    measurements = ", ".join(
+        f"max(value) FILTER (WHERE measurement = '{m}') AS {m}" for m in PIVOT_MEASUREMENTS
+    )
+    return f"""
+        SELECT date, coalesce(organization, '') AS organization, {measurements}
+        FROM metrics
+        GROUP BY date, coalesce(organization, '')
+    """
+
+
+VIEWS = [
+    MaterializedView(
+        name="mv_indicators_per_organization",
+        query=_indicators_per_organization_query(),
+        unique_columns=["organization"],
+    ),
+    MaterializedView(
+        name="mv_quality_score_bins",
+        query="""
+            SELECT organization, quality__score__bin, quality__score__bin_label,
+            count(*) AS nb_datasets
+            FROM catalog
+            WHERE NOT deleted AND organization IS NOT NULL
+            GROUP BY organization, quality__score__bin, quality__score__bin_label
+        """,
+        unique_columns=["organization", "quality__score__bin"],
+    ),
+    MaterializedView(
+        name="mv_resource_formats",
+        query="""
+            SELECT c.organization, coalesce(lower(r.format), '') AS format,
+            count(*) AS nb_resources
+            FROM resources r
+            JOIN catalog c ON c.dataset_id = r.dataset_id
+            WHERE NOT c.deleted AND c.organization IS NOT NULL
+            GROUP BY c.organization, coalesce(lower(r.format), '')
+        """,
+        unique_columns=["organization", "format"],
+    ),
+    MaterializedView(
+        name="mv_bouquet_composition",
+        query="""
+            SELECT b.bouquet_id, b.name, b.theme, b.private, b.nb_factors, b.nb_datasets,
+            b.nb_datasets_external, b.nb_factors_missing, b.nb_factors_not_available,
+            count(DISTINCT c.dataset_id) AS nb_datasets_from_universe,
+            count(DISTINCT c.organization) AS nb_organizations
+            FROM bouquets b
+            LEFT JOIN datasets_bouquets dsb ON dsb.bouquet_id = b.bouquet_id
+            LEFT JOIN catalog c ON c.dataset_id = dsb.dataset_id AND NOT c.deleted
+            WHERE NOT b.deleted
+            GROUP BY b.bouquet_id, b.name, b.theme, b.private, b.nb_factors, b.nb_datasets,
+            b.nb_datasets_external, b.nb_factors_missing, b.nb_factors_not_available
+        """,
+        unique_columns=["bouquet_id"],
+    ),
+    MaterializedView(
+        # organization is '' for global metrics
+        name="mv_metrics_pivot",
+        query=_metrics_pivot_query(),
+        unique_columns=["date", "organization"],
+    ),
+]
+
+
+def create_views(connection: Connection):
+    for view in VIEWS:
+        for stmt in view.create_statements():
+            connection.execute(text(stmt))
+
+
+def refresh_materialized_views(session: scoped_session, concurrently: bool = True):
+    """Refresh every dashboard view, without blocking readers if `concurrently`"""
+    for view in VIEWS:
+        session.execute(
+            text(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{view.name}")
+        )
+        session.commit()